@@ -56,7 +56,7 @@ def execute_remote_process(name_server, username, ssh_key_options, working_direc
         else:
             full_command = f"cd {working_directory} && {command}"
 
-        stdin, stdout, stderr = ssh.exec_command(full_command)
+        stdin, stdout, stderr = ssh.exec_command(full_command, idempotent=False)
         output = stdout.read().decode('utf-8')
         error = stderr.read().decode('utf-8')
         ssh.close()
@@ -175,6 +175,24 @@ class ProgramoptionsScreen:
                     height=100,
                 )
                 mw_list = _parse_mw_list(self._mw_selection)
+
+                # -------------- Local execution backend -------------- #
+                run_local = st.toggle("Run locally (no server / SLURM)",
+                                      value=st.session_state.get("execution_backend", "ssh") == "local",
+                                      key="run_local_toggle")
+                st.session_state["execution_backend"] = "local" if run_local else "ssh"
+                if run_local:
+                    st.session_state["bob_local_fullpath"] = st.text_input(
+                        "BoB local fullpath",
+                        value=st.session_state.get("bob_local_fullpath", "bob2p5"))
+                    st.session_state["local_workers"] = st.number_input(
+                        "Concurrent simulations",
+                        min_value=1,
+                        value=int(st.session_state.get("local_workers", os.cpu_count() or 1)))
+                    st.session_state["local_timeout_secs"] = st.number_input(
+                        "Timeout per simulation (s, 0 = none)",
+                        min_value=0,
+                        value=int(st.session_state.get("local_timeout_secs", 0)))
             if st.button("RUN"):
                 with st.spinner("The program is running. Please wait..."):
                     st.session_state["run_pressed"] = True
@@ -186,7 +204,13 @@ class ProgramoptionsScreen:
                         st.error("ERROR!!! Local directory not defined")
                         return
 
-                    connected_server = validate_server_connection()
+                    if self._multiple_sim and st.session_state.get("execution_backend") == "local":
+                        # Backend local: sin servidor, todo se crea y ejecuta en el directorio local
+                        connected_server = {"name_server": None, "name_user": None, "ssh_key_options": None,
+                                            "working_directory": self._input_options.get("input_file_002", ""),
+                                            "bob_remote_fullpath": st.session_state.get("bob_local_fullpath")}
+                    else:
+                        connected_server = validate_server_connection()
                     if not connected_server:
                         st.error("ERROR!!! Server connection failed")
                         return
@@ -226,6 +250,9 @@ class ProgramoptionsScreen:
                         if results:
                             st.write("Resumen:", results)
 
+                    elif connected_server["name_server"] is None:
+                        st.error("ERROR!!! Local execution requires molecular weights in 'Multiple simulations mode'")
+                        return
                     else:
                         viscai_single_run(
                             connected_server["name_server"],
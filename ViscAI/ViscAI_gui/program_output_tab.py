@@ -1,11 +1,17 @@
 import streamlit as st
 import os
+import tempfile
 import base64
 import matplotlib.pyplot as plt
 from ViscAI.program_output import (download_file_from_server,
+                                                download_files_from_server,
                                                 tar_output_files,
                                                 list_remote_files,
-                                                convert_agr_to_png)
+                                                list_info_files,
+                                                fetch_info_files,
+                                                convert_agr_files_to_png)
+from ViscAI.utils.slurm_tracker import get_tracker, load_job_state, summarize
+from ViscAI.utils.native_plots import load_db_curves, curve_plot_jobs, gpcls_plot_jobs, render_plots
 
 class ProgramoutputScreen:
 
@@ -32,6 +38,30 @@ class ProgramoutputScreen:
         ########################    TEST output    #########################
         # Replace the previous single-info.txt handling with this block
 
+        # SLURM job status (background tracker or the last saved JSON state)
+        tracker = get_tracker(working_directory)
+        state_path = st.session_state.get("slurm_job_state_path", "")
+        job_state = tracker.state() if tracker else (load_job_state(state_path) if state_path else {})
+        if job_state:
+            counts = summarize(job_state)
+            with st.expander(f"SLURM jobs: {counts['completed']} completed, {counts['running']} running, "
+                             f"{counts['pending']} pending, {counts['failed']} failed",
+                             expanded=not job_state.get("done")):
+                if job_state.get("error"):
+                    st.warning(f"Job tracking: {job_state['error']}")
+                if job_state.get("timed_out"):
+                    st.warning("Job tracking stopped after the configured maximum wait.")
+                collected = job_state.get("on_done_result")
+                if collected and collected.get("tag"):
+                    st.info(f"{collected['tag']}: {collected['message']}")
+                if collected and collected.get("runtimes_recorded"):
+                    st.caption(f"{collected['runtimes_recorded']} run times added to the cost model history.")
+                failed = sorted(j["subdir"] for j in job_state.get("jobs", {}).values() if j["state"] == "failed")
+                if failed:
+                    st.error("Failed: " + ", ".join(failed))
+                if not job_state.get("done") and not job_state.get("timed_out"):
+                    st.button("Refresh job status")
+
         # Get listing of the working directory (files + subdirs)
         remote_entries = list_remote_files(name_server, name_user, ssh_key_options, working_directory)
 
@@ -41,24 +71,28 @@ class ProgramoutputScreen:
         mw_subdirs = [e for e in remote_entries if str(e).startswith("Mw_")]
 
         if mw_subdirs:
-            for idx, sd in enumerate(sorted(mw_subdirs)):
-                remote_info_path = os.path.join(working_directory, sd, "info.txt")
-                local_info_path = download_file_from_server(name_server, name_user, ssh_key_options, remote_info_path)
+            # mtimes of every info.txt in a single remote command; contents are only downloaded
+            # for the visible page and cached by (path, mtime) across reruns
+            info_mtimes = list_info_files(name_server, name_user, ssh_key_options, working_directory)
+            info_cache = st.session_state.setdefault("info_txt_cache", {})
+            mw_subdirs = sorted(mw_subdirs)
+            page_size = int(st.session_state.get("info_page_size", 20))
+            n_pages = max(1, (len(mw_subdirs) + page_size - 1) // page_size)
+            page = 1
+            if n_pages > 1:
+                page = int(st.number_input(f"Page (1-{n_pages}, {len(mw_subdirs)} Mw_* directories)",
+                                           min_value=1, max_value=n_pages, value=1, step=1, key="info_page"))
+            first = (page - 1) * page_size
+            page_subdirs = mw_subdirs[first:first + page_size]
+            contents = fetch_info_files(name_server, name_user, ssh_key_options, working_directory,
+                                        {sd: info_mtimes[sd] for sd in page_subdirs if sd in info_mtimes},
+                                        info_cache)
+            for idx, sd in enumerate(page_subdirs, start=first):
                 with st.expander(f"{sd}"):
-                    if local_info_path and os.path.exists(local_info_path):
-                        try:
-                            with open(local_info_path, "r", encoding="utf-8", errors="ignore") as f:
-                                content = f.read()
-                            # clave única para evitar colisiones en Streamlit
-                            safe_key = f"info_{idx}_{sd}"
-                            st.text_area("info.txt", value=content, height=200, key=safe_key)
-                        except Exception as e:
-                            st.error(f"ERROR!!! Leyendo info.txt en {sd}: {e}")
-                        finally:
-                            try:
-                                os.remove(local_info_path)
-                            except Exception:
-                                pass
+                    if sd in contents:
+                        # clave única para evitar colisiones en Streamlit
+                        safe_key = f"info_{idx}_{sd}"
+                        st.text_area("info.txt", value=contents[sd], height=200, key=safe_key)
                     else:
                         st.warning(f"'info.txt' no encontrado en: {sd}")
 
@@ -97,29 +131,53 @@ class ProgramoutputScreen:
         # Mensaje de éxito para Multiple Simulations Mode
         multi_sim = st.session_state.get("multi_sim_results")
         if not multi_sim:
-            tar_data = tar_output_files(name_server, name_user, ssh_key_options, working_directory)
-            if tar_data:
-                # 1) Intentamos grabar directamente en el directorio local elegido
-                local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
-                if local_dir and os.path.isdir(local_dir):
-                    target = os.path.join(local_dir, "ViscAI_output.tar.gz")
-
-                try:
-
-                    with open(target, "wb") as f:
-                        f.write(tar_data)
+            local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
+            # With a local directory the tar.gz is compressed on the server and streamed in
+            # chunks to the final file (nothing held in memory, no get per file)
+            if local_dir and os.path.isdir(local_dir) and st.session_state.get("output_tar_stream", True):
+                target = os.path.join(local_dir, "ViscAI_output.tar.gz")
+                if tar_output_files(name_server, name_user, ssh_key_options, working_directory, stream_to=target):
                     st.success(f"Output saved to local directory: `{target}`")
-                except Exception as e:
-                    st.error(f"Saving to `{local_dir}` failed: {e}")
-                # 2) Siempre ofrecemos también el enlace de descarga por si el usuario prefiere
-                b64 = base64.b64encode(tar_data).decode()
-                href = f'<a href="data:application/gzip;base64,{b64}" download="ViscAI_output.tar.gz">Download ViscAI output files</a>'
-                st.markdown(href, unsafe_allow_html=True)
+                    with open(target, "rb") as f:
+                        st.download_button("Download ViscAI output files", data=f,
+                                           file_name="ViscAI_output.tar.gz", mime="application/gzip")
+            else:
+                tar_data = tar_output_files(name_server, name_user, ssh_key_options, working_directory)
+                if tar_data:
+                    # 1) Intentamos grabar directamente en el directorio local elegido
+                    if local_dir and os.path.isdir(local_dir):
+                        target = os.path.join(local_dir, "ViscAI_output.tar.gz")
+                        try:
+                            with open(target, "wb") as f:
+                                f.write(tar_data)
+                            st.success(f"Output saved to local directory: `{target}`")
+                        except Exception as e:
+                            st.error(f"Saving to `{local_dir}` failed: {e}")
+                    # 2) Siempre ofrecemos también el enlace de descarga por si el usuario prefiere
+                    b64 = base64.b64encode(tar_data).decode()
+                    href = f'<a href="data:application/gzip;base64,{b64}" download="ViscAI_output.tar.gz">Download ViscAI output files</a>'
+                    st.markdown(href, unsafe_allow_html=True)
         else:
             local_dir = multi_sim.get("local_dir", "")
             if local_dir and os.path.isdir(local_dir):
                 st.success(
                     f"✅ Los resultados de las simulaciones múltiples se han guardado en el directorio local: `{local_dir}`")
+                # Plots of every simulation from the local database
+                db_path = os.path.join(local_dir, "viscai_database.db")
+                if os.path.exists(db_path) and st.button("Render G(t), G'(ω)/G''(ω) and GPCLS plots"):
+                    plots_dir = os.path.join(local_dir, "plots")
+                    try:
+                        jobs = curve_plot_jobs(load_db_curves(db_path), plots_dir)
+                        gpcls_dats = {sd: os.path.join(local_dir, sd, "gpclssys.dat") for sd in os.listdir(local_dir)
+                                      if sd.startswith("Mw_") and os.path.isfile(os.path.join(local_dir, sd, "gpclssys.dat"))}
+                        jobs += gpcls_plot_jobs(gpcls_dats, plots_dir)
+                        rendered = render_plots(jobs, workers=st.session_state.get("plot_workers"))
+                        failed = [p for p, r in rendered.items() if isinstance(r, Exception)]
+                        st.success(f"{len(rendered) - len(failed)} plots saved to `{plots_dir}`")
+                        if failed:
+                            st.warning(f"{len(failed)} plots failed (first: {os.path.basename(failed[0])}: {rendered[failed[0]]})")
+                    except Exception as e:
+                        st.error(f"ERROR!!! Plot rendering failed: {e}")
 
 
 
@@ -136,6 +194,13 @@ class ProgramoutputScreen:
         agr_files = [f for f in remote_files if f.lower().endswith(".agr")]
 
         if agr_files:
+            # All '.agr' files come in one tar stream and are rendered in one batch (content cache
+            # + parallel xmgrace); the PNGs belong to the cache and are not deleted here
+            with tempfile.TemporaryDirectory() as agr_dir:
+                local_agr = download_files_from_server(name_server, name_user, ssh_key_options,
+                                                       working_directory, agr_files, agr_dir)
+                rendered = convert_agr_files_to_png(list(local_agr.values()))
+
             for agr_file in agr_files:
                 #   TEST
                 if agr_file.lower() == "gt.agr":
@@ -144,33 +209,23 @@ class ProgramoutputScreen:
                     st.markdown("**Elastic modulus G'(ω) and viscous modulus G''(ω)**")
                 # elif GPCLS GRAPHICS!!!!!
 
-                remote_agr_path = os.path.join(working_directory, agr_file)
-                local_agr_path = download_file_from_server(name_server, name_user, ssh_key_options,
-                                                                remote_agr_path)
-                if local_agr_path and os.path.exists(local_agr_path):
-                    try:
-                        # Convert '.agr' > PNG by xmgrace
-                        png_path = convert_agr_to_png(local_agr_path)
-                        if os.path.exists(png_path):
-                            st.image(png_path, caption=f"'{agr_file}' plot") #  CONTINUE HERE
-                            # Download image
-                            with open(png_path, "rb") as img_file:
-                                btn = st.download_button(
-                                    label="Descargar imagen",
-                                    data=img_file,
-                                    file_name=agr_file.replace(".agr", ".png"), # DAT si se usa GPCLS
-                                    mime="image/png"
-                                )
-                        else:
-                            st.error(f"ERROR!!! Image not generated to {agr_file}.")
-                    except Exception as e:
-                        st.error(f"ERROR!!! {agr_file} > image conversion failed: {str(e)}")
-                    finally:
-                        os.remove(local_agr_path)
-                        if os.path.exists(png_path):
-                            os.remove(png_path)
-                else:
+                png_path = rendered.get(local_agr.get(agr_file))
+                if png_path is None:
                     st.error(f"{agr_file} file not downloaded.")
+                elif isinstance(png_path, Exception):
+                    st.error(f"ERROR!!! {agr_file} > image conversion failed: {str(png_path)}")
+                elif os.path.exists(png_path):
+                    st.image(png_path, caption=f"'{agr_file}' plot") #  CONTINUE HERE
+                    # Download image
+                    with open(png_path, "rb") as img_file:
+                        btn = st.download_button(
+                            label="Descargar imagen",
+                            data=img_file,
+                            file_name=agr_file.replace(".agr", ".png"), # DAT si se usa GPCLS
+                            mime="image/png"
+                        )
+                else:
+                    st.error(f"ERROR!!! Image not generated to {agr_file}.")
         #   TEST
         # —————— GPCLS plots ——————
         # buscamos el .dat correspondiente
@@ -200,6 +200,38 @@ class ServerScreen:
                 help="Ejemplos: 1024M, 2G"
             )
 
+            modes = ["full_send", "array", "packed"]
+            st.session_state["slurm_submit_mode"] = st.radio(
+                "Modo de envío de la rejilla",
+                modes,
+                index=modes.index(st.session_state.get("slurm_submit_mode", "full_send")),
+                format_func=lambda m: {"full_send": "full_send.sh (un sbatch por directorio)",
+                                       "array": "Job array (un único sbatch)",
+                                       "packed": "Job array empaquetado (varias simulaciones por job)"}[m],
+                horizontal=True
+            )
+            if st.session_state["slurm_submit_mode"] in ("array", "packed"):
+                st.session_state["slurm_array_max_concurrent"] = st.number_input(
+                    "Máximo de tareas simultáneas (%N)",
+                    min_value=1,
+                    value=int(st.session_state.get("slurm_array_max_concurrent", 60))
+                )
+            if st.session_state["slurm_submit_mode"] == "packed":
+                st.session_state["slurm_pack_target_secs"] = st.number_input(
+                    "Duración objetivo por job (s)",
+                    min_value=60,
+                    value=int(st.session_state.get("slurm_pack_target_secs", 1800)),
+                    help="Se agrupan simulaciones (según su Mw) hasta llenar este tiempo "
+                         "con las CPUs por tarea indicadas"
+                )
+            st.session_state["slurm_time_safety"] = st.number_input(
+                "Margen sobre el tiempo estimado (--time)",
+                min_value=1.0,
+                value=float(st.session_state.get("slurm_time_safety", 3.0)),
+                step=0.5,
+                help="Con histórico de ejecuciones anteriores, '--time' = tiempo predicho x este factor"
+            )
+
             # st.session_state["slurm_job_name"] = st.text_input(
             #     "Prefijo del nombre del job",
             #     value=st.session_state.get("slurm_job_name", "BoBjob")
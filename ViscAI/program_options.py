@@ -3,7 +3,7 @@
 # ViscAI/program_options.py
 import streamlit as st
 import os
-import stat
+import shlex
 import tempfile
 from pathlib import Path
 
@@ -14,6 +14,9 @@ from ViscAI.utils.gnu_creations import gnu_modulus_generation, gnu_gpclssys_gene
 from ViscAI.utils.clean_files import clean_remote_directory
 from ViscAI.utils.bob_rc_transfer import bob_rc_transfering
 from ViscAI.utils.ssh_connection import connect_remote_server
+from ViscAI.utils.sftp_transfer import DEFAULT_CHANNELS, transfer_many, get_tar, mirror_tree, put_tree
+from ViscAI.utils.slurm_tracker import JOB_STATE_FILENAME, start_tracker, summarize
+from ViscAI.utils.runtime_model import HISTORY_FILENAME, RuntimeModel, input_features, record_runtimes
 from ViscAI.utils.get_conda_path import get_conda_sh_path
 from ViscAI.utils.pipeline.database_preprocessed import database_inspection, preprocess_database, build_resampled_rheology_features
 from ViscAI.utils.pipeline.training_preparation import prepare_rheology_dataset, validate_splits
@@ -21,9 +24,15 @@ from ViscAI.utils.pipeline.train_and_diagnostic_models import (train_baseline_mo
                                                                bootstrap_metric, compute_permutation_importance,
                                                                save_shap_summary)
 from ViscAI.utils.pipeline.worst_cases_analysis import save_worst_cases, plot_worst_cases, check_worst_cases_ranges, check_worst_cases_local_density, rf_uncertainty_for_worst_cases
-from ViscAI.utils.upload_slurms import _slurm_submit_multiple_mw
+from ViscAI.utils.upload_slurms import _slurm_submit_multiple_mw, _slurm_submit_array, _runtime_predictions
+from ViscAI.utils.local_executor import LocalGridRunner, write_tree
 
 import time
+import urllib.request
+
+# Ficheros comunes a toda la rejilla (polymer file, bob.rc), enlazados desde cada Mw_*
+SHARED_DIRNAME = "viscai_shared"
+DEFAULT_BOBRC_URL = "https://sourceforge.net/projects/bob-rheology/files/bob-rheology/bob2.5/bob.rc"
 
 
 # ***NEWWW*** helper común para reescritura (dist, Mw, PDI)
@@ -88,8 +97,12 @@ def viscai_paramgrid_run(
     input_filename = os.path.basename(input_file)
     base_name, ext = os.path.splitext(input_filename)
 
-    ssh = connect_remote_server(name_server, name_user, ssh_key_options)
-    sftp = ssh.open_sftp()
+    # NUEVO CAMBIO: backend local (execution_backend == "local"): sin SSH ni SLURM, la rejilla se
+    # crea y ejecuta en <local_dir> (ver _paramgrid_run_local)
+    local_backend = st.session_state.get("execution_backend", "ssh") == "local"
+    if not local_backend:
+        ssh = connect_remote_server(name_server, name_user, ssh_key_options)
+        sftp = ssh.open_sftp()
 
     batch_flag = " -b" if st.session_state.get("batch_mode", False) else ""
     genpoly_flag = " -p" if st.session_state.get("generate_polymers", False) else ""
@@ -102,64 +115,76 @@ def viscai_paramgrid_run(
     full_send_created = False
     slurm_created_results = None
 
+    # NUEVO CAMBIO: toda la rejilla se prepara en memoria y se sube en un único flujo tar.
+    # polymer file y bob.rc se guardan una vez en SHARED_DIRNAME y cada subdirectorio los enlaza.
+    shared_files, shared_links = {}, []
+    polymer_filename = None
+    if polymer_file:
+        try:
+            polymer_filename = os.path.basename(polymer_file)
+            with open(polymer_file, "rb") as f:
+                shared_files[f"{SHARED_DIRNAME}/{polymer_filename}"] = f.read()
+            shared_links.append(polymer_filename)
+        except Exception as e:
+            results.append(("POLYMER_FILE", f"Error leyendo polymer file: {e}"))
+            polymer_filename = None
+
+    # bob.rc: el personalizado se sube una vez; el por defecto se descarga una vez en remoto
+    fetch_default_bobrc = True
+    if st.session_state.get("configure_rc_toggle", False):
+        custom_bobrc = st.session_state.get("bobrc_file", "")
+        if custom_bobrc and os.path.exists(custom_bobrc):
+            with open(custom_bobrc, "rb") as f:
+                shared_files[f"{SHARED_DIRNAME}/bob.rc"] = f.read()
+            fetch_default_bobrc = False
+        else:
+            st.warning("No se encontró 'bob.rc' local -> usando el por defecto.")
+    shared_links.append("bob.rc")
+
+    grid_files, grid_links = dict(shared_files), {}
     for mw in mw_list:
         for dist_code in dist_opts:
             for pdi_val in pdi_opts:
                 # Subdirectorio único por combinación
                 pdi_token  = "NA" if (pdi_val  is None) else str(pdi_val).replace(".", "_")
                 dist_token = "NA" if (dist_code is None) else str(int(dist_code))
-                subdir = f"{working_directory}/Mw_{str(mw).replace('.', '_')}__D{dist_token}__PDI_{pdi_token}"
-                try:
-                    ssh.exec_command(f"mkdir -p '{subdir}'")
-                except Exception:
-                    pass
+                subdir_name = f"Mw_{str(mw).replace('.', '_')}__D{dist_token}__PDI_{pdi_token}"
 
-                # Crear input modificado y subirlo
+                # Crear input modificado (en memoria)
                 try:
                     lines = _rewrite_input_with_mw_dist_pdi(input_file, float(mw), dist_code, pdi_val)
                     new_filename = f"{base_name}_MW_{str(mw).replace('.', '_')}_D{dist_token}_PDI_{pdi_token}{ext}"
-                    local_tmp = os.path.join(tempfile.gettempdir(), new_filename)
-                    with open(local_tmp, "w") as f:
-                        f.writelines(lines)
-                    remote_input = f"{subdir}/{new_filename}"
-                    sftp.put(local_tmp, remote_input)
-                    os.remove(local_tmp)
+                    grid_files[f"{subdir_name}/{new_filename}"] = "".join(lines).encode()
                 except Exception as e:
-                    results.append((mw, dist_code, pdi_val, f"Error creando/subiendo input: {e}"))
+                    results.append((mw, dist_code, pdi_val, f"Error creando input: {e}"))
                     continue
+                for name in shared_links:
+                    grid_links[f"{subdir_name}/{name}"] = f"../{SHARED_DIRNAME}/{name}"
 
-                # Subir polymer file si aplica
-                polymer_filename = None
-                if polymer_file:
-                    try:
-                        polymer_filename = os.path.basename(polymer_file)
-                        sftp.put(polymer_file, f"{subdir}/{polymer_filename}")
-                    except Exception as e:
-                        results.append((mw, dist_code, pdi_val, f"Error subiendo polymer file: {e}"))
-                        polymer_filename = None
-
-                # bob.rc
-                try:
-                    if st.session_state.get("configure_rc_toggle", False):
-                        custom_bobrc = st.session_state.get("bobrc_file", "")
-                        if custom_bobrc and os.path.exists(custom_bobrc):
-                            sftp.put(custom_bobrc, f"{subdir}/bob.rc")
-                        else:
-                            st.warning(f"[Mw={mw}] No se encontró 'bob.rc' local -> usando el por defecto.")
-                            ssh.exec_command(
-                                "wget -q https://sourceforge.net/projects/bob-rheology/files/"
-                                "bob-rheology/bob2.5/bob.rc "
-                                f"-O '{subdir}/bob.rc'"
-                            )
-                    else:
-                        ssh.exec_command(
-                            "wget -q https://sourceforge.net/projects/bob-rheology/files/"
-                            "bob-rheology/bob2.5/bob.rc "
-                            f"-O '{subdir}/bob.rc'"
-                        )
-                except Exception as e:
-                    results.append((mw, dist_code, pdi_val, f"Error preparando bob.rc: {e}"))
-                    continue
+    if local_backend:
+        results = _paramgrid_run_local(input_file, grid_files, grid_links, shared_files,
+                                       polymer_filename, fetch_default_bobrc, results)
+        results.append(("EXPECTED_COMBINATIONS", len(mw_list) * len(dist_opts) * len(pdi_opts)))
+        return results
+
+    try:
+        put_tree(ssh, working_directory, grid_files, grid_links)
+        if fetch_default_bobrc:
+            # viscai_shared/ solo existe si put_tree recibió algún fichero común: crearlo siempre
+            shared_dir = f"{working_directory}/{SHARED_DIRNAME}"
+            stdin, stdout, stderr = ssh.exec_command(
+                f"mkdir -p {shlex.quote(shared_dir)} && "
+                f"wget -q {DEFAULT_BOBRC_URL} -O {shlex.quote(shared_dir + '/bob.rc')}"
+            )
+            rc = stdout.channel.recv_exit_status()
+            if rc != 0:
+                err = stderr.read().decode("utf-8", errors="ignore").strip()
+                raise RuntimeError(f"default bob.rc download failed (rc={rc}){': ' + err if err else ''}")
+        results.append(("GRID_STAGED", f"{len(grid_files) - len(shared_files)} inputs, "
+                                       f"{len(grid_links)} links in {working_directory}"))
+    except Exception as e:
+        results.append(("GRID_STAGE_ERROR", f"Error subiendo la rejilla: {e}"))
+        st.warning(f"Error subiendo la rejilla de inputs: {e}")
 
 
     # **************** NUEVO CAMBIO **********
@@ -182,11 +207,23 @@ def viscai_paramgrid_run(
 
 
 
-    # ----------------- FUERA DEL BUCLE: crear/ subir / submit slurm scripts UNA VEZ -----------------
-    # ****************************NUEVO CAMBIO*************
-    try:
-        # Llamada única para crear/colocar todos los slurm.sh (opción B)
-        slurm_created_results = _slurm_submit_multiple_mw(
+    # NUEVO CAMBIO: modelo de coste aprendido de ejecuciones anteriores (<local_dir>/bob_runtime_history.csv):
+    # ordena el envío de más a menos costoso y dimensiona '--time' / memoria de los scripts SLURM
+    local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
+    has_local_dir = bool(local_dir and os.path.isdir(local_dir))
+    history_path = os.path.join(local_dir if has_local_dir else tempfile.gettempdir(), HISTORY_FILENAME)
+    runtime_model = RuntimeModel.load(history_path)
+    results.append(("RUNTIME_MODEL", f"{runtime_model.n_samples} past runs in {history_path}"
+                                     + ("" if runtime_model.fitted else " (not enough data, heuristic order)")))
+
+    # NUEVO CAMBIO: modo job array -> un único sbatch con '--array=1-N%M' (sin full_send.sh);
+    # 'packed': cada tarea del array ejecuta un grupo de subdirectorios en paralelo
+    submit_mode = st.session_state.get("slurm_submit_mode", "full_send")
+    use_array = submit_mode in ("array", "packed")
+    submitter_jobid = None
+    submit_failed = False
+    if use_array:
+        array_results = _slurm_submit_array(
             name_server=name_server,
             name_user=name_user,
             ssh_key_options=ssh_key_options,
@@ -194,25 +231,49 @@ def viscai_paramgrid_run(
             mw_list=mw_list,
             input_file=input_file,
             polymer_file=polymer_file,
+            pack=(submit_mode == "packed"),
+            runtime_model=runtime_model,
         )
-        if slurm_created_results:
-            for r in slurm_created_results:
-                results.append(("SLURM", str(r)))
-        results.append(("SLURM_SUBMIT", "DONE"))
-        st.success("SLURM scripts created/submitted (ver resumen).")
-    except Exception as e:
-        results.append(("SLURM", f"ERROR calling external slurm submit: {e}"))
-        st.warning(f"SLURM submit failed: {e}")
-    # ****************************NUEVO CAMBIO*************
+        for r in array_results:
+            results.append(("SLURM_ARRAY", str(r)))
+        if any(r[1] == "ERROR" for r in array_results):
+            submit_failed = True
+            st.warning(f"SLURM array submit failed: {array_results}")
+        else:
+            st.success(f"Rejilla encolada como job array: {array_results[-1][2]}")
+    else:
+        # ----------------- FUERA DEL BUCLE: crear/ subir / submit slurm scripts UNA VEZ -----------------
+        # ****************************NUEVO CAMBIO*************
+        try:
+            # Llamada única para crear/colocar todos los slurm.sh (opción B)
+            slurm_created_results = _slurm_submit_multiple_mw(
+                name_server=name_server,
+                name_user=name_user,
+                ssh_key_options=ssh_key_options,
+                working_dir=working_directory,
+                mw_list=mw_list,
+                input_file=input_file,
+                polymer_file=polymer_file,
+                runtime_model=runtime_model,
+            )
+            if slurm_created_results:
+                for r in slurm_created_results:
+                    results.append(("SLURM", str(r)))
+            results.append(("SLURM_SUBMIT", "DONE"))
+            st.success("SLURM scripts created/submitted (ver resumen).")
+        except Exception as e:
+            results.append(("SLURM", f"ERROR calling external slurm submit: {e}"))
+            st.warning(f"SLURM submit failed: {e}")
+        # ****************************NUEVO CAMBIO*************
 
-    # ----------------- Crear / subir / enviar full_send.sh UNA SOLA VEZ -----------------
-    # ****************************NUEVO CAMBIO*************
-    try:
-        #   test
-        # contenido del full_send.sh con corrección wc -l
+        # ----------------- Crear / subir / enviar full_send.sh UNA SOLA VEZ -----------------
+        # ****************************NUEVO CAMBIO*************
+        try:
+            #   test
+            # contenido del full_send.sh con corrección wc -l
 
-        # **************** NUEVO CAMBIO **********
-        full_send_content = """#!/bin/bash
+            # **************** NUEVO CAMBIO **********
+            full_send_content = """#!/bin/bash
 #SBATCH --partition=all
 #SBATCH -N 1
 #SBATCH -n 1
@@ -228,8 +289,8 @@ SLEEP_WHEN_BUSY=60   # segundos a esperar cuando se alcanza el límite
 # Si quieres otro usuario, asigna USERNAME aquí
 USERNAME="${USER}"
 
-# Number of total jobs (number of Mw*/ dirs)
-DIRBOB=( $(ls -d Mw*/ 2>/dev/null) )
+# Number of total jobs (number of Mw*/ dirs), most expensive first if run_order.txt exists
+DIRBOB=( $(cat run_order.txt 2>/dev/null || ls -d Mw*/ 2>/dev/null) )
 TOTALJOBS=${#DIRBOB[@]}
 
 if [[ ${TOTALJOBS} -eq 0 ]]; then
@@ -272,148 +333,130 @@ done
 echo "Jobs submission loop finished at $(date)" >> "${WK}/full_send.log"
 echo "Jobs Done!!!!!"
     """
-# **************** NUEVO CAMBIO **********
-
+    # **************** NUEVO CAMBIO **********
 
 
 
 
-        # Guardar localmente
-        local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
-        if local_dir and os.path.isdir(local_dir):
-            local_full_send = os.path.join(local_dir, "full_send.sh")
-        else:
-            local_full_send = os.path.join(tempfile.gettempdir(), "full_send.sh")
 
-        with open(local_full_send, "w") as f:
-            f.write(full_send_content)
-        try:
-            os.chmod(local_full_send, 0o750)
-        except Exception:
-            pass
-        results.append(("FULL_SEND_LOCAL", f"Created {local_full_send}"))
+            # Guardar localmente
+            local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
+            if local_dir and os.path.isdir(local_dir):
+                local_full_send = os.path.join(local_dir, "full_send.sh")
+            else:
+                local_full_send = os.path.join(tempfile.gettempdir(), "full_send.sh")
 
-        # Subir al remoto
-        remote_full_send = os.path.join(working_directory, "full_send.sh")
-        try:
-            sftp.put(local_full_send, remote_full_send)
+            with open(local_full_send, "w") as f:
+                f.write(full_send_content)
             try:
-                sftp.chmod(remote_full_send, 0o750)
+                os.chmod(local_full_send, 0o750)
             except Exception:
                 pass
-            results.append(("FULL_SEND_REMOTE", f"Uploaded to {remote_full_send}"))
-            st.success(f"'full_send.sh' creado localmente y subido a: {remote_full_send}")
+            results.append(("FULL_SEND_LOCAL", f"Created {local_full_send}"))
+
+            # Subir al remoto
+            remote_full_send = os.path.join(working_directory, "full_send.sh")
+            try:
+                sftp.put(local_full_send, remote_full_send)
+                try:
+                    sftp.chmod(remote_full_send, 0o750)
+                except Exception:
+                    pass
+                results.append(("FULL_SEND_REMOTE", f"Uploaded to {remote_full_send}"))
+                st.success(f"'full_send.sh' creado localmente y subido a: {remote_full_send}")
+            except Exception as e:
+                results.append(("FULL_SEND_UPLOAD_ERROR", str(e)))
+                st.warning(f"No se pudo subir full_send.sh al remoto: {e}")
         except Exception as e:
-            results.append(("FULL_SEND_UPLOAD_ERROR", str(e)))
-            st.warning(f"No se pudo subir full_send.sh al remoto: {e}")
-    except Exception as e:
-        results.append(("FULL_SEND_ERROR", str(e)))
-        st.warning(f"Error creando/subiendo full_send.sh: {e}")
+            results.append(("FULL_SEND_ERROR", str(e)))
+            st.warning(f"Error creando/subiendo full_send.sh: {e}")
+            # ****************************NUEVO CAMBIO*************
+
+        # ----------------- Enviar full_send.sh UNA VEZ -----------------
+        # ****************************NUEVO CAMBIO*************
+        try:
+            cmd = f"cd '{working_directory}' && sbatch full_send.sh"
+            stdin, stdout, stderr = ssh.exec_command(cmd, idempotent=False)
+            exit_code = stdout.channel.recv_exit_status()
+            out_text = stdout.read().decode().strip()
+            err_text = stderr.read().decode().strip()
+
+            if exit_code == 0:
+                toks = out_text.split()
+                submitter_jobid = toks[-1] if toks and toks[-1].isdigit() else None
+                results.append(("FULL_SEND_SUBMIT_OK", out_text or err_text or "sbatch returned 0"))
+                st.success(f"'full_send.sh' enviado con sbatch: {out_text or err_text}")
+            else:
+                submit_failed = True
+                results.append(("FULL_SEND_SUBMIT_ERROR", f"rc={exit_code}, out={out_text}, err={err_text}"))
+                st.warning(f"sbatch fallo: rc={exit_code}, err={err_text}")
+        except Exception as e:
+            submit_failed = True
+            results.append(("FULL_SEND_SUBMIT_EXCEPTION", str(e)))
+            st.warning(f"Error ejecutando sbatch full_send.sh en remoto: {e}")
         # ****************************NUEVO CAMBIO*************
 
-    # ----------------- Enviar full_send.sh UNA VEZ -----------------
-    # ****************************NUEVO CAMBIO*************
-    try:
-        cmd = f"cd '{working_directory}' && sbatch full_send.sh"
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        exit_code = stdout.channel.recv_exit_status()
-        out_text = stdout.read().decode().strip()
-        err_text = stderr.read().decode().strip()
-
-        if exit_code == 0:
-            results.append(("FULL_SEND_SUBMIT_OK", out_text or err_text or "sbatch returned 0"))
-            st.success(f"'full_send.sh' enviado con sbatch: {out_text or err_text}")
-        else:
-            results.append(("FULL_SEND_SUBMIT_ERROR", f"rc={exit_code}, out={out_text}, err={err_text}"))
-            st.warning(f"sbatch fallo: rc={exit_code}, err={err_text}")
-    except Exception as e:
-        results.append(("FULL_SEND_SUBMIT_EXCEPTION", str(e)))
-        st.warning(f"Error ejecutando sbatch full_send.sh en remoto: {e}")
-    # ****************************NUEVO CAMBIO*************
 
-    # ********************** Esperar a que los jobs enviados por full_send.sh terminen ****************
-    # ****************************NUEVO CAMBIO*************
+    # NUEVO CAMBIO: si el envío falló no habrá jobs.txt: ni tracker (esperaría max_wait_secs) ni descarga
+    if submit_failed:
+        results.append(("SLURM_SUBMIT_FAILED", "Job tracking and working directory collect skipped"))
+        try: sftp.close()
+        except Exception: pass
+        try: ssh.close()
+        except Exception: pass
+        results.append(("EXPECTED_COMBINATIONS", len(mw_list) * len(dist_opts) * len(pdi_opts)))
+        return results
+
+    # ********************** Seguimiento de los jobs enviados por full_send.sh ****************
+    # NUEVO CAMBIO: un tracker en segundo plano (squeue + sacct en una sola orden, backoff
+    # exponencial) sustituye la espera activa; el estado queda en <local_dir>/slurm_jobs.json
+    sessions = int(st.session_state.get("sftp_channels", DEFAULT_CHANNELS))
+    block_until_done = bool(st.session_state.get("fullsend_block_until_done", False))
+    state_path = os.path.join(local_dir if has_local_dir else tempfile.gettempdir(), JOB_STATE_FILENAME)
+
+    base_features = input_features(input_file)
+
+    def _record_runtimes():
+        try:
+            ssh_rt = connect_remote_server(name_server, name_user, ssh_key_options)
+            return record_runtimes(ssh_rt, working_directory, history_path, base_features)
+        except Exception:
+            return 0
+
+    def _collect_when_done(state):
+        # Hilo del tracker: sin llamadas a st.*
+        recorded = _record_runtimes()
+        if not has_local_dir:
+            return {"runtimes_recorded": recorded}
+        tag, msg = _collect_working_directory(name_server, name_user, ssh_key_options,
+                                              working_directory, local_dir, sessions)
+        return {"tag": tag, "message": msg, "runtimes_recorded": recorded}
+
     try:
-        remote_jobs_txt = os.path.join(working_directory, "jobs.txt")
-        # espera a que exista jobs.txt (timeout configurable)
-        wait_for_jobsfile_secs = int(st.session_state.get("fullsend_wait_jobsfile_secs", 600))  # default 10 min
-        poll_interval = float(st.session_state.get("fullsend_poll_interval_secs", 5.0))  # default 5 s
-        waited = 0.0
-        jobsfile_found = False
-        while waited < wait_for_jobsfile_secs:
-            try:
-                sftp.stat(remote_jobs_txt)
-                jobsfile_found = True
-                break
-            except Exception:
-                time.sleep(poll_interval)
-                waited += poll_interval
-
-        if not jobsfile_found:
-            results.append(
-                ("FULL_SEND_JOBSFILE_TIMEOUT", f"No se encontró {remote_jobs_txt} tras {wait_for_jobsfile_secs}s"))
-            st.warning(
-                f"No se encontró {remote_jobs_txt} en remoto tras {wait_for_jobsfile_secs}s; procediendo a descarga (puede faltar output generado por jobs).")
+        tracker = start_tracker(
+            name_server, name_user, ssh_key_options, working_directory, state_path,
+            submitter_jobid=submitter_jobid,
+            min_interval=float(st.session_state.get("fullsend_poll_interval_secs", 5.0)),
+            max_interval=float(st.session_state.get("fullsend_poll_max_interval_secs", 300.0)),
+            max_wait_secs=int(st.session_state.get("fullsend_wait_jobsfile_secs", 600))
+                          + int(st.session_state.get("fullsend_wait_jobs_secs", 7200)),
+            on_done=None if block_until_done else _collect_when_done,
+        )
+        st.session_state["slurm_job_state_path"] = state_path
+        results.append(("FULL_SEND_TRACKER", f"Job state: {state_path}"))
+        if block_until_done:
+            tracker.wait()
+            counts = summarize(tracker.state())
+            results.append(("FULL_SEND_JOBS_DONE", str(counts)))
+            results.append(("RUNTIME_MODEL_RECORDED", _record_runtimes()))
+            st.success(f"Jobs enviados por full_send.sh terminados: {counts}. Procediendo a descarga.")
         else:
-            # Leer job ids desde jobs.txt
-            jobids = []
-            try:
-                with sftp.open(remote_jobs_txt, "r") as jf:
-                    raw = jf.read().decode() if isinstance(jf.read(), bytes) else jf.read()
-                    # Note: above .read() was used twice to be robust; if your sftp.open returns text, adapt.
-                # (Mejor reabrir para leer correctamente)
-                with sftp.open(remote_jobs_txt, "r") as jf2:
-                    lines = jf2.readlines()
-                for ln in lines:
-                    toks = ln.strip().split()
-                    if len(toks) >= 1:
-                        jobids.append(toks[0])
-            except Exception as e:
-                # Si no pudimos leer jobs.txt, lo notificamos y seguiremos intentando vía squeue por patrón
-                results.append(("FULL_SEND_JOBS_READ_ERR", str(e)))
-                jobids = []
-
-            # Si tenemos jobids: poll hasta que ninguno esté en squeue
-            if jobids:
-                joblist = ",".join(jobids)
-                st.info(f"Esperando a que terminen {len(jobids)} jobs: {joblist}")
-                max_wait_for_jobs_secs = int(st.session_state.get("fullsend_wait_jobs_secs", 7200))  # default 2h
-                waited = 0.0
-                still_running = True
-                while waited < max_wait_for_jobs_secs and still_running:
-                    try:
-                        # Pregunta a squeue cuántos de esos jobids siguen en cola
-                        stdin2, stdout2, stderr2 = ssh.exec_command(f"squeue -h -j {joblist} | wc -l")
-                        cnt_text = stdout2.read().decode().strip()
-                        cnt = int(cnt_text) if cnt_text.isdigit() else 0
-                    except Exception:
-                        # En caso de error con squeue, asumimos que aún puede haber jobs; dormir y reintentar
-                        cnt = 1
-
-                    if cnt == 0:
-                        still_running = False
-                        break
-                    else:
-                        # esperar y volver a comprobar
-                        time.sleep(max(5.0, poll_interval))
-                        waited += max(5.0, poll_interval)
-                if still_running:
-                    results.append(("FULL_SEND_JOBS_TIMEOUT",
-                                    f"Algunos jobs siguen en cola tras {max_wait_for_jobs_secs}s; descargando lo disponible."))
-                    st.warning(
-                        f"Algunos jobs siguen en cola tras {max_wait_for_jobs_secs}s; procediendo a descargar lo que ya exista.")
-                else:
-                    results.append(("FULL_SEND_JOBS_DONE", f"Todos los jobs ({len(jobids)}) han terminado."))
-                    st.success(f"Todos los jobs enviados por full_send.sh han terminado. Procediendo a descarga.")
-            else:
-                # Si no hay jobids, intentamos una espera razonable para dar tiempo a que se generen salidas
-                fallback_wait = int(st.session_state.get("fullsend_fallback_wait_secs", 60))
-                st.info(f"No se han leído jobids de jobs.txt; esperando otros {fallback_wait}s antes de descargar.")
-                time.sleep(fallback_wait)
-
+            st.info("Los jobs se siguen en segundo plano (ver 'ViscAI output'); el directorio de trabajo "
+                    "se descargará automáticamente al terminar.")
     except Exception as e:
         results.append(("FULL_SEND_WAIT_EXCEPTION", str(e)))
         st.warning(f"Error durante espera/consulta de jobs: {e}")
+        block_until_done = True
     # ****************************NUEVO CAMBIO*************
 
 
@@ -429,47 +472,18 @@ echo "Jobs Done!!!!!"
 
     #   DESCARGAR WORKING SIRECORY A LOCAL
     # ****************************NUEVO CAMBIO*************
-    try:
-        local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
-        if local_dir and os.path.isdir(local_dir):
-            ssh_dl = connect_remote_server(name_server, name_user, ssh_key_options)
-            sftp_dl = ssh_dl.open_sftp()
-            try:
-                entries = sftp_dl.listdir_attr(working_directory)
-            except Exception:
-                entries = []
-
-            if not entries:
-                results.append(("COLLECT_ALL", "No entries found in remote working_directory"))
+    if block_until_done:
+        if has_local_dir:
+            tag, msg = _collect_working_directory(name_server, name_user, ssh_key_options,
+                                                  working_directory, local_dir, sessions,
+                                                  progress=_mirror_progress())
+            results.append((tag, msg))
+            if tag == "COLLECT_ALL":
+                st.success(f"Todos los ficheros de '{working_directory}' descargados a '{local_dir}'")
             else:
-                try:
-                    for entry in entries:
-                        rname = entry.filename
-                        rpath = working_directory.rstrip("/") + "/" + rname
-                        lpath = os.path.join(local_dir, rname)
-                        if stat.S_ISDIR(entry.st_mode):
-                            _download_tree(sftp_dl, rpath, lpath)
-                        else:
-                            os.makedirs(os.path.dirname(lpath) or local_dir, exist_ok=True)
-                            sftp_dl.get(rpath, lpath)
-                    results.append(("COLLECT_ALL", f"Downloaded all content of {working_directory} to {local_dir}"))
-                    st.success(f"Todos los ficheros de '{working_directory}' descargados a '{local_dir}'")
-                except Exception as e:
-                    results.append(("COLLECT_ALL_ERROR", str(e)))
-                    st.warning(f"Error descargando todo el working_directory: {e}")
-            try:
-                sftp_dl.close()
-            except Exception:
-                pass
-            try:
-                ssh_dl.close()
-            except Exception:
-                pass
+                st.warning(f"Error descargando todo el working_directory: {msg}")
         else:
             results.append(("COLLECT_ALL", "Local directory not defined - skip full collect"))
-    except Exception as e:
-        results.append(("COLLECT_ALL_EXCEPTION", str(e)))
-        st.warning(f"Error general descargando working_directory: {e}")
 
 
     # # **************************** CAMBIO ****************************
@@ -550,6 +564,68 @@ echo "Jobs Done!!!!!"
     return results
 
 
+def _paramgrid_run_local(input_file, grid_files, grid_links, shared_files, polymer_filename,
+                         fetch_default_bobrc, results):
+    """
+    Backend local de viscai_paramgrid_run: la misma rejilla (Mw_*__D*__PDI_* + viscai_shared/) se
+    escribe en <local_dir> y se ejecuta con LocalGridRunner (local_workers BoB a la vez, límite
+    local_timeout_secs por simulación), de más a menos costosa según el modelo de coste.
+    El resultado queda listo para database_db_creation() en modo local (name_server=None).
+    """
+    local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
+    if not (local_dir and os.path.isdir(local_dir)):
+        results.append(("LOCAL_RUN_ERROR", "Local directory not defined"))
+        st.error("ERROR!!! Local directory not defined or does not exist.")
+        return results
+
+    try:
+        # bob.rc por defecto antes de los enlaces (si no hay symlinks, write_tree copia el destino)
+        local_bobrc = os.path.join(local_dir, SHARED_DIRNAME, "bob.rc")
+        if fetch_default_bobrc and not os.path.exists(local_bobrc):
+            os.makedirs(os.path.dirname(local_bobrc), exist_ok=True)
+            urllib.request.urlretrieve(DEFAULT_BOBRC_URL, local_bobrc)
+        write_tree(local_dir, grid_files, grid_links)
+        results.append(("GRID_STAGED", f"{len(grid_files) - len(shared_files)} inputs, "
+                                       f"{len(grid_links)} links in {local_dir}"))
+    except Exception as e:
+        results.append(("GRID_STAGE_ERROR", f"Error creando la rejilla local: {e}"))
+        st.warning(f"Error creando la rejilla de inputs en local: {e}")
+
+    # (subdir, dat, polymer) por combinación, de más a menos costosa
+    jobs = [(name.split("/", 1)[0], name.split("/", 1)[1], polymer_filename)
+            for name in grid_files if not name.startswith(f"{SHARED_DIRNAME}/")]
+    history_path = os.path.join(local_dir, HISTORY_FILENAME)
+    runtime_model = RuntimeModel.load(history_path)
+    predictions = _runtime_predictions([sd for sd, _, _ in jobs], input_file, runtime_model)
+    jobs.sort(key=lambda job: -predictions[job[0]][0])
+
+    runner = LocalGridRunner(
+        local_dir, jobs,
+        bob_exe=st.session_state.get("bob_local_fullpath") or "bob2p5",
+        flags=("-b" if st.session_state.get("batch_mode", False) else "",
+               "-p" if st.session_state.get("generate_polymers", False) else ""),
+        workers=int(st.session_state.get("local_workers", os.cpu_count() or 1)),
+        timeout_secs=float(st.session_state.get("local_timeout_secs", 0)),
+    )
+    st.session_state["slurm_job_state_path"] = runner.state_path
+    box = st.empty()
+
+    def _report(state):
+        counts = summarize(state)
+        box.info(f"Local run: {counts['completed']} completed, {counts['running']} running, "
+                 f"{counts['pending']} pending, {counts['failed']} failed")
+
+    counts = summarize(runner.run(progress=_report))
+    results.append(("LOCAL_RUN", f"{counts} (workers={runner.workers}, state: {runner.state_path})"))
+    results.append(("RUNTIME_MODEL_RECORDED",
+                     record_runtimes(None, local_dir, history_path, input_features(input_file))))
+    if counts["failed"]:
+        st.warning(f"{counts['failed']} simulations failed (see bob_task.out in each Mw_* directory).")
+    else:
+        st.success(f"{counts['completed']} simulations completed in {local_dir}")
+    return results
+
+
 def reset_bob_options():
     st.session_state.input_options = {}
     st.session_state.batch_mode = False
@@ -630,25 +706,33 @@ def _sync_pyrheo_per_mw_to_local(
     if not local_dir or not os.path.isdir(local_dir):
         st.info("Directorio local no definido: no se sincronizan CSV por-Mw.")
         return
+    # NUEVO CAMBIO: todos los ficheros en un lote (varios canales SFTP o un único flujo tar)
+    channels = int(st.session_state.get("sftp_channels", DEFAULT_CHANNELS))
+    use_tar = bool(st.session_state.get("sftp_use_tar", False))
     try:
         ssh = connect_remote_server(name_server, name_user, ssh_key_options)
         sftp = ssh.open_sftp()
         # Enumerar subdirectorios Mw_* en remoto
         subdirs = [d for d in sftp.listdir(working_directory) if d.startswith("Mw_")]
+        # Dos ficheros pyRheo por-Mw esperados dentro de cada subdir
+        per_mw_files = ["02-relaxation_pyRheo.csv", "02-dynamic_pyRheo.csv"]
+        pairs = []
         for sd in subdirs:
-            remote_sd = f"{working_directory}/{sd}"
             local_sd = os.path.join(local_dir, sd)
             os.makedirs(local_sd, exist_ok=True)
-            # Dos ficheros pyRheo por-Mw esperados dentro del subdir
-            per_mw_files = ["02-relaxation_pyRheo.csv", "02-dynamic_pyRheo.csv"]
             for fname in per_mw_files:
-                rpath = f"{remote_sd}/{fname}"
-                lpath = os.path.join(local_sd, fname)
-                try:
-                    sftp.get(rpath, lpath)
-                except Exception:
-                    # Si aún no existe en remoto (p. ej., job no ha terminado), ignoramos y seguimos
-                    pass
+                pairs.append((f"{working_directory}/{sd}/{fname}", os.path.join(local_sd, fname)))
+
+        # Si alguno aún no existe en remoto (p. ej., job no ha terminado), se ignora
+        done = False
+        if use_tar:
+            try:
+                get_tar(ssh, pairs, working_directory)
+                done = True
+            except Exception as e:
+                st.warning(f"Descarga tar no disponible, se usa SFTP: {e}")
+        if not done:
+            transfer_many(ssh, pairs, "get", channels=channels, sftp=sftp)
         sftp.close()
         ssh.close()
         st.success(f"Sincronizados pyRheo por-Mw en: {local_dir}")
@@ -726,17 +810,37 @@ def _cleanup_root_pyrheo_csv(
     except Exception as e:
         st.warning(f"Limpieza de agregados fallida: {e}")
 
-# --- Utilidad: descarga recursiva de un directorio remoto a local ---
-def _download_tree(sftp, remote_path: str, local_path: str):
-    os.makedirs(local_path, exist_ok=True)
-    for entry in sftp.listdir_attr(remote_path):
-        rname = entry.filename
-        rpath = remote_path.rstrip('/') + '/' + rname
-        lpath = os.path.join(local_path, rname)
-        if stat.S_ISDIR(entry.st_mode):
-            _download_tree(sftp, rpath, lpath)
-        else:
-            sftp.get(rpath, lpath)
+# --- Utilidad: réplica completa del working_directory remoto (sin st.*, válida desde otros hilos) ---
+def _collect_working_directory(name_server, name_user, ssh_key_options, working_directory, local_dir,
+                               sessions=DEFAULT_CHANNELS, progress=None):
+    """Devuelve (tag, mensaje) con tag COLLECT_ALL / COLLECT_ALL_ERROR / COLLECT_ALL_EXCEPTION."""
+    try:
+        ssh_dl = connect_remote_server(name_server, name_user, ssh_key_options)
+        try:
+            # Réplica en paralelo; solo se traen ficheros nuevos o modificados
+            stats = mirror_tree(ssh_dl, [(working_directory, local_dir)], sessions=sessions, progress=progress)
+        finally:
+            try:
+                ssh_dl.close()
+            except Exception:
+                pass
+    except Exception as e:
+        return "COLLECT_ALL_EXCEPTION", str(e)
+    if stats["errors"]:
+        rpath, err = stats["errors"][0]
+        return "COLLECT_ALL_ERROR", f"{len(stats['errors'])} errors (first: {rpath}: {err})"
+    if not stats["seen"]:
+        return "COLLECT_ALL", "No entries found in remote working_directory"
+    return "COLLECT_ALL", (f"Downloaded all content of {working_directory} to {local_dir} "
+                           f"({stats['files']} new, {stats['skipped']} unchanged)")
+
+# --- Utilidad: progreso de mirror_tree en un placeholder de Streamlit ---
+def _mirror_progress():
+    box = st.empty()
+    def _report(stats):
+        box.info(f"Descarga: {stats['files']} ficheros nuevos ({stats['bytes'] / 1e6:.1f} MB), "
+                 f"{stats['skipped']} sin cambios, {stats['seen']} vistos")
+    return _report
 
 def viscai_multiple_run(
     name_server, name_user, ssh_key_options,
@@ -768,23 +872,33 @@ def collect_mw_dirs(
     if not local_dir or not os.path.isdir(local_dir):
         return [("LOCAL_DIR", "ERROR: local directory not defined or missing")]
     ssh = connect_remote_server(name_server, name_user, ssh_key_options)
-    sftp = ssh.open_sftp()
     try:
-        subdirs = sftp.listdir(working_directory)
-        subdirs = [d for d in subdirs if d.startswith("Mw_")]
+        sftp = ssh.open_sftp()
+        try:
+            subdirs = [d for d in sftp.listdir(working_directory) if d.startswith("Mw_")]
+        finally:
+            sftp.close()
         if not subdirs:
             summary.append(("Mw_*", "No subdirectories found"))
+            return summary
+        # Todos los Mw_* en una única réplica paralela (re-colectar solo trae lo nuevo)
+        stats = mirror_tree(
+            ssh,
+            [(f"{working_directory}/{sd}", os.path.join(local_dir, sd)) for sd in subdirs],
+            sessions=int(st.session_state.get("sftp_channels", DEFAULT_CHANNELS)),
+            progress=_mirror_progress(),
+        )
+        failed = {}
+        for rpath, err in stats["errors"]:
+            rel = rpath[len(working_directory):].lstrip("/")
+            failed.setdefault(rel.split("/", 1)[0], err)
         for sd in subdirs:
-            remote_sd = f"{working_directory}/{sd}"
             local_target = os.path.join(local_dir, sd)
-            try:
-                _download_tree(sftp, remote_sd, local_target)
+            if sd in failed:
+                summary.append((sd, f"Download DIR ERROR: {failed[sd]}"))
+            else:
                 summary.append((sd, f"Downloaded DIR -> {local_target}"))
-            except Exception as e:
-                summary.append((sd, f"Download DIR ERROR: {e}"))
     finally:
-        try: sftp.close()
-        except Exception: pass
         try: ssh.close()
         except Exception: pass
     return summary
@@ -2,17 +2,19 @@ import streamlit as st
 import tempfile
 import subprocess
 import tarfile
-import paramiko
+from ViscAI.utils.ssh_connection import connect_remote_server
+from ViscAI.utils.sftp_transfer import DEFAULT_CHANNELS, get_tar, iter_tar, transfer_many
+import shlex
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
 
 def download_file_from_server(name_server, username, ssh_key_options, remote_path):
     local_temp_path = tempfile.NamedTemporaryFile(delete=False).name
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(name_server, username=username, key_filename=ssh_key_options)
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
         sftp = ssh.open_sftp()
         sftp.get(remote_path, local_temp_path)
         sftp.close()
@@ -23,14 +25,69 @@ def download_file_from_server(name_server, username, ssh_key_options, remote_pat
         return None
 
 
-def tar_output_files(name_server, username, ssh_key_options, remote_directory):
+def download_files_from_server(name_server, username, ssh_key_options, remote_directory, names, local_dir):
+    """
+    Download 'names' (relative to 'remote_directory') into 'local_dir' in one 'tar cf -' stream,
+    falling back to parallel SFTP channels if tar is not available on the server.
+    Returns {name: local path} for the files that were downloaded.
+    """
+    pairs = [(f"{remote_directory.rstrip('/')}/{name}", os.path.join(local_dir, name)) for name in names]
+    try:
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
+        try:
+            missing = get_tar(ssh, pairs, remote_directory)
+        except RuntimeError:
+            missing = [(r, l) for r, l, _ in transfer_many(ssh, pairs, "get", channels=DEFAULT_CHANNELS)]
+        ssh.close()
+    except Exception as e:
+        st.error(f"ERROR!!! File download failed: {str(e)}")
+        return {}
+    failed = {local for _, local in missing}
+    return {name: local for name, (_, local) in zip(names, pairs) if local not in failed}
+
+
+def _stream_remote_tar(ssh, remote_directory, target_path, chunk_size=1 << 20):
+    """
+    Run 'tar czf -' on the server and write the compressed stream to 'target_path' chunk by chunk
+    (same contents as the SFTP mode: regular files at the top level of 'remote_directory')
+    """
+    command = (
+        f"cd {shlex.quote(remote_directory)} && "
+        "find . -maxdepth 1 -type f ! -name ViscAI_output.tar.gz -printf '%P\\n' | tar czf - -T -"
+    )
+    stdin, stdout, stderr = ssh.exec_command(command)
+    stdin.close()
+    partial = target_path + ".part"
+    try:
+        with open(partial, "wb") as f:
+            while True:
+                chunk = stdout.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+        status = stdout.channel.recv_exit_status()
+        if status != 0:
+            raise RuntimeError(stderr.read().decode("utf-8", errors="ignore").strip() or f"tar exit {status}")
+        os.replace(partial, target_path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return target_path
+
+
+def tar_output_files(name_server, username, ssh_key_options, remote_directory, stream_to=None):
     """
     Save output files in a 'tar.gz' file
+    - stream_to=None: download each file by SFTP, build the tarball locally and return its bytes
+    - stream_to=<path>: compress on the server and stream it to <path>; returns <path>
     """
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(name_server, username=username, key_filename=ssh_key_options)
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
+        if stream_to:
+            try:
+                return _stream_remote_tar(ssh, remote_directory, stream_to)
+            finally:
+                ssh.close()
         sftp = ssh.open_sftp()
         file_list = sftp.listdir(remote_directory)
 
@@ -61,9 +118,7 @@ def tar_output_files(name_server, username, ssh_key_options, remote_directory):
 
 def list_remote_files(name_server, username, ssh_key_options, remote_directory):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(name_server, username=username, key_filename=ssh_key_options)
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
         sftp = ssh.open_sftp()
         files = sftp.listdir(remote_directory)
         sftp.close()
@@ -74,7 +129,71 @@ def list_remote_files(name_server, username, ssh_key_options, remote_directory):
         return []
 
 
-def convert_agr_to_png(local_agr_path):
+def list_info_files(name_server, username, ssh_key_options, remote_directory):
+    """
+    Return {'Mw_*': mtime} for every 'Mw_*/info.txt' under 'remote_directory' (one remote 'find')
+    """
+    try:
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
+        stdin, stdout, stderr = ssh.exec_command(
+            f"cd {shlex.quote(remote_directory)} && "
+            "find . -mindepth 2 -maxdepth 2 -path './Mw_*/info.txt' -type f -printf '%h\\t%T@\\n'"
+        )
+        stdin.close()
+        mtimes = {}
+        for line in stdout.read().decode("utf-8", errors="ignore").splitlines():
+            subdir, _, mtime = line.partition("\t")
+            if mtime:
+                mtimes[subdir[2:] if subdir.startswith("./") else subdir] = mtime
+        return mtimes
+    except Exception as e:
+        st.error(f"ERROR!!! Listing 'info.txt' files failed: {str(e)}")
+        return {}
+
+
+def fetch_info_files(name_server, username, ssh_key_options, remote_directory, mtimes, cache):
+    """
+    Return {'Mw_*': info.txt content} for the subdirs in 'mtimes' ({'Mw_*': mtime}).
+    'cache' ({remote path: (mtime, content)}, e.g. kept in st.session_state) is reused when the
+    mtime has not changed; the rest come in a single 'tar cf -' stream from the server.
+    """
+    contents, stale = {}, []
+    for sd, mtime in mtimes.items():
+        cached = cache.get(f"{remote_directory}/{sd}/info.txt")
+        if cached and cached[0] == mtime:
+            contents[sd] = cached[1]
+        else:
+            stale.append(sd)
+    if not stale:
+        return contents
+    try:
+        ssh = connect_remote_server(name_server, username, ssh_key_options)
+        for name, src in iter_tar(ssh, (f"{sd}/info.txt" for sd in stale), remote_directory):
+            sd = name.rsplit("/", 1)[0]
+            if sd not in mtimes:
+                continue
+            text = src.read().decode("utf-8", errors="ignore")
+            cache[f"{remote_directory}/{sd}/info.txt"] = (mtimes[sd], text)
+            contents[sd] = text
+    except Exception as e:
+        st.error(f"ERROR!!! 'info.txt' download failed: {str(e)}")
+    return contents
+
+
+# Rotated PNGs, one per '.agr' content (sha256): no need to re-render them on every rerun
+AGR_RENDER_CACHE = os.environ.get("VISCAI_AGR_CACHE",
+                                  os.path.join(tempfile.gettempdir(), "viscai_agr_png_cache"))
+
+
+def _agr_cache_path(local_agr_path, cache_dir=AGR_RENDER_CACHE):
+    digest = hashlib.sha256()
+    with open(local_agr_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return os.path.join(cache_dir, digest.hexdigest() + ".png")
+
+
+def _render_agr(local_agr_path, cached_png):
     png_file = local_agr_path + ".png"
     command = ["xmgrace", "-hardcopy", "-printfile", png_file, local_agr_path]
     result = subprocess.run(command, capture_output=True, text=True)
@@ -85,8 +204,58 @@ def convert_agr_to_png(local_agr_path):
     try:
         image = Image.open(png_file)
         rotated_image = image.rotate(-90, expand=True)
-        rotated_png_file = png_file.replace(".png", "_rotated.png")
-        rotated_image.save(rotated_png_file)
-        return rotated_png_file
+        os.makedirs(os.path.dirname(cached_png), exist_ok=True)
+        partial = f"{cached_png}.{os.getpid()}.part"
+        rotated_image.save(partial, format="PNG")
+        os.replace(partial, cached_png)
+        return cached_png
     except Exception as e:
         raise Exception(f"ERROR!!! Image rotation failed: {str(e)}")
+    finally:
+        if os.path.exists(png_file):
+            os.remove(png_file)
+
+
+def convert_agr_to_png(local_agr_path):
+    """
+    Rotated PNG of 'local_agr_path' (xmgrace), served from AGR_RENDER_CACHE when the same
+    '.agr' content was already rendered. The returned PNG belongs to the cache: do not delete it.
+    """
+    cached_png = _agr_cache_path(local_agr_path)
+    if os.path.exists(cached_png):
+        return cached_png
+    return _render_agr(local_agr_path, cached_png)
+
+
+def convert_agr_files_to_png(local_agr_paths, max_workers=None):
+    """
+    Batch version of convert_agr_to_png: cache misses are rendered in a bounded process pool.
+    Returns {agr path: png path or Exception}.
+    """
+    results, pending = {}, {}
+    for agr in local_agr_paths:
+        try:
+            cached_png = _agr_cache_path(agr)
+        except Exception as e:
+            results[agr] = e
+            continue
+        if os.path.exists(cached_png):
+            results[agr] = cached_png
+        else:
+            pending[agr] = cached_png
+    if len(pending) == 1:
+        (agr, cached_png), = pending.items()
+        try:
+            results[agr] = _render_agr(agr, cached_png)
+        except Exception as e:
+            results[agr] = e
+    elif pending:
+        workers = max(1, min(len(pending), max_workers or os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = {agr: ex.submit(_render_agr, agr, cached_png) for agr, cached_png in pending.items()}
+            for agr, fut in futures.items():
+                try:
+                    results[agr] = fut.result()
+                except Exception as e:
+                    results[agr] = e
+    return results
@@ -2,6 +2,7 @@ import streamlit as st
 import json
 import paramiko
 import os
+from ViscAI.utils.ssh_connection import connect_remote_server
 
 
 def ensure_json_extension(json_filename):
@@ -73,9 +74,7 @@ def check_username_and_name_server(name_server, name_user, ssh_key_options):
 def verify_bob_remote_fullpath(name_server, name_user, ssh_key_options, bob_remote_fullpath):
     """Verifies if the bob executable exists and is executable on the remote server."""
 
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(name_server, username=name_user, key_filename=ssh_key_options)
+    ssh = connect_remote_server(name_server, name_user, ssh_key_options)
 
     cmd = f"[ -f '{bob_remote_fullpath}' ] && [ -x '{bob_remote_fullpath}' ] && echo exists || echo not_exists"
     stdin, stdout, stderr = ssh.exec_command(cmd)
@@ -87,9 +86,7 @@ def verify_bob_remote_fullpath(name_server, name_user, ssh_key_options, bob_remo
 
 
 def verify_working_directory(name_server, name_user, ssh_key_options, working_directory):
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(name_server, username=name_user, key_filename=ssh_key_options)
+    ssh = connect_remote_server(name_server, name_user, ssh_key_options)
 
     stdin, stdout, stderr = ssh.exec_command(f"if [ -d '{working_directory}' ];"
                                              f" then echo 'exists'; else echo 'not exists'; fi")
@@ -1,17 +1,15 @@
 import streamlit as st
 import os
 import shutil
-import paramiko
+from ViscAI.utils.ssh_connection import connect_remote_server
 
 
 def clean_remote_directory(name_server, name_user, ssh_key_options, working_directory):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(name_server, username=name_user, key_filename=ssh_key_options)
+        ssh = connect_remote_server(name_server, name_user, ssh_key_options)
 
         clean_wd = f"rm -rf {working_directory}/*"
-        stdin, stdout, stderr = ssh.exec_command(clean_wd)
+        stdin, stdout, stderr = ssh.exec_command(clean_wd, idempotent=False)
         clean_error = stderr.read().decode().strip()
 
         ssh.close()
@@ -0,0 +1,87 @@
+
+# utils/columnar.py
+"""
+Tablas columnares en binario para los datos preprocesados (alternativa a los *_clean.csv).
+
+Cada tabla es un directorio con un .npy por columna y un _columns.json con el orden de
+columnas y el nº de filas:
+    preprocessed/relaxation_clean/{id,simulation_id,time,G_t}.npy
+El escritor añade filas por chunks a ficheros crudos y al cerrar les pone la cabecera .npy,
+así que nunca hace falta tener la tabla entera en memoria. Los lectores usan mmap.
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+COLUMNS_FILE = "_columns.json"
+
+
+def has_columnar(path: str) -> bool:
+    """True si `path` es una tabla columnar completa (el _columns.json se escribe al final)."""
+    return os.path.isfile(os.path.join(path, COLUMNS_FILE))
+
+
+def remove_columnar(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ColumnarWriter:
+    """Escritor incremental: append(df) por chunks y close() para dejar los .npy listos."""
+
+    def __init__(self, path: str, dtypes: dict):
+        remove_columnar(path)
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtypes = {c: np.dtype(dt) for c, dt in dtypes.items()}
+        self.rows = 0
+        self._fh = {c: open(os.path.join(path, f"{c}.bin"), "wb") for c in self.dtypes}
+
+    def append(self, df) -> None:
+        if len(df) == 0:
+            return
+        for c, dt in self.dtypes.items():
+            col = df[c]
+            if dt.kind in "iu":
+                # enteros con NA (p.ej. id de filas del almacén columnar) -> -1
+                arr = pd.to_numeric(col, errors="coerce").fillna(-1).to_numpy(dtype=dt)
+            else:
+                arr = np.asarray(col, dtype=dt)
+            np.ascontiguousarray(arr).tofile(self._fh[c])
+        self.rows += len(df)
+
+    def close(self) -> int:
+        for c, dt in self.dtypes.items():
+            self._fh[c].close()
+            raw = os.path.join(self.path, f"{c}.bin")
+            header = {"descr": np.lib.format.dtype_to_descr(dt), "fortran_order": False, "shape": (self.rows,)}
+            with open(os.path.join(self.path, f"{c}.npy"), "wb") as out, open(raw, "rb") as src:
+                np.lib.format.write_array_header_1_0(out, header)
+                shutil.copyfileobj(src, out, 1 << 20)
+            os.remove(raw)
+        with open(os.path.join(self.path, COLUMNS_FILE), "w") as fd:
+            json.dump({"columns": list(self.dtypes), "rows": self.rows}, fd)
+        return self.rows
+
+
+def columnar_columns(path: str) -> list:
+    with open(os.path.join(path, COLUMNS_FILE)) as fd:
+        return json.load(fd)["columns"]
+
+
+def read_columnar(path: str, columns=None, mmap: bool = True) -> dict:
+    """{columna: ndarray}; con mmap=True los arrays se leen bajo demanda del disco."""
+    cols = columns or columnar_columns(path)
+    mode = "r" if mmap else None
+    return {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode=mode) for c in cols}
+
+
+def iter_columnar_frames(path: str, columns=None, chunksize: int = 100_000):
+    """DataFrames de `chunksize` filas, equivalente a pd.read_csv(..., chunksize=...)."""
+    data = read_columnar(path, columns)
+    n = len(next(iter(data.values()))) if data else 0
+    for lo in range(0, n, chunksize):
+        yield pd.DataFrame({c: np.asarray(arr[lo:lo + chunksize]) for c, arr in data.items()})
+
@@ -0,0 +1,245 @@
+
+# utils/curve_store.py
+"""
+Almacén columnar de curvas reológicas (alternativa a las tablas `dynamic`/`relaxation`).
+
+Cada lote de simulaciones se guarda como un shard .npz junto a la base de datos
+(<dir_db>/viscai_curves/shard_00001.npz) con las curvas concatenadas por tipo:
+    dynamic    -> (n, 3): frequency, elastic_modulu, viscous_modulu
+    relaxation -> (n, 2): time, modulu
+La tabla SQLite `curve_index` guarda para cada (simulation_id, kind) el shard y el rango
+[start, stop) de filas, de modo que una curva completa se lee con un slice, sin escanear filas.
+Al reemplazar una simulación (remove_curves) solo se borra su índice; compact_store() borra los
+shards sin curvas vivas y reescribe los que tienen pocas, para que la ingesta incremental no haga
+crecer el almacén sin límite.
+"""
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+CURVES_DIRNAME = "viscai_curves"
+
+# Columnas equivalentes a las tablas SQLite (sin id / simulation_id)
+CURVE_COLUMNS = {
+    "dynamic": ("frequency", "elastic_modulu", "viscous_modulu"),
+    "relaxation": ("time", "modulu"),
+}
+
+
+def curves_dir_for(db_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CURVES_DIRNAME)
+
+
+def _shard_files(root: str) -> list:
+    return sorted(f for f in os.listdir(root) if f.startswith("shard_") and f.endswith(".npz"))
+
+
+def _shard_number(name: str) -> int:
+    try:
+        return int(name[len("shard_"):-len(".npz")])
+    except ValueError:
+        return 0
+
+
+def has_curve_store(conn) -> bool:
+    try:
+        return conn.execute("SELECT 1 FROM curve_index LIMIT 1").fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+
+class CurveStore:
+    """Escritor por lotes: acumula curvas en memoria y las vuelca a un shard en cada flush()."""
+
+    def __init__(self, db_path: str, root: str | None = None):
+        self.root = root or curves_dir_for(db_path)
+        os.makedirs(self.root, exist_ok=True)
+        # max + 1 (no len + 1): si falta algún shard intermedio no se sobrescribe uno existente
+        self._next_shard = max((_shard_number(f) for f in _shard_files(self.root)), default=0) + 1
+        self._reset()
+
+    def _reset(self):
+        self._buffers = {kind: [] for kind in CURVE_COLUMNS}
+        self._offsets = {kind: 0 for kind in CURVE_COLUMNS}
+        self._index_rows = []
+
+    def add(self, simulation_id: int, kind: str, arr: np.ndarray) -> None:
+        arr = np.asarray(arr, dtype=float).reshape(-1, len(CURVE_COLUMNS[kind]))
+        start = self._offsets[kind]
+        self._buffers[kind].append(arr)
+        self._offsets[kind] = start + len(arr)
+        self._index_rows.append((simulation_id, kind, start, start + len(arr)))
+
+    def flush(self, cur) -> None:
+        """Escribe el shard pendiente y sus filas de curve_index (antes del commit del lote)."""
+        if not self._index_rows:
+            return
+        shard = f"shard_{self._next_shard:05d}.npz"
+        arrays = {
+            kind: (np.concatenate(bufs) if bufs else np.empty((0, len(CURVE_COLUMNS[kind]))))
+            for kind, bufs in self._buffers.items()
+        }
+        np.savez(os.path.join(self.root, shard), **arrays)
+        cur.executemany(
+            "INSERT INTO curve_index (simulation_id, kind, shard, start, stop) VALUES (?, ?, ?, ?, ?)",
+            [(sid, kind, shard, start, stop) for sid, kind, start, stop in self._index_rows]
+        )
+        self._next_shard += 1
+        self._reset()
+
+
+def load_curves(db_path: str, kind: str, simulation_ids=None, conn=None) -> dict:
+    """
+    Devuelve {simulation_id: ndarray (n, ncols)} leyendo cada shard una sola vez.
+    `simulation_ids=None` carga todas las simulaciones del almacén.
+    """
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path)
+    try:
+        q = "SELECT simulation_id, shard, start, stop FROM curve_index WHERE kind = ? ORDER BY shard, start"
+        rows = conn.execute(q, (kind,)).fetchall()
+    finally:
+        if own:
+            conn.close()
+    wanted = None if simulation_ids is None else set(int(s) for s in simulation_ids)
+    root = curves_dir_for(db_path)
+    out = {}
+    by_shard = {}
+    for sid, shard, start, stop in rows:
+        if wanted is None or sid in wanted:
+            by_shard.setdefault(shard, []).append((sid, start, stop))
+    for shard, items in by_shard.items():
+        with np.load(os.path.join(root, shard)) as npz:
+            data = npz[kind]
+        for sid, start, stop in items:
+            out[sid] = data[start:stop]
+    return out
+
+
+def iter_curve_frames(conn, db_path: str, kind: str, chunksize: int = 100_000, sql: str | None = None):
+    """
+    Itera DataFrames con las mismas columnas que `SELECT * FROM <kind>`:
+    primero las filas de la tabla SQLite (por chunks) y después las del almacén columnar
+    (un DataFrame por shard; `id` queda vacío porque las curvas no tienen id de fila).
+    `sql` sustituye la consulta de la parte SQLite (p.ej. con un JOIN de filtrado).
+    """
+    for chunk in pd.read_sql_query(sql or f"SELECT * FROM {kind}", conn, chunksize=chunksize):
+        yield chunk
+    if not has_curve_store(conn):
+        return
+    cols = CURVE_COLUMNS[kind]
+    rows = conn.execute(
+        "SELECT simulation_id, shard, start, stop FROM curve_index WHERE kind = ? ORDER BY shard, start",
+        (kind,)
+    ).fetchall()
+    root = curves_dir_for(db_path)
+    by_shard = {}
+    for sid, shard, start, stop in rows:
+        by_shard.setdefault(shard, []).append((sid, start, stop))
+    for shard, items in by_shard.items():
+        with np.load(os.path.join(root, shard)) as npz:
+            data = npz[kind]
+        sids = np.concatenate([np.full(stop - start, sid, dtype=np.int64) for sid, start, stop in items])
+        block = np.concatenate([data[start:stop] for _, start, stop in items])
+        df = pd.DataFrame(block, columns=list(cols))
+        df.insert(0, "simulation_id", sids)
+        df.insert(0, "id", pd.array([pd.NA] * len(df), dtype="Int64"))
+        yield df
+
+
+def iter_store_curves(conn, db_path: str, kind: str):
+    """
+    (simulation_id, ndarray) por simulación en orden de simulation_id, con la curva ordenada
+    por su primera columna (como read_curve_table). Se mantiene un solo shard cargado.
+    """
+    if not has_curve_store(conn):
+        return
+    rows = conn.execute(
+        "SELECT simulation_id, shard, start, stop FROM curve_index WHERE kind = ? "
+        "ORDER BY simulation_id, shard, start",
+        (kind,)
+    ).fetchall()
+    root = curves_dir_for(db_path)
+    loaded, data = None, None
+    for sid, shard, start, stop in rows:
+        if shard != loaded:
+            with np.load(os.path.join(root, shard)) as npz:
+                data = npz[kind]
+            loaded = shard
+        arr = data[start:stop]
+        yield sid, arr[np.argsort(arr[:, 0], kind="stable")]
+
+
+def read_curve_table(conn, db_path: str, kind: str) -> pd.DataFrame:
+    """Tabla completa (SQLite + almacén columnar) ordenada como los exports 01-*.csv."""
+    frames = list(iter_curve_frames(conn, db_path, kind))
+    cols = ["id", "simulation_id", *CURVE_COLUMNS[kind]]
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    df = pd.concat(frames, ignore_index=True)[cols]
+    return df.sort_values(["simulation_id", CURVE_COLUMNS[kind][0]], kind="stable").reset_index(drop=True)
+
+
+def remove_curves(cur, simulation_id: int) -> None:
+    """
+    Quita las entradas de índice de una simulación. Sus datos siguen en el shard hasta el siguiente
+    compact_store() (database_db_creation lo ejecuta al final de cada ingesta).
+    """
+    try:
+        cur.execute("DELETE FROM curve_index WHERE simulation_id = ?", (simulation_id,))
+    except sqlite3.Error:
+        pass
+
+
+def compact_store(conn, db_path: str, root: str | None = None, min_live_fraction: float = 0.5) -> dict:
+    """
+    Recupera el espacio de las curvas reemplazadas, con la DB ya confirmada y en su sitio definitivo:
+    - shards sin filas vivas en curve_index -> se borran;
+    - shards con menos de `min_live_fraction` de sus filas vivas -> sus curvas vivas se copian a un
+      shard nuevo, se actualiza curve_index (commit) y solo entonces se borra el shard viejo.
+    Devuelve {"removed": n, "rewritten": n}.
+    """
+    root = root or curves_dir_for(db_path)
+    result = {"removed": 0, "rewritten": 0}
+    if not os.path.isdir(root):
+        return result
+    try:
+        rows = conn.execute("SELECT rowid, simulation_id, kind, shard, start, stop FROM curve_index").fetchall()
+    except sqlite3.Error:
+        return result
+    live = {}
+    for row in rows:
+        live.setdefault(row[3], []).append(row)
+
+    sparse = []
+    for shard in _shard_files(root):
+        path = os.path.join(root, shard)
+        items = live.get(shard)
+        if not items:
+            os.remove(path)
+            result["removed"] += 1
+            continue
+        with np.load(path) as npz:
+            total = sum(len(npz[kind]) for kind in npz.files)
+        used = sum(stop - start for *_, start, stop in items)
+        if total and used < min_live_fraction * total:
+            sparse.append((shard, items))
+
+    if sparse:
+        store = CurveStore(db_path, root=root)
+        for shard, items in sparse:
+            with np.load(os.path.join(root, shard)) as npz:
+                data = {kind: npz[kind] for kind in npz.files}
+            for _, sid, kind, _, start, stop in items:
+                store.add(sid, kind, data[kind][start:stop])
+        cur = conn.cursor()
+        cur.executemany("DELETE FROM curve_index WHERE rowid = ?",
+                        [(row[0],) for _, items in sparse for row in items])
+        store.flush(cur)
+        conn.commit()
+        for shard, _ in sparse:
+            os.remove(os.path.join(root, shard))
+            result["rewritten"] += 1
+    return result
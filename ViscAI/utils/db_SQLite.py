@@ -3,18 +3,27 @@
 # utils/db_SQLite.py
 import os
 import stat
-import re as _re
+import io
+import gzip
+import json
+import time
+import shutil
+import shlex
 import sqlite3
+import numpy as np
+from itertools import repeat
 from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
 import re
 from pathlib import Path
 from ViscAI.utils.ssh_connection import connect_remote_server
-from ViscAI.utils.db_to_csv import export_db_to_csv, upload_csv, csv_format_to_pyrheo
+from ViscAI.utils.db_to_csv import export_db_to_csv, upload_csv, export_db_to_pyrheo
 from ViscAI.utils.clean_files import remove_db_local, remove_csv_exports
+from ViscAI.utils.curve_store import CurveStore, compact_store, curves_dir_for, remove_curves
 
 
 DIST_LABEL_MAP = {0: "Monodisperse", 1: "Gaussian", 2: "Log-normal", 3: "Poisson", 4: "Flory"}
+_PACKER_MAGIC = b"VISCPK1\n"  # ver utils/remote_packer.py
 
 def _sftp_exists(sftp, path: str) -> bool:
     try: sftp.stat(path); return True
@@ -56,22 +65,56 @@ def _infer_dist_mw_pdi_from_dat_local(base_dir: str):
             continue
     return None, None, None
 
-def _ingest_single_simulation_local(base_dir: str, cur) -> bool:
-    """Ingesta de una simulación usando ficheros locales en lugar de SFTP."""
-    info_path = os.path.join(base_dir, "info.txt")
-    gtp_path = os.path.join(base_dir, "gtp.dat")
-    gt_path = os.path.join(base_dir, "gt.dat")
-    if not (os.path.exists(gtp_path) and os.path.exists(gt_path)):
-        return False
+def _parse_dat_columns(text, ncols: int) -> np.ndarray:
+    """
+    Parsea en una sola pasada vectorizada las `ncols` primeras columnas de un .dat (gt.dat/gtp.dat).
+    Devuelve ndarray (n, ncols) de float. Las líneas con menos de `ncols` tokens o no numéricas
+    se descartan (mismo criterio que el antiguo parseo línea a línea).
+    """
+    text = _decode_line(text)
+    if not text.strip():
+        return np.empty((0, ncols), dtype=float)
+    try:
+        # Camino rápido: fichero bien formado -> un único loadtxt en C
+        arr = np.loadtxt(io.StringIO(text), usecols=range(ncols), ndmin=2, dtype=float)
+        return arr.reshape(-1, ncols)
+    except (ValueError, IndexError):
+        pass
+    # Fallback: filtrar líneas válidas y volver a parsear en bloque
+    good = []
+    for raw in text.splitlines():
+        parts = raw.split()
+        if len(parts) < ncols:
+            continue
+        try:
+            [float(p) for p in parts[:ncols]]
+        except ValueError:
+            continue
+        good.append(" ".join(parts[:ncols]))
+    if not good:
+        return np.empty((0, ncols), dtype=float)
+    return np.array(" ".join(good).split(), dtype=float).reshape(-1, ncols)
+
+def _read_local_text(path: str):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as fd:
+            return fd.read()
+    except Exception:
+        return None
 
+def _resolve_simulation_metadata(base_dir: str, info_text, infer_from_dat) -> tuple:
+    """
+    Combina las fuentes de metadatos (info.txt > nombre del subdirectorio > .dat de entrada).
+    `infer_from_dat` es un callable sin argumentos que solo se evalúa si falta algún valor.
+    Devuelve (mw, pdi, distribution_label, zero, cvis).
+    """
     mw_dir, dist_dir, pdi_dir = _parse_dir_tokens(base_dir)
     mw = zero = cvis = None; pdi = None; distribution_label = None
 
-    if os.path.exists(info_path):
+    if info_text is not None:
         try:
-            with open(info_path, 'r', encoding='utf-8', errors='ignore') as rf:
-                mw_i, zero, cvis = _parse_info_file(rf)
-                if mw_i is not None: mw = mw_i
+            mw_i, zero, cvis = _parse_info_file(info_text.splitlines())
+            if mw_i is not None: mw = mw_i
         except Exception:
             pass
 
@@ -82,53 +125,135 @@ def _ingest_single_simulation_local(base_dir: str, cur) -> bool:
         except Exception: distribution_label = None
 
     if (mw is None) or (pdi is None) or (distribution_label is None):
-        dlabel_dat, mw_dat, pdi_dat = _infer_dist_mw_pdi_from_dat_local(base_dir)
+        dlabel_dat, mw_dat, pdi_dat = infer_from_dat()
         if mw is None and mw_dat is not None: mw = mw_dat
         if pdi is None and pdi_dat is not None: pdi = pdi_dat
         if distribution_label is None and dlabel_dat is not None: distribution_label = dlabel_dat
 
+    return mw, pdi, distribution_label, zero, cvis
+
+FINGERPRINT_FILES = ("info.txt", "gt.dat", "gtp.dat")
+
+def _manifest_key(base_dir: str) -> str:
+    return os.path.basename(str(base_dir).rstrip("/"))
+
+def _fingerprint_from_stats(stats: dict) -> str:
+    """stats: nombre -> (size, mtime) o None si el fichero no existe."""
+    parts = []
+    for name in FINGERPRINT_FILES:
+        st_ = stats.get(name)
+        parts.append(f"{name}:-" if st_ is None else f"{name}:{st_[0]}:{st_[1]}")
+    return "|".join(parts)
+
+def _fingerprint_local(base_dir: str) -> str:
+    stats = {}
+    for name in FINGERPRINT_FILES:
+        try:
+            st_ = os.stat(os.path.join(base_dir, name))
+            stats[name] = (st_.st_size, int(st_.st_mtime))
+        except OSError:
+            stats[name] = None
+    return _fingerprint_from_stats(stats)
+
+def _remote_stats(sftp, base_dir: str) -> dict:
+    """Un stat por fichero de FINGERPRINT_FILES: nombre -> (size, mtime) o None si no existe."""
+    stats = {}
+    for name in FINGERPRINT_FILES:
+        try:
+            st_ = sftp.stat(f"{base_dir}/{name}")
+            stats[name] = (st_.st_size, int(st_.st_mtime))
+        except Exception:
+            stats[name] = None
+    return stats
+
+def _load_manifest(cur) -> dict:
+    """dir_name -> fingerprint de lo ya ingestado en la DB."""
+    try:
+        return dict(cur.execute("SELECT dir_name, fingerprint FROM ingest_manifest").fetchall())
+    except sqlite3.Error:
+        return {}
+
+def _delete_simulation(cur, simulation_id: int) -> None:
+    for table in ("dynamic", "relaxation", "job_status"):
+        cur.execute(f"DELETE FROM {table} WHERE simulation_id = ?", (simulation_id,))
+    remove_curves(cur, simulation_id)
+    cur.execute("DELETE FROM simulation WHERE id = ?", (simulation_id,))
+
+def _parse_simulation_local(base_dir: str):
+    """
+    Lee info.txt, gtp.dat, gt.dat (y el .dat de entrada si hace falta) de un subdirectorio local.
+    Devuelve un registro compacto (dict con metadatos + arrays) o None si faltan gt/gtp.
+    No toca la base de datos: la escritura la hace `_write_simulation`.
+    """
+    info_path = os.path.join(base_dir, "info.txt")
+    gtp_path = os.path.join(base_dir, "gtp.dat")
+    gt_path = os.path.join(base_dir, "gt.dat")
+    if not (os.path.exists(gtp_path) and os.path.exists(gt_path)):
+        return None
+
+    info_text = _read_local_text(info_path) if os.path.exists(info_path) else None
+    mw, pdi, distribution_label, zero, cvis = _resolve_simulation_metadata(
+        base_dir, info_text, lambda: _infer_dist_mw_pdi_from_dat_local(base_dir))
+
+    gtp_text = _read_local_text(gtp_path)
+    gt_text = _read_local_text(gt_path)
+    return {
+        "base_dir": base_dir,
+        "fingerprint": _fingerprint_local(base_dir),
+        "meta": (mw, pdi, distribution_label, zero, cvis),
+        "dynamic": _parse_dat_columns(gtp_text or "", 3),
+        "relaxation": _parse_dat_columns(gt_text or "", 2),
+    }
+
+def _write_simulation(cur, record: dict, store: CurveStore | None = None) -> int:
+    """
+    Inserta un registro parseado (simulation + dynamic + relaxation + job_status) con executemany.
+    Con `store`, las curvas van al almacén columnar (shards .npz + curve_index) en vez de a filas.
+    Si el subdirectorio ya estaba en ingest_manifest, la simulación anterior se reemplaza.
+    Devuelve el número de filas de curvas insertadas.
+    """
+    dir_name = _manifest_key(record["base_dir"])
+    prev = cur.execute("SELECT simulation_id FROM ingest_manifest WHERE dir_name = ?", (dir_name,)).fetchone()
+    if prev is not None and prev[0] is not None:
+        _delete_simulation(cur, prev[0])
+
     cur.execute(
         '''INSERT INTO simulation (molecular_weight, pdi, distribution_label, zero_shear_viscosity, complex_viscosity)
            VALUES (?, ?, ?, ?, ?)''',
-        (mw, pdi, distribution_label, zero, cvis)
+        record["meta"]
     )
     simulation_id = cur.lastrowid
 
-    # leer gtp.dat
-    try:
-        with open(gtp_path, 'r', encoding='utf-8', errors='ignore') as rg:
-            for raw in rg:
-                parts = raw.split()
-                if len(parts) >= 3:
-                    try:
-                        freq, em, vm = map(float, parts[:3])
-                        cur.execute(
-                            'INSERT INTO dynamic (simulation_id, frequency, elastic_modulu, viscous_modulu) VALUES (?, ?, ?, ?)',
-                            (simulation_id, freq, em, vm)
-                        )
-                    except ValueError:
-                        continue
-    except Exception:
-        pass
-
-    # leer gt.dat
-    try:
-        with open(gt_path, 'r', encoding='utf-8', errors='ignore') as rt:
-            for raw in rt:
-                parts = raw.split()
-                if len(parts) >= 2:
-                    try:
-                        t, mod = map(float, parts[:2])
-                        cur.execute(
-                            'INSERT INTO relaxation (simulation_id, time, modulu) VALUES (?, ?, ?)',
-                            (simulation_id, t, mod)
-                        )
-                    except ValueError:
-                        continue
-    except Exception:
-        pass
+    dyn = record["dynamic"]
+    rel = record["relaxation"]
+    if store is not None:
+        store.add(simulation_id, "dynamic", dyn)
+        store.add(simulation_id, "relaxation", rel)
+    elif len(dyn):
+        cur.executemany(
+            'INSERT INTO dynamic (simulation_id, frequency, elastic_modulu, viscous_modulu) VALUES (?, ?, ?, ?)',
+            zip(repeat(simulation_id), *dyn.T.tolist())
+        )
+    if store is None and len(rel):
+        cur.executemany(
+            'INSERT INTO relaxation (simulation_id, time, modulu) VALUES (?, ?, ?)',
+            zip(repeat(simulation_id), *rel.T.tolist())
+        )
 
     cur.execute('INSERT INTO job_status (simulation_id, status) VALUES (?, ?)', (simulation_id, 'finished'))
+    cur.execute(
+        'INSERT OR REPLACE INTO ingest_manifest (dir_name, simulation_id, fingerprint, ingested_at) '
+        'VALUES (?, ?, ?, datetime(\'now\'))',
+        (dir_name, simulation_id, record.get("fingerprint"))
+    )
+    return len(dyn) + len(rel)
+
+def _ingest_single_simulation_local(base_dir: str, cur) -> bool:
+    """Ingesta de una simulación usando ficheros locales en lugar de SFTP."""
+    record = _parse_simulation_local(base_dir)
+    if record is None:
+        return False
+    _write_simulation(cur, record)
     return True
 # ****************************NUEVO CAMBIO **********
 
@@ -192,6 +317,61 @@ def _infer_dist_mw_pdi_from_dat(sftp, base_dir: str):
             continue
     return None, None, None
 
+# Perfil de rendimiento para la carga masiva: la DB se puede regenerar desde los .dat,
+# así que durante la ingesta se sacrifica durabilidad (synchronous=OFF) por velocidad.
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",      # ~256 MB de page cache
+    "PRAGMA mmap_size=1073741824",    # 1 GB de I/O mapeada en memoria
+)
+
+def _apply_bulk_pragmas(conn) -> None:
+    for pragma in BULK_LOAD_PRAGMAS:
+        try: conn.execute(pragma)
+        except sqlite3.Error: pass
+
+def _finish_bulk_load(conn, tuned: bool) -> None:
+    """
+    Tras la carga: crea los índices una sola vez y, si se usó WAL, hace checkpoint y vuelve a
+    journal_mode=DELETE para que viscai_database.db sea un único fichero (se mueve / sube por SFTP).
+    """
+    ensure_curve_indexes(conn.cursor())
+    conn.commit()
+    if tuned:
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA journal_mode=DELETE")
+        except sqlite3.Error:
+            pass
+
+def ensure_curve_indexes(cur) -> None:
+    """Índices cubrientes para leer curvas completas por simulación ya ordenadas."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_dynamic_sim_freq ON dynamic(simulation_id, frequency)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_relaxation_sim_time ON relaxation(simulation_id, time)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_status_sim ON job_status(simulation_id)")
+    try:
+        # curve_index no existe en bases de datos creadas antes del almacén columnar
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_curve_index_sim ON curve_index(simulation_id)")
+    except sqlite3.OperationalError:
+        pass
+
+def backup_database(db_path: str, backup_path: str | None = None) -> str:
+    """
+    Copia de seguridad con la API de backup online de SQLite (página a página, consistente
+    aunque haya otra conexión abierta) en lugar de copiar el fichero completo con shutil.
+    """
+    backup_path = backup_path or db_path + ".bak"
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(backup_path)
+    try:
+        src.backup(dst, pages=4096)
+    finally:
+        dst.close()
+        src.close()
+    return backup_path
+
 def _ensure_schema(cur):
     cur.execute('''
     CREATE TABLE IF NOT EXISTS simulation (
@@ -225,69 +405,187 @@ def _ensure_schema(cur):
         status TEXT CHECK(status IN ('queued','finished','error')),
         FOREIGN KEY(simulation_id) REFERENCES simulation(rowid)
     )''')
+    # Índice del almacén columnar de curvas (utils/curve_store.py)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS curve_index (
+        simulation_id INTEGER,
+        kind TEXT CHECK(kind IN ('dynamic','relaxation')),
+        shard TEXT,
+        start INTEGER,
+        stop INTEGER,
+        FOREIGN KEY(simulation_id) REFERENCES simulation(rowid)
+    )''')
+    # Manifest para ingesta incremental: una fila por subdirectorio ingestado
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS ingest_manifest (
+        dir_name TEXT PRIMARY KEY,
+        simulation_id INTEGER,
+        fingerprint TEXT,
+        ingested_at TEXT,
+        FOREIGN KEY(simulation_id) REFERENCES simulation(rowid)
+    )''')
 
-def _ingest_single_simulation(sftp, base_dir: str, cur) -> bool:
+def _sftp_read_text(sftp, path: str):
+    """Lee un fichero remoto completo en una sola petición (con prefetch) en lugar de línea a línea."""
+    try:
+        with sftp.open(path, 'r') as rf:
+            try: rf.prefetch()
+            except Exception: pass
+            return _decode_line(rf.read())
+    except Exception:
+        return None
+
+def _parse_simulation_remote(sftp, base_dir: str, stats: dict | None = None):
+    """
+    Versión SFTP de _parse_simulation_local. `stats` (de _remote_stats, p.ej. ya obtenidos para
+    comparar con el manifest) sirve a la vez para comprobar los ficheros y para la huella.
+    """
     info_path = f"{base_dir}/info.txt"
     gtp_path = f"{base_dir}/gtp.dat"
     gt_path = f"{base_dir}/gt.dat"
-    if not _sftp_exists(sftp, gtp_path) or not _sftp_exists(sftp, gt_path):
-        return False
-
-    mw_dir, dist_dir, pdi_dir = _parse_dir_tokens(base_dir)
-    mw = zero = cvis = None; pdi = None; distribution_label = None
-
-    if _sftp_exists(sftp, info_path):
-        with sftp.open(info_path, 'r') as rf:
-            mw_i, zero, cvis = _parse_info_file(rf)
-            if mw_i is not None: mw = mw_i
+    if stats is None:
+        stats = _remote_stats(sftp, base_dir)
+    if stats["gtp.dat"] is None or stats["gt.dat"] is None:
+        return None
+
+    info_text = _sftp_read_text(sftp, info_path) if stats["info.txt"] is not None else None
+    mw, pdi, distribution_label, zero, cvis = _resolve_simulation_metadata(
+        base_dir, info_text, lambda: _infer_dist_mw_pdi_from_dat(sftp, base_dir))
+
+    return {
+        "base_dir": base_dir,
+        "fingerprint": _fingerprint_from_stats(stats),
+        "meta": (mw, pdi, distribution_label, zero, cvis),
+        "dynamic": _parse_dat_columns(_sftp_read_text(sftp, gtp_path) or "", 3),
+        "relaxation": _parse_dat_columns(_sftp_read_text(sftp, gt_path) or "", 2),
+    }
 
-    if mw is None and mw_dir is not None: mw = mw_dir
-    if pdi_dir is not None: pdi = pdi_dir
-    if dist_dir is not None:
-        try: distribution_label = DIST_LABEL_MAP.get(int(dist_dir))
-        except Exception: distribution_label = None
-
-    if (mw is None) or (pdi is None) or (distribution_label is None):
-        dlabel_dat, mw_dat, pdi_dat = _infer_dist_mw_pdi_from_dat(sftp, base_dir)
-        if mw is None and mw_dat is not None: mw = mw_dat
-        if pdi is None and pdi_dat is not None: pdi = pdi_dat
-        if distribution_label is None and dlabel_dat is not None: distribution_label = dlabel_dat
-
-    cur.execute(
-        '''INSERT INTO simulation (molecular_weight, pdi, distribution_label, zero_shear_viscosity, complex_viscosity)
-           VALUES (?, ?, ?, ?, ?)''',
-        (mw, pdi, distribution_label, zero, cvis)
-    )
-    simulation_id = cur.lastrowid
+def _ingest_single_simulation(sftp, base_dir: str, cur) -> bool:
+    record = _parse_simulation_remote(sftp, base_dir)
+    if record is None:
+        return False
+    _write_simulation(cur, record)
+    return True
 
-    with sftp.open(gtp_path, 'r') as rg:
-        for raw in rg:
-            parts = _decode_line(raw).split()
-            if len(parts) >= 3:
-                try:
-                    freq, em, vm = map(float, parts[:3])
-                    cur.execute(
-                        'INSERT INTO dynamic (simulation_id, frequency, elastic_modulu, viscous_modulu) VALUES (?, ?, ?, ?)',
-                        (simulation_id, freq, em, vm)
-                    )
-                except ValueError:
-                    continue
-
-    with sftp.open(gt_path, 'r') as rt:
-        for raw in rt:
-            parts = _decode_line(raw).split()
-            if len(parts) >= 2:
-                try:
-                    t, mod = map(float, parts[:2])
-                    cur.execute(
-                        'INSERT INTO relaxation (simulation_id, time, modulu) VALUES (?, ?, ?)',
-                        (simulation_id, t, mod)
-                    )
-                except ValueError:
-                    continue
 
-    cur.execute('INSERT INTO job_status (simulation_id, status) VALUES (?, ?)', (simulation_id, 'finished'))
-    return True
+def _iter_parsed_local(dirs: list, workers: int | None = None):
+    """
+    Parsea subdirectorios locales y va devolviendo los registros en el mismo orden que `dirs`.
+    - workers == 1: parseo secuencial en el proceso actual.
+    - workers > 1 o None (= nº de CPUs): los procesos del pool parsean info.txt, gt.dat, gtp.dat
+      y el .dat de entrada, y devuelven arrays compactos; el llamante es el único escritor SQLite.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(int(workers), len(dirs) or 1))
+    if workers == 1 or len(dirs) < 2:
+        for d in dirs:
+            yield _parse_simulation_local(d)
+        return
+    # chunksize grande para amortizar el coste de IPC con miles de directorios pequeños
+    chunksize = max(1, len(dirs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for record in ex.map(_parse_simulation_local, dirs, chunksize=chunksize):
+            yield record
+
+
+# Lee de stdin el código del packer (prefijado con su longitud) y lo ejecuta como __main__;
+# el resto de stdin (manifiesto SKIP) queda para remote_packer.main()
+_PACKER_BOOTSTRAP = (
+    "import sys; f = sys.stdin.buffer; src = f.read(int(f.readline())); "
+    "sys.argv[0] = 'remote_packer.py'; "
+    "exec(compile(src, 'remote_packer.py', 'exec'), {'__name__': '__main__'})"
+)
+
+
+def _iter_packed_remote(ssh, working_directory: str, include_root: bool = True, manifest: dict | None = None):
+    """
+    Ejecuta utils/remote_packer.py en el servidor (canal exec, código por stdin) y va devolviendo
+    los registros del único flujo gzip que produce. Los subdirectorios cuya huella coincide con
+    `manifest` no se envían. Lanza RuntimeError si el packer no puede ejecutarse en remoto.
+    """
+    packer_src = Path(__file__).with_name("remote_packer.py").read_bytes()
+    # stdin: "<n>\n" + código del packer + línea JSON con la huella de lo ya ingestado (SKIP)
+    payload = (f"{len(packer_src)}\n".encode() + packer_src
+               + json.dumps(manifest or {}).encode("utf-8") + b"\n")
+
+    cmd = (f"PY=$(command -v python3 || command -v python) && "
+           f"\"$PY\" -c {shlex.quote(_PACKER_BOOTSTRAP)} {shlex.quote(working_directory)} "
+           f"{'1' if include_root else '0'} skip-stdin")
+    stdin, stdout, stderr = ssh.exec_command(cmd)
+    stdin.write(payload)
+    stdin.flush()
+    stdin.channel.shutdown_write()
+
+    with gzip.GzipFile(fileobj=stdout, mode="rb") as gz:
+        try:
+            magic = gz.read(len(_PACKER_MAGIC))
+        except (OSError, EOFError):
+            magic = b""
+        if magic != _PACKER_MAGIC:
+            err = stderr.read().decode(errors="ignore").strip()
+            raise RuntimeError(f"remote packer not available: {err or 'empty output'}")
+        while True:
+            line = gz.readline()
+            if not line:
+                break
+            hdr = json.loads(line)
+            dtype = "<f8" if hdr.get("byteorder", "little") == "little" else ">f8"
+            n_dyn, n_rel = int(hdr["n_dyn"]), int(hdr["n_rel"])
+            dyn = np.frombuffer(gz.read(8 * 3 * n_dyn), dtype=dtype).astype(float).reshape(n_dyn, 3)
+            rel = np.frombuffer(gz.read(8 * 2 * n_rel), dtype=dtype).astype(float).reshape(n_rel, 2)
+
+            name = hdr["dir"]
+            base_dir = working_directory if name == "." else f"{working_directory}/{name}"
+            dat = hdr.get("dat")
+            dat_tuple = (DIST_LABEL_MAP.get(dat[0]), dat[1], dat[2]) if dat else (None, None, None)
+            meta = _resolve_simulation_metadata(base_dir, hdr.get("info"), lambda: dat_tuple)
+            yield {
+                "base_dir": base_dir,
+                "fingerprint": hdr.get("fingerprint"),
+                "meta": meta,
+                "dynamic": dyn,
+                "relaxation": rel,
+            }
+
+    rc = stdout.channel.recv_exit_status()
+    if rc != 0:
+        raise RuntimeError(f"remote packer failed (rc={rc}): {stderr.read().decode(errors='ignore').strip()}")
+
+
+class _IngestStats:
+    """Contador de filas/simulaciones y commit por lotes durante la ingesta."""
+
+    def __init__(self, conn, batch_size: int = 200, store: CurveStore | None = None):
+        self.conn = conn
+        self.store = store
+        self.batch_size = max(1, int(batch_size))
+        self.n_sims = 0
+        self.n_rows = 0
+        self._pending = 0
+        self._t0 = time.perf_counter()
+
+    def write(self, cur, record) -> bool:
+        if record is None:
+            return False
+        self.n_rows += _write_simulation(cur, record, self.store)
+        self.n_sims += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            # Una transacción por lote de simulaciones
+            self.commit()
+        return True
+
+    def commit(self) -> None:
+        if self.store is not None:
+            self.store.flush(self.conn.cursor())
+        self.conn.commit()
+        self._pending = 0
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self._t0, 1e-9)
+        return (f"Ingested {self.n_sims} simulations / {self.n_rows} rows "
+                f"in {elapsed:.2f} s ({self.n_rows / elapsed:,.0f} rows/s)")
 
 
 #   TEST
@@ -299,42 +597,100 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
                          per_mw: bool = False,
                          upload_per_mw: bool = False,
                          sort_ids_by_mw: bool = False,
-                         is_parallel: bool = False) -> None:
+                         is_parallel: bool = False,
+                         ingest_batch_size: int = 200,
+                         ingest_workers: int | None = None,
+                         incremental: bool = False,
+                         remote_packer: bool = False,
+                         curve_store: str = "sqlite",
+                         tuned_ingest: bool = True) -> None:
     """
     Ahora soporta modo local si `name_server` es falsy (None o "").
     - Si name_server es falsy: se asume que `working_directory` es un path LOCAL con subdirs Mw_*.
     - Si name_server tiene valor: comportamiento REMOTO (como antes).
+    - Ingesta en bloque: cada .dat se parsea en una pasada vectorizada y las filas se escriben con
+      executemany, con un commit por lote de `ingest_batch_size` simulaciones.
+    - Modo local con is_parallel=True: el parseo de los Mw_* se reparte en `ingest_workers` procesos
+      (None = todos los núcleos) y un único escritor inserta en SQLite.
+    - incremental=True: parte de la viscai_database.db existente (local: directorio destino;
+      remoto: working_directory) y solo ingesta/reemplaza los Mw_* nuevos o modificados según
+      la huella (tamaño + mtime de info.txt, gt.dat, gtp.dat) guardada en ingest_manifest.
+      Solo la ingesta es incremental: los 01-*.csv y los 02-*_pyRheo.csv se vuelven a exportar
+      completos en cada ejecución.
+    - remote_packer=True (modo remoto): los Mw_* se parsean EN el servidor (utils/remote_packer.py)
+      y llegan en un único flujo gzip por el canal exec; si falla, se vuelve a la lectura por SFTP.
+    - curve_store="npz" (modo local): las curvas se guardan como arrays contiguos en shards .npz
+      (<dir_db>/viscai_curves) indexados en la tabla curve_index, en lugar de una fila por punto.
+      Al terminar, compact_store() borra/reescribe los shards con curvas de simulaciones reemplazadas.
+    - tuned_ingest=True: WAL + synchronous=OFF + cache/mmap grandes durante la carga; los índices
+      (simulation_id, frequency) / (simulation_id, time) se crean una vez al final.
     **************** NUEVO CAMBIO **********
     """
     local_db = os.path.join(os.getcwd(), 'viscai_database.db')
     try:
+        local_mode = not bool(name_server)  # True si name_server es None o "" (modo local-only)
+        target_local_dir = st.session_state.get("input_options", {}).get("input_file_002", "") or working_directory
+
+        # Punto de partida: DB existente (incremental) o DB vacía (reconstrucción completa)
+        existing_db = os.path.join(target_local_dir, "viscai_database.db")
+        if local_mode and incremental and os.path.exists(existing_db):
+            if os.path.abspath(existing_db) != os.path.abspath(local_db):
+                shutil.copy2(existing_db, local_db)
+        elif os.path.exists(local_db):
+            remove_db_local(local_db)
+
         conn = sqlite3.connect(local_db); cur = conn.cursor()
+        if tuned_ingest:
+            _apply_bulk_pragmas(conn)
         _ensure_schema(cur); conn.commit()
 
-        local_mode = not bool(name_server)  # True si name_server es None o "" (modo local-only)
+        # Almacén columnar de curvas (solo modo local)
+        store = None
+        if curve_store == "npz":
+            if local_mode:
+                if incremental and os.path.exists(existing_db):
+                    # Los shards nuevos se añaden junto a los existentes
+                    store_root = curves_dir_for(existing_db)
+                else:
+                    store_root = curves_dir_for(local_db)
+                    shutil.rmtree(store_root, ignore_errors=True)
+                store = CurveStore(local_db, root=store_root)
+            else:
+                st.warning("WARNING: curve_store='npz' solo está disponible en modo local; curvas guardadas en SQLite.")
 
         inserted_any = False
+        stats = _IngestStats(conn, batch_size=ingest_batch_size, store=store)
 
         if local_mode:
             # **************** NUEVO CAMBIO **********
             # Trabajar exclusivamente en local: recorrer working_directory en el FS local.
+            manifest = _load_manifest(cur) if incremental else {}
+            skipped = 0
             try:
                 # Si include_root: comprobar gtp/gt en la raíz local
                 if include_root:
                     root_gtp = os.path.join(working_directory, "gtp.dat")
                     root_gt  = os.path.join(working_directory, "gt.dat")
                     if os.path.exists(root_gtp) and os.path.exists(root_gt):
-                        if _ingest_single_simulation_local(working_directory, cur):
+                        if manifest.get(_manifest_key(working_directory)) == _fingerprint_local(working_directory):
+                            skipped += 1
+                        elif stats.write(cur, _parse_simulation_local(working_directory)):
                             inserted_any = True
 
                 # recorrer subdirectorios Mw_*
-                for entry in os.listdir(working_directory):
-                    full = os.path.join(working_directory, entry)
-                    if os.path.isdir(full) and entry.startswith("Mw_"):
-                        # Llamada SECUENCIAL a la función que requiere 'cur'
-                        ok = _ingest_single_simulation_local(full, cur)
-                        if ok:
-                            inserted_any = True
+                mw_dirs = [os.path.join(working_directory, entry) for entry in os.listdir(working_directory)
+                           if entry.startswith("Mw_") and os.path.isdir(os.path.join(working_directory, entry))]
+                if manifest:
+                    # Solo nuevos o modificados: comparar huella (stat) sin leer ficheros
+                    pending = [d for d in mw_dirs if manifest.get(_manifest_key(d)) != _fingerprint_local(d)]
+                    skipped += len(mw_dirs) - len(pending)
+                    mw_dirs = pending
+                # Parseo en paralelo (procesos) si is_parallel; escritura SIEMPRE desde este proceso
+                workers = ingest_workers if is_parallel else 1
+                for record in _iter_parsed_local(mw_dirs, workers):
+                    ok = stats.write(cur, record)
+                    if ok:
+                        inserted_any = True
             except Exception as e:
                 conn.rollback()
                 conn.close()
@@ -342,7 +698,15 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
                     remove_db_local(local_db)
                 raise
 
-            conn.commit()
+            stats.commit()
+            _finish_bulk_load(conn, tuned_ingest)
+            if not inserted_any and skipped:
+                # Incremental sin cambios: la DB destino ya está al día
+                conn.close()
+                if os.path.abspath(local_db) != os.path.abspath(os.path.join(target_local_dir, "viscai_database.db")):
+                    remove_db_local(local_db)
+                st.info(f"Database up to date: {skipped} simulations unchanged, nothing to ingest.")
+                return
             if not inserted_any:
                 # Nada insertado: borramos DB y salimos con error
                 conn.close()
@@ -350,6 +714,7 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
                     remove_db_local(local_db)
                 st.error("ERROR!!! No se encontraron ficheros reológicos en modo local.")
                 return
+            st.info(stats.report() + (f", {skipped} unchanged skipped" if skipped else ""))
 
             # Reindex / ordering si aplica (se puede implementar si hace falta)
             if is_parallel and sort_ids_by_mw:
@@ -357,14 +722,18 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
                 pass
 
             # Ahora MOVEMOS/COPIAMOS la base de datos generada al directory destino (working_directory o input_file_002)
-            target_local_dir = st.session_state.get("input_options", {}).get("input_file_002", "") or working_directory
             os.makedirs(target_local_dir, exist_ok=True)
             try:
                 target_db = os.path.join(target_local_dir, "viscai_database.db")
                 # Si ya existe, sobrescribir
                 if os.path.exists(target_db):
                     os.remove(target_db)
+                conn.close()
                 os.replace(local_db, target_db)
+                # Los shards de curvas viajan con la DB (si no se escribieron ya en destino)
+                if store is not None and os.path.abspath(store.root) != os.path.abspath(curves_dir_for(target_db)):
+                    shutil.rmtree(curves_dir_for(target_db), ignore_errors=True)
+                    shutil.move(store.root, curves_dir_for(target_db))
                 # Update local_db path to new location for CSV export functions
                 local_db = target_db
                 conn = sqlite3.connect(local_db); cur = conn.cursor()
@@ -372,115 +741,33 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
                 # si falló move, dejamos la DB en cwd y seguimos
                 conn = sqlite3.connect(local_db); cur = conn.cursor()
 
-            # Exportar CSVs (se generan en cwd/csv_exports)
-            export_db_to_csv(local_db, "csv_exports", generate_distribution_summary=False)
-
-            # Generar CSV pyRheo (agregados + por-Mw)
-            csv_format_to_pyrheo(local_csv_dir=os.path.join(os.getcwd(), "csv_exports"),
-                                 per_mw=is_parallel, generate_aggregated=True)
-
-            # Copiar CSVs a target_local_dir
-            try:
-                csv_src = os.path.join(os.getcwd(), "csv_exports")
-                if os.path.isdir(csv_src):
-                    for f in os.listdir(csv_src):
-                        srcf = os.path.join(csv_src, f)
-                        dstf = os.path.join(target_local_dir, f)
-                        try:
-                            if os.path.exists(dstf): os.remove(dstf)
-                            os.replace(srcf, dstf)
-                        except Exception:
-                            # fallback copy
-                            with open(srcf, 'rb') as rf, open(dstf, 'wb') as wf:
-                                wf.write(rf.read())
-            except Exception:
-                pass
-            #   TEST
-
-            # **************** NUEVO CAMBIO **********
-            # Mover los CSV por-Mw (02-..._Mw_...) a sus subdirectorios locales.
-            # Nota: anteriormente ya hemos trasladado todo desde csv_src -> target_local_dir,
-            # por eso buscamos los ficheros en target_local_dir (no en csv_src, que estará vacío).
-
-
-            try:
-                # Buscamos en target_local_dir (no en csv_src, que ya fue vaciado por os.replace)
-                for fname in os.listdir(target_local_dir):
-                    m = _re.match(
-                        r"^(02-(relaxation|dynamic)_pyRheo)_Mw_([^_]+(?:_.+)?)__D([^_]+)__PDI_(.+)\.csv$",
-                        fname, _re.IGNORECASE
-                    )
-                    if not m:
-                        continue
-
-                    base_name = m.group(1)       # 02-relaxation_pyRheo | 02-dynamic_pyRheo
-                    mw_token  = m.group(3)       # e.g. 20000_0
-                    dist_token = m.group(4)      # e.g. 0, 2
-                    pdi_token  = m.group(5)      # e.g. 1_5, 2_5
-
-                    # Nombre del subdirectorio destino (igual que en remoto)
-                    target_dir_name = f"Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}"
-                    dest_subdir = os.path.join(target_local_dir, target_dir_name)
-
-                    # Crear subdirectorio si no existe (organización local razonable)
-                    os.makedirs(dest_subdir, exist_ok=True)
-
-                    # Ruta origen/destino (origen está en target_local_dir)
-                    src_path = os.path.join(target_local_dir, fname)
-                    # Renombrar el fichero dentro del subdir para nombre estándar: e.g. 02-dynamic_pyRheo.csv
-                    dest_fname = f"{base_name}.csv"
-                    dest_path = os.path.join(dest_subdir, dest_fname)
-
-                    try:
-                        # Si ya existe, sobreescribimos
-                        if os.path.exists(dest_path):
-                            os.remove(dest_path)
-                        os.replace(src_path, dest_path)
-                    except Exception:
-                        # fallback copy si el replace falla (por permisos/filesystems distintos)
-                        try:
-                            with open(src_path, "rb") as rf, open(dest_path, "wb") as wf:
-                                wf.write(rf.read())
-                            os.remove(src_path)
-                        except Exception as e:
-                            st.warning(f"WARNING: no se pudo mover {fname} a {dest_subdir}: {e}")
-            except Exception as e:
-                st.warning(f"WARNING: error moviendo CSV por-Mw a subdirs: {e}")
-            # **************** NUEVO CAMBIO **********
-
+            # Shards de curvas reemplazadas: se borran / compactan ya con la DB definitiva
+            if store is not None:
+                compacted = compact_store(conn, local_db)
+                if compacted["removed"] or compacted["rewritten"]:
+                    st.info(f"Curve store: {compacted['removed']} orphan shards removed, "
+                            f"{compacted['rewritten']} sparse shards rewritten.")
 
             # **************** NUEVO CAMBIO **********
-            # Eliminar las copias agregadas (02-relaxation_pyRheo.csv / 02-dynamic_pyRheo.csv)
-            # que quedan en la raíz local, ya que las versiones por-Mw fueron colocadas
-            # dentro de los subdirectorios correspondientes.
-            try:
-                for root_csv in ("02-relaxation_pyRheo.csv", "02-dynamic_pyRheo.csv"):
-                    candidate = os.path.join(target_local_dir, root_csv)
+            # Exportar 01-*.csv directamente en target_local_dir y escribir cada CSV pyRheo por
+            # simulación directamente en su subdirectorio Mw_<mw>__D<dist>__PDI_<pdi>
+            # (sin csv_exports intermedio ni el paso de renombrado/movido por regex).
+            # Los pyRheo salen directamente de SQLite (sin releer los 01-*.csv).
+            export_db_to_csv(local_db, target_local_dir, generate_distribution_summary=False)
+            export_db_to_pyrheo(local_db, target_local_dir, per_mw=is_parallel,
+                                generate_aggregated=False, dest_root=target_local_dir)
+
+            # Los agregados 02-*_pyRheo.csv no se dejan en la raíz local
+            # (se eliminan restos de ejecuciones anteriores)
+            for root_csv in ("02-relaxation_pyRheo.csv", "02-dynamic_pyRheo.csv"):
+                candidate = os.path.join(target_local_dir, root_csv)
+                try:
                     if os.path.exists(candidate):
-                        try:
-                            os.remove(candidate)
-                        except Exception:
-                            # intento alternativo: truncar si no se puede borrar directamente
-                            try:
-                                with open(candidate, "w"):
-                                    pass
-                            except Exception:
-                                st.warning(f"WARNING: no se pudo eliminar {candidate}.")
-            except Exception as e:
-                st.warning(f"WARNING: error al limpiar CSV raíz: {e}")
+                        os.remove(candidate)
+                except Exception:
+                    st.warning(f"WARNING: no se pudo eliminar {candidate}.")
             # **************** NUEVO CAMBIO **********
 
-
-
-
-
-            # Limpieza local temporal
-            try:
-                if os.path.exists(os.path.join(os.getcwd(), "csv_exports")):
-                    remove_csv_exports(local_csv_dir=os.path.join(os.getcwd(), "csv_exports"))
-            except Exception:
-                pass
-
             # Si llegamos aquí, cerramos la conexión DB
             try: conn.close()
             except Exception: pass
@@ -493,26 +780,68 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
         ssh = connect_remote_server(name_server, name_user, ssh_key_options)
         sftp = ssh.open_sftp()
 
-        if include_root:
-            if _sftp_exists(sftp, f"{working_directory}/gtp.dat") and \
-               _sftp_exists(sftp, f"{working_directory}/gt.dat"):
-                if _ingest_single_simulation(sftp, working_directory, cur):
+        # Incremental remoto: partir de la DB ya subida al working_directory
+        remote_db = f"{working_directory}/viscai_database.db"
+        if incremental and _sftp_exists(sftp, remote_db):
+            conn.close()
+            sftp.get(remote_db, local_db)
+            conn = sqlite3.connect(local_db); cur = conn.cursor()
+            if tuned_ingest:
+                _apply_bulk_pragmas(conn)
+            _ensure_schema(cur); conn.commit()
+            stats = _IngestStats(conn, batch_size=ingest_batch_size)
+        manifest = _load_manifest(cur) if incremental else {}
+        skipped = 0
+
+        packed = False
+        if remote_packer:
+            try:
+                written = set()
+                for record in _iter_packed_remote(ssh, working_directory, include_root, manifest):
+                    inserted_any = stats.write(cur, record) or inserted_any
+                    written.add(_manifest_key(record["base_dir"]))
+                packed = True
+                # Los no enviados por el packer son los que coinciden con el manifest
+                skipped = len(set(manifest) - written)
+            except RuntimeError as e:
+                if stats.n_sims:
+                    raise
+                st.warning(f"WARNING: remote packer unavailable, falling back to SFTP ingestion: {e}")
+
+        if include_root and not packed:
+            root_stats = _remote_stats(sftp, working_directory)
+            if root_stats["gtp.dat"] is not None and root_stats["gt.dat"] is not None:
+                if manifest.get(_manifest_key(working_directory)) == _fingerprint_from_stats(root_stats):
+                    skipped += 1
+                elif stats.write(cur, _parse_simulation_remote(sftp, working_directory, root_stats)):
                     inserted_any = True
         try:
-            for entry in sftp.listdir_attr(working_directory):
+            for entry in ([] if packed else sftp.listdir_attr(working_directory)):
                 if stat.S_ISDIR(entry.st_mode) and entry.filename.startswith("Mw_"):
                     subdir = f"{working_directory}/{entry.filename}"
-                    ok = _ingest_single_simulation(sftp, subdir, cur)
+                    # Los mismos stat sirven para el manifest y para el parseo (sin repetirlos)
+                    sub_stats = _remote_stats(sftp, subdir)
+                    if manifest and manifest.get(entry.filename) == _fingerprint_from_stats(sub_stats):
+                        skipped += 1
+                        continue
+                    ok = stats.write(cur, _parse_simulation_remote(sftp, subdir, sub_stats))
                     inserted_any = inserted_any or ok
         except Exception:
             pass
 
-        conn.commit()
+        stats.commit()
+        _finish_bulk_load(conn, tuned_ingest)
+        if not inserted_any and skipped:
+            sftp.close(); ssh.close()
+            conn.close(); remove_db_local(local_db)
+            st.info(f"Database up to date: {skipped} simulations unchanged, nothing to ingest.")
+            return
         if not inserted_any:
             sftp.close(); ssh.close()
             conn.close(); remove_db_local(local_db)
             st.error("ERROR!!! No se encontraron ficheros reológicos.")
             return
+        st.info(stats.report() + (f", {skipped} unchanged skipped" if skipped else ""))
 
         if is_parallel and sort_ids_by_mw:
             # Reindex si aplica
@@ -525,8 +854,10 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
         export_db_to_csv(local_db, "csv_exports", generate_distribution_summary=False)
 
         # Generar CSV pyRheo (agregados + por-Mw)
-        csv_format_to_pyrheo(local_csv_dir=os.path.join(os.getcwd(), "csv_exports"),
-                             per_mw=is_parallel, generate_aggregated=True)
+        # (los por-simulación quedan en csv_exports/Mw_*/ y upload_csv los sube a su subdirectorio)
+        export_db_to_pyrheo(local_db, os.path.join(os.getcwd(), "csv_exports"),
+                            per_mw=is_parallel, generate_aggregated=True,
+                            dest_root=os.path.join(os.getcwd(), "csv_exports"))
 
         # Subir CSVs:
         if not is_parallel:
@@ -538,7 +869,8 @@ def database_db_creation(name_server: str, name_user: str, ssh_key_options: str,
         upload_csv(sftp,
                    local_csv_dir=os.path.join(os.getcwd(), "csv_exports"),
                    remote_dir=working_directory,
-                   upload_per_mw=is_parallel)
+                   upload_per_mw=is_parallel,
+                   ssh=ssh)
 
         # Descarga local y limpieza (remota original)
         local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
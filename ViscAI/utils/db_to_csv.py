@@ -4,8 +4,15 @@ import streamlit as st
 import sqlite3
 import csv
 import os
+import numpy as np
 import pandas as pd
 import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+import heapq
+import stat
+from ViscAI.utils.sftp_transfer import DEFAULT_CHANNELS, transfer_many, put_tar
+from ViscAI.utils.curve_store import CURVE_COLUMNS, has_curve_store, read_curve_table, iter_store_curves
 
 # --- NUEVO: mapa de etiqueta -> código de distribución ---
 DIST_CODE_MAP = {
@@ -28,20 +35,29 @@ def export_db_to_csv(db_path: str, output_dir: str, generate_distribution_summar
     )
     df_sim.to_csv(os.path.join(output_dir, "01-simulation.csv"), index=False)
 
+    # Si las curvas están en el almacén columnar (curve_index + shards .npz), se leen de ahí
+    columnar = has_curve_store(conn)
+
     # 01-dynamic.csv
-    df_dyn = pd.read_sql_query(
-        "SELECT id, simulation_id, frequency, elastic_modulu, viscous_modulu "
-        "FROM dynamic ORDER BY simulation_id ASC, frequency ASC",
-        conn
-    )
+    if columnar:
+        df_dyn = read_curve_table(conn, db_path, "dynamic")
+    else:
+        df_dyn = pd.read_sql_query(
+            "SELECT id, simulation_id, frequency, elastic_modulu, viscous_modulu "
+            "FROM dynamic ORDER BY simulation_id ASC, frequency ASC",
+            conn
+        )
     df_dyn.to_csv(os.path.join(output_dir, "01-dynamic.csv"), index=False)
 
     # 01-relaxation.csv
-    df_rel = pd.read_sql_query(
-        "SELECT id, simulation_id, time, modulu "
-        "FROM relaxation ORDER BY simulation_id ASC, time ASC",
-        conn
-    )
+    if columnar:
+        df_rel = read_curve_table(conn, db_path, "relaxation")
+    else:
+        df_rel = pd.read_sql_query(
+            "SELECT id, simulation_id, time, modulu "
+            "FROM relaxation ORDER BY simulation_id ASC, time ASC",
+            conn
+        )
     df_rel.to_csv(os.path.join(output_dir, "01-relaxation.csv"), index=False)
 
     # 01-job_status.csv
@@ -74,15 +90,89 @@ def export_db_to_csv(db_path: str, output_dir: str, generate_distribution_summar
     conn.close()
 
 
+# Columnas pyRheo por tipo de curva
+PYRHEO_COLUMNS = {
+    "relaxation": {"time": "Time", "modulu": "Relaxation Modulus"},
+    "dynamic": {
+        "frequency": "Angular Frequency",
+        "elastic_modulu": "Storage Modulus",
+        "viscous_modulu": "Loss Modulus"
+    },
+}
+
+
+def pyrheo_subdir_name(mw_token: str, dist_token: str, pdi_token: str) -> str:
+    """Subdirectorio destino de una simulación: Mw_<mw>__D<dist>__PDI_<pdi> (igual que en remoto)."""
+    return f"Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}"
+
+
+def _pyrheo_sim_index(df_sim: pd.DataFrame) -> dict:
+    """sid -> (mw_token, dist_token, pdi_token) a partir de 01-simulation.csv (sin iterrows)."""
+    sids = [int(v) for v in df_sim["id"]]
+    mws = df_sim["molecular_weight"] if "molecular_weight" in df_sim.columns else [None] * len(sids)
+    pdis = df_sim["pdi"] if "pdi" in df_sim.columns else [None] * len(sids)
+    labels = df_sim["distribution_label"] if "distribution_label" in df_sim.columns else [None] * len(sids)
+    index = {}
+    for sid, mw, pdi, dlabel in zip(sids, mws, pdis, labels):
+        mw_token = str(float(mw)).replace(".", "_") if pd.notna(mw) else f"sim_{sid}"
+        # pdi puede venir como float; tokenizamos con '_' por compatibilidad de nombres
+        pdi_token = str(float(pdi)).replace(".", "_") if pd.notna(pdi) else "NA"
+        # code desde label; si falta, NA
+        dist_token = str(DIST_CODE_MAP[dlabel]) if pd.notna(dlabel) and dlabel in DIST_CODE_MAP else "NA"
+        index[sid] = (mw_token, dist_token, pdi_token)
+    return index
+
+
+def _write_pyrheo_per_simulation(df: pd.DataFrame, kind: str, path_for_sid, workers: int = 8) -> int:
+    """
+    Escribe un fichero pyRheo por simulación en una sola pasada: la tabla se formatea a CSV
+    una única vez y cada rango de filas [start, stop) de una simulación se vuelca a su
+    fichero desde un pool de hilos. Si dos simulaciones comparten destino gana la de mayor id
+    (mismo resultado que el bucle groupby anterior). Devuelve el nº de ficheros escritos.
+    """
+    df = df.sort_values("simulation_id", kind="stable")
+    sids = df["simulation_id"].to_numpy()
+    out = df.drop(columns=[c for c in ("id", "simulation_id") if c in df.columns])
+    out = out.rename(columns=PYRHEO_COLUMNS[kind])
+    header = out.head(0).to_csv(index=False)
+    lines = out.to_csv(index=False, header=False).split("\n")
+
+    bounds = np.flatnonzero(sids[1:] != sids[:-1]) + 1
+    starts = np.concatenate(([0], bounds)) if len(sids) else np.array([], dtype=int)
+    stops = np.concatenate((bounds, [len(sids)])) if len(sids) else np.array([], dtype=int)
+    jobs = {}
+    for start, stop in zip(starts, stops):
+        path = path_for_sid(int(sids[start]))
+        if path:
+            jobs[path] = (int(start), int(stop))
+
+    def _write(item):
+        path, (start, stop) = item
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", newline="") as fd:
+            fd.write(header)
+            fd.write("\n".join(lines[start:stop]))
+            fd.write("\n")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(_write, jobs.items()))
+    return len(jobs)
+
+
 def csv_format_to_pyrheo(local_csv_dir: str,
                          per_mw: bool = False,
-                         generate_aggregated: bool = True) -> None:
+                         generate_aggregated: bool = True,
+                         dest_root: str | None = None,
+                         workers: int = 8) -> None:
     """
     Convierte 01-relaxation.csv y 01-dynamic.csv a formato pyRheo.
     - Si `generate_aggregated=True`, genera 02-*_pyRheo.csv (agregados, en raíz local).
-    - Si `per_mw=True`, además genera ficheros por simulación (Mw+D+PDI):
-      02-relaxation_pyRheo_Mw_<mw_token>__D<dist_code>__PDI_<pdi_token>.csv
-      02-dynamic_pyRheo_Mw_<mw_token>__D<dist_code>__PDI_<pdi_token>.csv
+    - Si `per_mw=True`, además genera un fichero por simulación (Mw+D+PDI):
+      * con `dest_root`: directamente en su subdirectorio final
+        <dest_root>/Mw_<mw_token>__D<dist_code>__PDI_<pdi_token>/02-<tipo>_pyRheo.csv
+      * sin `dest_root` (formato plano anterior):
+        02-relaxation_pyRheo_Mw_<mw_token>__D<dist_code>__PDI_<pdi_token>.csv
+        02-dynamic_pyRheo_Mw_<mw_token>__D<dist_code>__PDI_<pdi_token>.csv
     """
     if not os.path.isdir(local_csv_dir):
         st.warning("WARNING!!! CSV files are not in the pyRheo format.")
@@ -90,182 +180,220 @@ def csv_format_to_pyrheo(local_csv_dir: str,
 
     # --- Índice por simulación: sid -> (mw_token, dist_code_token, pdi_token) ---
     sim_path = os.path.join(local_csv_dir, "01-simulation.csv")
-    sim_index = {}  # sid -> dict(tokens)
-    if os.path.exists(sim_path):
-        df_sim = pd.read_csv(sim_path)
-        for _, row in df_sim.iterrows():
-            sid = int(row["id"])
-            mw = row.get("molecular_weight", None)
-            pdi = row.get("pdi", None)
-            dlabel = row.get("distribution_label", None)
-
-            mw_token = str(float(mw)).replace(".", "_") if pd.notna(mw) else f"sim_{sid}"
-            # pdi puede venir como float; tokenizamos con '_' por compatibilidad de nombres
-            pdi_token = (str(float(pdi)).replace(".", "_")) if pd.notna(pdi) else "NA"
-
-            # code desde label; si falta, NA (no subiremos si no hay destino)
-            if pd.notna(dlabel) and dlabel in DIST_CODE_MAP:
-                dist_code_token = str(DIST_CODE_MAP[dlabel])
-            else:
-                dist_code_token = "NA"
-
-            sim_index[sid] = {
-                "mw_token": mw_token,
-                "dist_token": dist_code_token,
-                "pdi_token": pdi_token
-            }
-
-    # --- 01-relaxation.csv -> 02-relaxation_pyRheo*.csv ---
-    relaxation_csv = os.path.join(local_csv_dir, "01-relaxation.csv")
-    if os.path.exists(relaxation_csv):
-        df_relax = pd.read_csv(relaxation_csv)
+    sim_index = _pyrheo_sim_index(pd.read_csv(sim_path)) if os.path.exists(sim_path) else {}
+
+    def _path_for(kind):
+        def _path(sid):
+            tokens = sim_index.get(sid)
+            if not tokens:
+                # No hay info suficiente para nombrar; saltamos
+                return None
+            if dest_root:
+                return os.path.join(dest_root, pyrheo_subdir_name(*tokens), f"02-{kind}_pyRheo.csv")
+            mw_token, dist_token, pdi_token = tokens
+            return os.path.join(
+                local_csv_dir,
+                f"02-{kind}_pyRheo_Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}.csv"
+            )
+        return _path
+
+    # --- 01-<tipo>.csv -> 02-<tipo>_pyRheo*.csv ---
+    for kind in ("relaxation", "dynamic"):
+        src_csv = os.path.join(local_csv_dir, f"01-{kind}.csv")
+        if not os.path.exists(src_csv):
+            if kind == "dynamic":
+                st.warning("WARNING!!! CSV files are not in the pyRheo format.")
+            continue
+        df = pd.read_csv(src_csv)
 
         # Agregado (opcional) en raíz local
         if generate_aggregated:
-            df_r = df_relax.copy()
-            for col in ['id', 'simulation_id']:
-                if col in df_r.columns:
-                    df_r.drop(columns=[col], inplace=True)
-            df_r = df_r.rename(columns={"time": "Time", "modulu": "Relaxation Modulus"})
-            df_r.to_csv(os.path.join(local_csv_dir, "02-relaxation_pyRheo.csv"), index=False)
+            df_agg = df.drop(columns=[c for c in ("id", "simulation_id") if c in df.columns])
+            df_agg.rename(columns=PYRHEO_COLUMNS[kind]).to_csv(
+                os.path.join(local_csv_dir, f"02-{kind}_pyRheo.csv"), index=False
+            )
 
         # Por simulación (Mw + D + PDI)
-        if per_mw and "simulation_id" in df_relax.columns:
-            for sid, grp in df_relax.groupby("simulation_id"):
-                sid = int(sid)
-                df_mw = grp.copy()
-                for col in ['id', 'simulation_id']:
-                    if col in df_mw.columns:
-                        df_mw.drop(columns=[col], inplace=True)
-                df_mw = df_mw.rename(columns={"time": "Time", "modulu": "Relaxation Modulus"})
-
-                tokens = sim_index.get(sid, None)
-                if not tokens:
-                    # No hay info suficiente para nombrar; saltamos
-                    continue
+        if per_mw and "simulation_id" in df.columns:
+            _write_pyrheo_per_simulation(df, kind, _path_for(kind), workers=workers)
 
-                mw_token = tokens["mw_token"]
-                dist_token = tokens["dist_token"]
-                pdi_token = tokens["pdi_token"]
 
-                out_mw = os.path.join(
-                    local_csv_dir,
-                    f"02-relaxation_pyRheo_Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}.csv"
-                )
-                df_mw.to_csv(out_mw, index=False)
+def _iter_sql_curve_groups(conn, kind: str, fetch_size: int):
+    """
+    (simulation_id, [filas]) por simulación leyendo la tabla con un cursor ordenado por
+    simulation_id (fetchmany: nunca se materializa la tabla completa).
+    """
+    cols = CURVE_COLUMNS[kind]
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT simulation_id, {', '.join(cols)} FROM {kind} "
+        f"ORDER BY simulation_id ASC, {cols[0]} ASC"
+    )
 
-    # --- 01-dynamic.csv -> 02-dynamic_pyRheo*.csv ---
-    dynamic_csv = os.path.join(local_csv_dir, "01-dynamic.csv")
-    if os.path.exists(dynamic_csv):
-        df_dyn = pd.read_csv(dynamic_csv)
+    def _rows():
+        while True:
+            batch = cur.fetchmany(fetch_size)
+            if not batch:
+                return
+            yield from batch
 
-        # Agregado (opcional) en raíz local
-        if generate_aggregated:
-            df_d = df_dyn.copy()
-            for col in ['id', 'simulation_id']:
-                if col in df_d.columns:
-                    df_d.drop(columns=[col], inplace=True)
-            df_d = df_d.rename(columns={
-                "frequency": "Angular Frequency",
-                "elastic_modulu": "Storage Modulus",
-                "viscous_modulu": "Loss Modulus"
-            })
-            df_d.to_csv(os.path.join(local_csv_dir, "02-dynamic_pyRheo.csv"), index=False)
+    for sid, grp in groupby(_rows(), key=lambda r: r[0]):
+        yield sid, [tuple(None if v is None else float(v) for v in r[1:]) for r in grp]
 
-        # Por simulación (Mw + D + PDI)
-        if per_mw and "simulation_id" in df_dyn.columns:
-            for sid, grp in df_dyn.groupby("simulation_id"):
-                sid = int(sid)
-                df_mw = grp.copy()
-                for col in ['id', 'simulation_id']:
-                    if col in df_mw.columns:
-                        df_mw.drop(columns=[col], inplace=True)
-                df_mw = df_mw.rename(columns={
-                    "frequency": "Angular Frequency",
-                    "elastic_modulu": "Storage Modulus",
-                    "viscous_modulu": "Loss Modulus"
-                })
-
-                tokens = sim_index.get(sid, None)
-                if not tokens:
-                    continue
-
-                mw_token = tokens["mw_token"]
-                dist_token = tokens["dist_token"]
-                pdi_token = tokens["pdi_token"]
 
-                out_mw = os.path.join(
-                    local_csv_dir,
-                    f"02-dynamic_pyRheo_Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}.csv"
-                )
-                df_mw.to_csv(out_mw, index=False)
-    else:
-        st.warning("WARNING!!! CSV files are not in the pyRheo format.")
+def _iter_curve_groups(conn, db_path: str, kind: str, fetch_size: int):
+    """Grupos por simulación de la tabla SQLite y del almacén columnar, mezclados por simulation_id."""
+    sql_groups = _iter_sql_curve_groups(conn, kind, fetch_size)
+    store_groups = (
+        (sid, [tuple(None if v != v else v for v in r) for r in arr.tolist()])  # NaN -> vacío, como pandas
+        for sid, arr in iter_store_curves(conn, db_path, kind)
+    )
+    merged = heapq.merge(sql_groups, store_groups, key=lambda g: g[0])
+    for sid, parts in groupby(merged, key=lambda g: g[0]):
+        parts = [rows for _, rows in parts]
+        if len(parts) == 1:
+            yield sid, parts[0]
+        else:
+            # misma simulación en ambos almacenes (no debería ocurrir): orden por x estable
+            yield sid, sorted((r for rows in parts for r in rows), key=lambda r: r[0])
+
+
+def export_db_to_pyrheo(db_path: str, output_dir: str,
+                        per_mw: bool = False,
+                        generate_aggregated: bool = True,
+                        dest_root: str | None = None,
+                        fetch_size: int = 50_000) -> None:
+    """
+    NUEVO CAMBIO: exportador directo SQLite -> pyRheo, sin pasar por 01-*.csv.
+    Recorre `dynamic`/`relaxation` ordenadas por simulation_id y en una sola pasada escribe:
+    - el agregado 02-<tipo>_pyRheo.csv en `output_dir` (si generate_aggregated),
+    - y, si per_mw, un fichero por simulación (en <dest_root>/Mw_*/02-<tipo>_pyRheo.csv o,
+      sin dest_root, con el nombre plano 02-<tipo>_pyRheo_Mw_..._.csv en output_dir).
+    En memoria solo hay una simulación y un bloque de `fetch_size` filas.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        df_sim = pd.read_sql_query(
+            "SELECT id, molecular_weight, pdi, distribution_label FROM simulation", conn
+        )
+        sim_index = _pyrheo_sim_index(df_sim)
+
+        for kind in ("relaxation", "dynamic"):
+            header = [PYRHEO_COLUMNS[kind][c] for c in CURVE_COLUMNS[kind]]
+            agg_fd = None
+            if generate_aggregated:
+                agg_fd = open(os.path.join(output_dir, f"02-{kind}_pyRheo.csv"), "w", newline="")
+                agg = csv.writer(agg_fd, lineterminator="\n")
+                agg.writerow(header)
+            try:
+                for sid, rows in _iter_curve_groups(conn, db_path, kind, fetch_size):
+                    if agg_fd is not None:
+                        agg.writerows(rows)
+                    tokens = sim_index.get(int(sid)) if per_mw else None
+                    if not tokens:
+                        continue
+                    if dest_root:
+                        out_path = os.path.join(dest_root, pyrheo_subdir_name(*tokens), f"02-{kind}_pyRheo.csv")
+                        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                    else:
+                        mw_token, dist_token, pdi_token = tokens
+                        out_path = os.path.join(
+                            output_dir, f"02-{kind}_pyRheo_Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}.csv"
+                        )
+                    with open(out_path, "w", newline="") as fd:
+                        w = csv.writer(fd, lineterminator="\n")
+                        w.writerow(header)
+                        w.writerows(rows)
+            finally:
+                if agg_fd is not None:
+                    agg_fd.close()
+    finally:
+        conn.close()
 
 
 def upload_csv(sftp, local_csv_dir: str, remote_dir: str,
-               upload_per_mw: bool = False) -> None:
+               upload_per_mw: bool = False,
+               ssh=None, channels: int = DEFAULT_CHANNELS, use_tar: bool = False) -> None:
     """
     Subida de .csv:
     - Subir SOLO 01-*.csv al raíz (y 03- si existe y se desea).
     - Si `upload_per_mw=True`: subir por simulación al subdirectorio EXACTO
       'Mw_<mw_token>__D<dist_token>__PDI_<pdi_token>'.
       **No** crear subdirectorios nuevos si no existen.
+    NUEVO CAMBIO: primero se reúnen todos los pares (local, remoto) y después se suben en lote:
+    con `ssh` se usan `channels` canales SFTP concurrentes (utils/sftp_transfer.py) o, con
+    use_tar=True, un único flujo tar; sin `ssh`, uno a uno por `sftp` como antes.
     """
-    try:
-        if os.path.isdir(local_csv_dir):
-            # Agregados al raíz -> solo 01-*.csv (y 03- si existe)
-            for fname in [
-                "01-simulation.csv", "01-dynamic.csv", "01-relaxation.csv",
-                "01-job_status.csv",
-                "03-viscosity_by_distribution.csv"  # puede no existir
-            ]:
-                local_path = os.path.join(local_csv_dir, fname)
-                if os.path.exists(local_path):
-                    sftp.put(local_path, os.path.join(remote_dir, fname))
-
-            # Subida por simulación (Mw + D + PDI)
-            if upload_per_mw:
-                # Remoto: entradas existentes en el working directory
-                try:
-                    remote_entries = sftp.listdir(remote_dir)
-                except Exception:
-                    remote_entries = []
-
-                for fname in os.listdir(local_csv_dir):
-                    # Nuevo patrón de nombres:
-                    # 02-<type>_pyRheo_Mw_<mw>__D<dist>__PDI_<pdi>.csv
-                    m = re.match(
-                        r"^(02-(relaxation|dynamic)_pyRheo)_Mw_([^_]+(?:_.+)?)__D([^_]+)__PDI_(.+)\.csv$",
-                        fname, re.IGNORECASE
-                    )
-                    if not m:
-                        continue
-
-                    base_name = m.group(1)      # 02-relaxation_pyRheo | 02-dynamic_pyRheo
-                    mw_token  = m.group(3)      # e.g. 20000_0
-                    dist_token = m.group(4)     # e.g. 0, 4
-                    pdi_token  = m.group(5)     # e.g. 1_5, 2_5
-
-                    # Subdirectorio DESTINO exacto
-                    target_dir_name = f"Mw_{mw_token}__D{dist_token}__PDI_{pdi_token}"
-                    if target_dir_name not in remote_entries:
-                        # No existe: no crear, saltar
-                        continue
-
-                    remote_subdir = os.path.join(remote_dir, target_dir_name)
-                    # Verificar accesibilidad
-                    try:
-                        sftp.stat(remote_subdir)
-                    except Exception:
-                        continue
-
-                    local_path = os.path.join(local_csv_dir, fname)
-                    remote_path = os.path.join(remote_subdir, f"{base_name}.csv")
-                    try:
-                        sftp.put(local_path, remote_path)
-                    except Exception as e:
-                        st.warning(f"WARNING!!! No se pudo subir {fname} a {remote_subdir}: {e}")
-
-    except Exception:
-        st.error(e)
+    if not os.path.isdir(local_csv_dir):
+        return
+    pairs = []
+    # Agregados al raíz -> solo 01-*.csv (y 03- si existe)
+    for fname in [
+        "01-simulation.csv", "01-dynamic.csv", "01-relaxation.csv",
+        "01-job_status.csv",
+        "03-viscosity_by_distribution.csv"  # puede no existir
+    ]:
+        local_path = os.path.join(local_csv_dir, fname)
+        if os.path.exists(local_path):
+            pairs.append((local_path, os.path.join(remote_dir, fname)))
+
+    # Subida por simulación (Mw + D + PDI)
+    if upload_per_mw:
+        # Remoto: subdirectorios existentes en el working directory (un solo listdir_attr,
+        # sin stat por subdirectorio)
+        try:
+            remote_subdirs = {e.filename for e in sftp.listdir_attr(remote_dir) if stat.S_ISDIR(e.st_mode)}
+        except Exception:
+            remote_subdirs = set()
+
+        for fname in os.listdir(local_csv_dir):
+            # Layout por subdirectorio (csv_format_to_pyrheo / export_db_to_pyrheo con dest_root)
+            # <local_csv_dir>/Mw_<mw>__D<dist>__PDI_<pdi>/02-<type>_pyRheo.csv
+            local_sub = os.path.join(local_csv_dir, fname)
+            if fname.startswith("Mw_") and os.path.isdir(local_sub):
+                if fname not in remote_subdirs:
+                    # No existe: no crear, saltar
+                    continue
+                for kind in ("relaxation", "dynamic"):
+                    local_path = os.path.join(local_sub, f"02-{kind}_pyRheo.csv")
+                    if os.path.exists(local_path):
+                        pairs.append((local_path, os.path.join(remote_dir, fname, f"02-{kind}_pyRheo.csv")))
+                continue
+
+            # Nuevo patrón de nombres:
+            # 02-<type>_pyRheo_Mw_<mw>__D<dist>__PDI_<pdi>.csv
+            m = re.match(
+                r"^(02-(relaxation|dynamic)_pyRheo)_Mw_([^_]+(?:_.+)?)__D([^_]+)__PDI_(.+)\.csv$",
+                fname, re.IGNORECASE
+            )
+            if not m:
+                continue
+
+            base_name = m.group(1)      # 02-relaxation_pyRheo | 02-dynamic_pyRheo
+            mw_token  = m.group(3)      # e.g. 20000_0
+            dist_token = m.group(4)     # e.g. 0, 4
+            pdi_token  = m.group(5)     # e.g. 1_5, 2_5
+
+            # Subdirectorio DESTINO exacto
+            target_dir_name = pyrheo_subdir_name(mw_token, dist_token, pdi_token)
+            if target_dir_name not in remote_subdirs:
+                # No existe: no crear, saltar
+                continue
+            pairs.append((os.path.join(local_csv_dir, fname),
+                          os.path.join(remote_dir, target_dir_name, f"{base_name}.csv")))
+
+    failed = None
+    if ssh is not None and use_tar:
+        try:
+            put_tar(ssh, pairs, remote_dir)
+            failed = []
+        except Exception as e:
+            st.warning(f"WARNING!!! Subida tar fallida, se usa SFTP: {e}")
+    if failed is None:
+        if ssh is not None:
+            failed = transfer_many(ssh, pairs, "put", channels=channels, sftp=sftp)
+        else:
+            failed = transfer_many(None, pairs, "put", channels=1, sftp=sftp)
+    for local_path, remote_path, e in failed:
+        st.warning(f"WARNING!!! No se pudo subir {local_path} a {remote_path}: {e}")
@@ -0,0 +1,154 @@
+# utils/local_executor.py
+"""
+Ejecución local de rejillas BoB (sin servidor ni SLURM) en una estación de trabajo multinúcleo.
+
+Se usa el mismo árbol que en remoto (<working_directory>/Mw_*__D*__PDI_*/ con su .dat y los enlaces
+a viscai_shared/), así database_db_creation() en modo local ingesta el resultado directamente.
+Cada simulación:
+- ejecuta `bob2p5 -i <dat> [-c <polymer>] [flags]` en su subdirectorio, con límite de tiempo opcional;
+- escribe su salida en bob_task.out y "inicio fin rc" en viscai_timing.txt, igual que los scripts SLURM;
+- deja su estado (pending/running/completed/failed) en <working_directory>/local_jobs.json.
+  El formato es el de slurm_tracker, así que summarize() y load_job_state() sirven para ambos.
+Las simulaciones se reparten en `workers` hilos, y cada hilo espera a su propio proceso BoB.
+"""
+import json
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ViscAI.utils.runtime_model import TIMING_FILENAME
+
+LOCAL_STATE_FILENAME = "local_jobs.json"
+LOCAL_LOG_NAME = "local_run.log"
+BOB_OUTPUT_NAME = "bob_task.out"
+
+
+def write_tree(root: str, files: dict, links: dict | None = None) -> None:
+    """
+    Equivalente local de sftp_transfer.put_tree: {ruta_relativa: bytes} y enlaces simbólicos
+    {ruta_relativa: destino}. Si el sistema no permite enlaces, se copia el destino.
+    """
+    for name, data in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    for name, target in (links or {}).items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.lexists(path):
+            os.remove(path)
+        try:
+            os.symlink(target, path)
+        except OSError:
+            shutil.copyfile(os.path.join(os.path.dirname(path), target), path)
+
+
+class LocalGridRunner:
+    """
+    Ejecuta `jobs` = [(subdir, dat, polymer o None)] en orden (los más costosos primero, si el
+    llamador los ordena) con a lo sumo `workers` BoB a la vez. timeout_secs (None o 0 = sin límite)
+    se aplica a cada simulación: al agotarse se mata el proceso y el job queda como failed/TIMEOUT.
+    """
+
+    def __init__(self, working_directory, jobs, bob_exe="bob2p5", flags=(), workers=None,
+                 timeout_secs=None, state_path=None):
+        self.working_directory = working_directory
+        self.jobs = [(f"local_{i}", sd, dat, poly) for i, (sd, dat, poly) in enumerate(jobs, start=1)]
+        self.bob_exe = bob_exe
+        self.flags = [f for f in flags if f]
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.timeout_secs = float(timeout_secs) if timeout_secs else None
+        self.state_path = state_path or os.path.join(working_directory, LOCAL_STATE_FILENAME)
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        now = time.time()
+        self._state = {
+            "backend": "local",
+            "working_directory": working_directory,
+            "jobs": {key: {"subdir": sd, "state": "pending", "slurm_state": "PENDING", "since": now}
+                     for key, sd, _, _ in self.jobs},
+            "started_at": now,
+            "updated_at": now,
+            "done": not self.jobs,
+            "timed_out": False,
+            "error": None,
+            "on_done_result": None,
+        }
+
+    def state(self) -> dict:
+        """Copia del estado actual (seguro desde cualquier hilo)."""
+        with self._lock:
+            return json.loads(json.dumps(self._state))
+
+    def _persist(self):
+        with self._persist_lock:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state(), f, indent=1)
+            os.replace(tmp, self.state_path)
+
+    def _set(self, key, state, detail):
+        with self._lock:
+            now = time.time()
+            self._state["jobs"][key].update(state=state, slurm_state=detail, since=now)
+            self._state["updated_at"] = now
+            self._state["done"] = all(j["state"] in ("completed", "failed") for j in self._state["jobs"].values())
+            with open(os.path.join(self.working_directory, LOCAL_LOG_NAME), "a") as log:
+                log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {self._state['jobs'][key]['subdir']} {detail}\n")
+        self._persist()
+
+    def _run_one(self, key, subdir, dat, poly):
+        cwd = os.path.join(self.working_directory, subdir)
+        cmd = [self.bob_exe, "-i", dat] + (["-c", poly] if poly else []) + self.flags
+        self._set(key, "running", "RUNNING")
+        start = time.time()
+        with open(os.path.join(cwd, BOB_OUTPUT_NAME), "wb") as out:
+            try:
+                proc = subprocess.Popen(cmd, cwd=cwd, stdout=out, stderr=subprocess.STDOUT,
+                                        stdin=subprocess.DEVNULL, start_new_session=(os.name == "posix"))
+            except OSError as e:
+                out.write(f"{e}\n".encode())
+                rc, detail = 127, f"FAILED ({e})"
+            else:
+                try:
+                    rc = proc.wait(timeout=self.timeout_secs)
+                    detail = "COMPLETED" if rc == 0 else f"FAILED (rc={rc})"
+                except subprocess.TimeoutExpired:
+                    try:
+                        if os.name == "posix":
+                            os.killpg(proc.pid, signal.SIGKILL)
+                        else:
+                            proc.kill()
+                    except ProcessLookupError:
+                        pass  # BoB terminó entre el timeout y el kill: sigue contando como TIMEOUT
+                    proc.wait()
+                    rc, detail = -9, "TIMEOUT"
+        with open(os.path.join(cwd, TIMING_FILENAME), "w") as f:
+            f.write(f"{start:.0f} {time.time():.0f} {rc}\n")
+        self._set(key, "completed" if rc == 0 else "failed", detail)
+        return key, rc
+
+    def run(self, progress=None) -> dict:
+        """
+        Bloquea hasta terminar todas las simulaciones y devuelve el estado final.
+        progress(state) se llama en el hilo del llamador tras cada simulación, así que puede usar st.*.
+        """
+        self._persist()
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            futures = {ex.submit(self._run_one, *job): job[0] for job in self.jobs}
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    with self._lock:
+                        self._state["error"] = str(e)
+                    self._set(futures[fut], "failed", f"FAILED ({e})")
+                if progress:
+                    progress(self.state())
+        self._persist()
+        return self.state()
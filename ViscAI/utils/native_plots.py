@@ -0,0 +1,193 @@
+# utils/native_plots.py
+"""
+Gráficas de salida de BoB sin gnuplot ni xmgrace (matplotlib, backend Agg, sin pantalla).
+
+Las curvas se leen de lo ya ingestado, no de los gt.dat/gtp.dat remotos:
+- load_db_curves(): tablas `relaxation`/`dynamic` de la base de datos + almacén columnar.
+- load_npz_curves(): resampled_data.npz de build_resampled_rheology_features.
+- las gráficas gpcls se leen de los gpcls*.dat locales (columnas M, P[log(M)], n_br, g).
+
+Cada proceso crea UNA figura por tipo de gráfica (G(t), G'/G'', gpcls) con sus líneas y ejes,
+y para cada simulación solo cambia los datos (set_data) antes de guardar el PNG; los lotes de
+simulaciones se reparten entre procesos con render_plots().
+"""
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ViscAI.utils.curve_store import has_curve_store, load_curves
+
+PLOT_KINDS = ("gt", "gtp", "gpcls")
+
+
+def _placeholders(n):
+    return ",".join("?" * n)
+
+
+def load_db_curves(db_path: str, simulation_ids=None) -> dict:
+    """
+    {simulation_id: {"relaxation": (n, 2), "dynamic": (n, 3)}} con cada curva ordenada por su eje x.
+    Se combinan las tablas SQLite y el almacén columnar (curve_index), si existe.
+    """
+    ids = None if simulation_ids is None else [int(s) for s in simulation_ids]
+    out = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        for kind, cols in (("relaxation", "time, modulu"), ("dynamic", "frequency, elastic_modulu, viscous_modulu")):
+            sql = f"SELECT simulation_id, {cols} FROM {kind}"
+            params = ()
+            if ids is not None:
+                sql += f" WHERE simulation_id IN ({_placeholders(len(ids))})"
+                params = ids
+            rows = np.asarray(conn.execute(sql + " ORDER BY simulation_id", params).fetchall(), dtype=float)
+            if rows.size:
+                sids = rows[:, 0].astype(np.int64)
+                cuts = np.flatnonzero(np.diff(sids)) + 1
+                for block in np.split(rows, cuts):
+                    out.setdefault(int(block[0, 0]), {})[kind] = block[:, 1:]
+            if has_curve_store(conn):
+                for sid, arr in load_curves(db_path, kind, simulation_ids=ids, conn=conn).items():
+                    out.setdefault(int(sid), {})[kind] = arr
+    finally:
+        conn.close()
+    for curves in out.values():
+        for kind, arr in curves.items():
+            curves[kind] = arr[np.argsort(arr[:, 0], kind="stable")]
+    return out
+
+
+def load_npz_curves(npz_path: str, simulation_ids=None) -> dict:
+    """Mismo formato que load_db_curves, a partir de las mallas comunes de resampled_data.npz."""
+    with np.load(npz_path) as npz:
+        sim_ids = npz["sim_ids"]
+        time_grid, freq_grid = npz["time_grid"], npz["freq_grid"]
+        G_t_all, Gp_all, Gpp_all = npz["G_t_all"], npz["Gp_all"], npz["Gpp_all"]
+    wanted = None if simulation_ids is None else set(int(s) for s in simulation_ids)
+    out = {}
+    for i, sid in enumerate(sim_ids):
+        if wanted is not None and int(sid) not in wanted:
+            continue
+        out[int(sid)] = {
+            "relaxation": np.column_stack([time_grid, G_t_all[i]]),
+            "dynamic": np.column_stack([freq_grid, Gp_all[i], Gpp_all[i]]),
+        }
+    return out
+
+
+class _Canvas:
+    """Una figura reutilizable por tipo de gráfica: ejes y líneas se crean una sola vez."""
+
+    def __init__(self, kind: str, dpi: int = 100):
+        self.kind = kind
+        self.dpi = dpi
+        if kind == "gpcls":
+            self.fig = Figure(figsize=(5, 10))
+            axes = self.fig.subplots(3, 1, sharex=True)
+            specs = [("P [log(M)]", "blue"), (r"$n_{br}$ / 500 monomer", "red"),
+                     (r"$g = \left(\frac{R_{g}^{br}}{R_{g}^{lin}}\right)^2$", "green")]
+            self.lines = []
+            for ax, (ylabel, color) in zip(axes, specs):
+                ax.set_xscale("log")
+                ax.set_ylabel(ylabel)
+                self.lines.append((ax, ax.plot([], [], marker="o", linestyle="", markersize=4, color=color)[0]))
+            axes[-1].set_xlabel("M (g/mol)")
+        else:
+            self.fig = Figure(figsize=(5, 4))
+            ax = self.fig.add_subplot(1, 1, 1)
+            ax.set_xscale("log")
+            ax.set_yscale("log")
+            if kind == "gt":
+                ax.set_xlabel("t (s)")
+                ax.set_ylabel("G(t) (Pa)")
+                self.lines = [(ax, ax.plot([], [], color="black", lw=2.0, label="G(t)")[0])]
+            else:
+                ax.set_xlabel(r"$\omega$ (s$^{-1}$)")
+                ax.set_ylabel("G (Pa)")
+                self.lines = [(ax, ax.plot([], [], color="red", lw=2.0, label="G'(ω)")[0]),
+                              (ax, ax.plot([], [], color="blue", lw=2.0, label="G''(ω)")[0])]
+            ax.legend(loc="upper left" if kind == "gtp" else "upper right")
+        self.title = self.fig.axes[0].set_title("")
+        FigureCanvasAgg(self.fig)
+        self.fig.tight_layout()
+
+    def render(self, title: str, data: np.ndarray, out_path: str) -> str:
+        """data: columnas x, y1[, y2...] (una por línea); solo se actualizan datos y límites."""
+        x = data[:, 0]
+        for j, (ax, line) in enumerate(self.lines, start=1):
+            y = data[:, j]
+            if ax.get_yscale() == "log":
+                keep = (x > 0) & (y > 0)
+            else:
+                keep = x > 0
+            line.set_data(x[keep], y[keep])
+        for ax in {id(ax): ax for ax, _ in self.lines}.values():
+            ax.relim()
+            ax.autoscale_view()
+        self.title.set_text(title)
+        self.fig.savefig(out_path, dpi=self.dpi)
+        return out_path
+
+
+def _render_batch(jobs, dpi):
+    """jobs: [(kind, title, data, out_path)]; una _Canvas por tipo para todo el lote."""
+    canvases = {}
+    done = []
+    for kind, title, data, out_path in jobs:
+        canvas = canvases.get(kind)
+        if canvas is None:
+            canvas = canvases[kind] = _Canvas(kind, dpi)
+        try:
+            done.append((out_path, canvas.render(title, data, out_path)))
+        except Exception as e:
+            done.append((out_path, e))
+    return done
+
+
+def curve_plot_jobs(curves: dict, out_dir: str, kinds=("gt", "gtp")) -> list:
+    """Trabajos de render_plots() para {simulation_id: {"relaxation", "dynamic"}} -> sim_<id>_<kind>.png."""
+    jobs = []
+    for sid in sorted(curves):
+        sim = curves[sid]
+        if "gt" in kinds and len(sim.get("relaxation", ())):
+            jobs.append(("gt", f"simulation {sid}", sim["relaxation"],
+                         os.path.join(out_dir, f"sim_{sid}_gt.png")))
+        if "gtp" in kinds and len(sim.get("dynamic", ())):
+            jobs.append(("gtp", f"simulation {sid}", sim["dynamic"],
+                         os.path.join(out_dir, f"sim_{sid}_gtp.png")))
+    return jobs
+
+
+def gpcls_plot_jobs(dat_paths: dict, out_dir: str) -> list:
+    """Trabajos de render_plots() para {etiqueta (p.ej. 'Mw_1000'): gpcls*.dat} -> <etiqueta>_gpcls.png."""
+    jobs = []
+    for label in sorted(dat_paths):
+        data = np.loadtxt(dat_paths[label], ndmin=2)
+        if data.shape[1] >= 4:
+            jobs.append(("gpcls", label, data[:, :4], os.path.join(out_dir, f"{label}_gpcls.png")))
+    return jobs
+
+
+def render_plots(jobs, workers=None, dpi: int = 100) -> dict:
+    """
+    Renderiza [(kind, title, data, out_path)] en `workers` procesos (None = nº de CPUs) con
+    lotes contiguos por proceso. Devuelve {out_path: out_path o Exception}.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return {}
+    for out_path in {os.path.dirname(j[3]) for j in jobs}:
+        os.makedirs(out_path or ".", exist_ok=True)
+    n = max(1, min(len(jobs), int(workers or os.cpu_count() or 1)))
+    if n == 1:
+        return dict(_render_batch(jobs, dpi))
+    step = (len(jobs) + n - 1) // n
+    batches = [jobs[i:i + step] for i in range(0, len(jobs), step)]
+    results = {}
+    with ProcessPoolExecutor(max_workers=n) as ex:
+        for done in ex.map(_render_batch, batches, [dpi] * len(batches)):
+            results.update(done)
+    return results
@@ -1,6 +1,14 @@
-import sqlite3, os
+import sqlite3, os, shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
 import streamlit as st
-from ViscAI.utils.rheology_utils import safe_logspace, float_array, resample_log_x
+from ViscAI.utils.rheology_utils import safe_logspace, float_array, group_offsets, resample_log_x_batch
+from ViscAI.utils.curve_store import iter_curve_frames
+from ViscAI.utils.columnar import ColumnarWriter, has_columnar, remove_columnar, columnar_columns, iter_columnar_frames, read_columnar
+from ViscAI.utils.db_SQLite import ensure_curve_indexes, backup_database
 from pathlib import Path
 from datetime import datetime
 
@@ -18,8 +26,7 @@ def database_inspection():
 
     BACKUP = DB_PATH + ".bak"
     if not os.path.exists(BACKUP):
-        import shutil
-        shutil.copy(DB_PATH, BACKUP)
+        backup_database(DB_PATH, BACKUP)
         print("Backup creado:", BACKUP)
 
     conn = sqlite3.connect(DB_PATH)
@@ -46,12 +53,117 @@ def database_inspection():
     conn.close()
 
 
-def preprocess_database():
+# Tablas de curvas preprocesadas: kind -> (salida limpia, salida de huérfanas)
+_CLEAN_TABLES = {
+    "relaxation": ("relaxation_clean", "orphan_relaxation"),
+    "dynamic": ("dynamic_clean", "orphan_dynamic"),
+}
+# Columnas de la salida limpia cuando ninguna fila sobrevive (tabla vacía pero presente)
+_EMPTY_CLEAN_COLUMNS = {
+    "relaxation": ("id", "simulation_id", "time", "G_t"),
+    "dynamic": ("id", "simulation_id", "frequency", "G_prime", "G_double_prime"),
+}
+
+
+def _valid_curve_rows(chunk, kind):
+    """
+    Coerción numérica y filas válidas de un chunk de curvas (mismas reglas que antes).
+    Devuelve (chunk_valid, renombres de columnas para la salida limpia) o (None, None).
+    """
+    if kind == "relaxation":
+        chunk['time'] = pd.to_numeric(chunk.get('time', pd.Series()), errors='coerce')
+        # some DBs use 'modulu' or 'G_t'
+        for c in ('modulu', 'G_t'):
+            if c in chunk.columns:
+                chunk[c] = pd.to_numeric(chunk[c], errors='coerce')
+        # prefer 'G_t' if exists, else 'modulu'
+        valcol = 'G_t' if 'G_t' in chunk.columns else 'modulu' if 'modulu' in chunk.columns else None
+        if valcol is None:
+            return None, None
+        # valid rows: time>0 and module finite
+        mask_valid = (chunk['time'] > 0) & chunk[valcol].notna() & np.isfinite(chunk[valcol])
+        return chunk.loc[mask_valid], {valcol: 'G_t'}
+
+    chunk['frequency'] = pd.to_numeric(chunk.get('frequency', pd.Series()), errors='coerce')
+    for c in ('elastic_modulu', 'viscous_modulu'):
+        if c in chunk.columns:
+            chunk[c] = pd.to_numeric(chunk[c], errors='coerce')
+    mask_valid = chunk['frequency'] > 0
+    mask_valid &= chunk['elastic_modulu'].notna() & np.isfinite(chunk['elastic_modulu'])
+    mask_valid &= chunk['viscous_modulu'].notna() & np.isfinite(chunk['viscous_modulu'])
+    return chunk.loc[mask_valid], {'elastic_modulu': 'G_prime', 'viscous_modulu': 'G_double_prime'}
+
+
+def _clean_curve_table(conn, db_path, kind, out_dir, valid_sim_ids, chunksize, write_csv):
+    """
+    Una sola pasada sobre `kind`: el LEFT JOIN con _valid_ids marca en SQL qué filas son de
+    simulaciones válidas; las filas válidas van a <kind>_clean/ y el resto a orphan_<kind>/
+    (tablas columnares). Con write_csv=True se escriben también los CSV de compatibilidad.
+    """
+    clean_name, orphan_name = _CLEAN_TABLES[kind]
+    csv_paths = {name: os.path.join(out_dir, f"{name}.csv") for name in (clean_name, orphan_name)}
+    for name in (clean_name, orphan_name):
+        remove_columnar(os.path.join(out_dir, name))
+        # los CSV se reescriben (antes se añadían a los de ejecuciones anteriores)
+        if os.path.exists(csv_paths[name]):
+            os.remove(csv_paths[name])
+
+    sql = (f"SELECT c.*, v.id IS NOT NULL AS _kept FROM {kind} c "
+           f"LEFT JOIN _valid_ids v ON v.id = c.simulation_id")
+    writers = {}
+    counts = {"read": 0, clean_name: 0, orphan_name: 0}
+    for chunk in iter_curve_frames(conn, db_path, kind, chunksize=chunksize, sql=sql):
+        counts["read"] += len(chunk)
+        if '_kept' in chunk.columns:
+            kept = chunk.pop('_kept').astype(bool)
+        else:
+            # filas del almacén columnar de curvas (npz): mismo filtro en pandas
+            kept = chunk['simulation_id'].isin(valid_sim_ids)
+        chunk_valid, renames = _valid_curve_rows(chunk, kind)
+        if chunk_valid is None:
+            # no hay columna esperada -> salta chunk
+            continue
+        kept = kept.loc[chunk_valid.index]
+        parts = (
+            (clean_name, chunk_valid.loc[kept].rename(columns=renames)),
+            (orphan_name, chunk_valid.loc[~kept]),
+        )
+        for name, part in parts:
+            if part.empty:
+                continue
+            if name not in writers:
+                dtypes = {c: np.int64 if c in ('id', 'simulation_id') else float for c in part.columns}
+                writers[name] = ColumnarWriter(os.path.join(out_dir, name), dtypes)
+            writers[name].append(part)
+            if write_csv:
+                part.to_csv(csv_paths[name], mode='a', index=False, header=not os.path.exists(csv_paths[name]))
+            counts[name] += len(part)
+
+    if clean_name not in writers:
+        # Sin filas limpias se crea igualmente la tabla (y el CSV) vacía: el remuestreo
+        # produce entonces salidas vacías en lugar de fallar por fichero inexistente
+        columns = _EMPTY_CLEAN_COLUMNS[kind]
+        writers[clean_name] = ColumnarWriter(
+            os.path.join(out_dir, clean_name),
+            {c: np.int64 if c in ('id', 'simulation_id') else float for c in columns})
+        if write_csv:
+            pd.DataFrame(columns=list(columns)).to_csv(csv_paths[clean_name], index=False)
+    for w in writers.values():
+        w.close()
+    print(f"{kind.capitalize()}: read={counts['read']}, kept={counts[clean_name]}, "
+          f"orphans={counts[orphan_name]}, out={os.path.join(out_dir, clean_name)}")
+
+
+def preprocess_database(write_csv=False):
+    """
+    NUEVO CAMBIO: el filtro de simulaciones finished/válidas se hace en SQL (tabla temporal
+    _valid_ids + JOIN) y las curvas se escriben en una sola pasada a tablas columnares binarias
+    (preprocessed/relaxation_clean/, dynamic_clean/; ver utils/columnar.py).
+    write_csv=True escribe además relaxation_clean.csv / dynamic_clean.csv / orphan_*.csv.
+    """
     import sqlite3
     import pandas as pd
-    import numpy as np
     import os
-    import shutil
 
     local_dir = st.session_state.get("input_options", {}).get("input_file_002", "")
 
@@ -67,32 +179,32 @@ def preprocess_database():
     # Ajusta según memoria disponible (filas por chunk)
     CHUNKSIZE = 100_000
 
-    # 1) Backup
+    # 1) Backup (API de backup online de SQLite, no copia del fichero)
     BACKUP = DB_PATH + ".bak"
     if not os.path.exists(BACKUP):
-        shutil.copy(DB_PATH, BACKUP)
+        backup_database(DB_PATH, BACKUP)
         print("Backup creado:", BACKUP)
 
-    # 2) Conexión y preparación (crea índices si no existen para acelerar)
+    # 2) Conexión y preparación (índices cubrientes; normalmente ya creados en la ingesta)
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
 
-    # crear índices para acelerar filtrado por simulation_id (si no existen)
     try:
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_relaxation_sim ON relaxation(simulation_id);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_dynamic_sim ON dynamic(simulation_id);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_simulation_id ON simulation(id);")
+        ensure_curve_indexes(cur)
         conn.commit()
     except Exception as e:
         print("No se pudo crear índices (no crítico):", e)
 
-    # 3) Cargar tablas pequeñas: simulation y job_status
-    df_sim = pd.read_sql_query("SELECT * FROM simulation", conn)
-    df_status = pd.read_sql_query("SELECT * FROM job_status", conn)
-
-    # keep only finished simulations
-    finished_ids = df_status.loc[df_status['status'] == 'finished', 'simulation_id'].unique().tolist()
-    print("Simulations finished:", len(finished_ids))
+    # 3) Simulaciones finished (filtro en SQL, sin cargar job_status en pandas)
+    df_sim = pd.read_sql_query(
+        "SELECT s.* FROM simulation s WHERE EXISTS "
+        "(SELECT 1 FROM job_status j WHERE j.simulation_id = s.id AND j.status = 'finished')",
+        conn
+    )
+    n_finished = cur.execute(
+        "SELECT COUNT(DISTINCT simulation_id) FROM job_status WHERE status = 'finished'"
+    ).fetchone()[0]
+    print("Simulations finished:", n_finished)
 
     # 4) Limpieza robusta de df_sim
     # Coerce de columnas que deberían ser numéricas (si hay cadenas vacías -> NaN)
@@ -108,8 +220,6 @@ def preprocess_database():
     else:
         df_sim['distribution_label'] = 'unknown'
 
-    # Filtrar sólo finished_ids
-    df_sim = df_sim[df_sim['id'].isin(finished_ids)].copy()
     print("Simulations kept (finished):", len(df_sim))
 
     # Aplicar validaciones: mw>0, pdi>0, zero_shear_viscosity (target) presente y >0
@@ -128,104 +238,24 @@ def preprocess_database():
     valid_sim_ids = set(df_sim['id'].tolist())
     print("simulation_clean saved:", sim_out)
 
-    # 5) Procesar relaxation por chunks
-    rel_in_query = "SELECT * FROM relaxation"
-    rel_out = os.path.join(OUT_DIR, "relaxation_clean.csv")
-    orphan_rel_out = os.path.join(OUT_DIR, "orphan_relaxation.csv")
-    first_chunk = True
-    orphan_rel_count = 0
-    total_rel_in = 0
-    total_rel_kept = 0
-
-    for chunk in pd.read_sql_query(rel_in_query, conn, chunksize=CHUNKSIZE):
-        total_rel_in += len(chunk)
-        # numéricos seguros
-        chunk['time'] = pd.to_numeric(chunk.get('time', pd.Series()), errors='coerce')
-        # some DBs use 'modulu' or 'G_t'
-        if 'modulu' in chunk.columns:
-            chunk['modulu'] = pd.to_numeric(chunk['modulu'], errors='coerce')
-        if 'G_t' in chunk.columns:
-            chunk['G_t'] = pd.to_numeric(chunk['G_t'], errors='coerce')
+    # 4c) ids válidos en una tabla temporal: las curvas se filtran con un JOIN
+    cur.execute("DROP TABLE IF EXISTS temp._valid_ids")
+    cur.execute("CREATE TEMP TABLE _valid_ids (id INTEGER PRIMARY KEY)")
+    cur.executemany("INSERT OR IGNORE INTO _valid_ids (id) VALUES (?)", [(int(i),) for i in valid_sim_ids])
 
-        # valid rows: time>0 and module finite
-        mask_valid = chunk['time'] > 0
-        # prefer 'G_t' if exists, else 'modulu'
-        valcol = 'G_t' if 'G_t' in chunk.columns else 'modulu' if 'modulu' in chunk.columns else None
-        if valcol is None:
-            # no hay columna esperada -> salta chunk
-            continue
-        mask_valid &= chunk[valcol].notna() & np.isfinite(chunk[valcol])
-        chunk_valid = chunk.loc[mask_valid].copy()
-
-        # keep only finished simulation ids
-        mask_ref = chunk_valid['simulation_id'].isin(valid_sim_ids)
-        orphan_rows = chunk_valid.loc[~mask_ref]
-        if len(orphan_rows) > 0:
-            orphan_rows.to_csv(orphan_rel_out, mode='a', index=False,
-                               header=first_chunk and not os.path.exists(orphan_rel_out))
-            orphan_rel_count += len(orphan_rows)
-        chunk_final = chunk_valid.loc[mask_ref].copy()
-
-        # rename column if desired
-        chunk_final = chunk_final.rename(columns={valcol: 'G_t'})
-
-        # append to CSV
-        if not chunk_final.empty:
-            chunk_final.to_csv(rel_out, mode='a', index=False, header=first_chunk)
-            total_rel_kept += len(chunk_final)
-            first_chunk = False
-
-    print(f"Relaxation: read={total_rel_in}, kept={total_rel_kept}, orphans={orphan_rel_count}, out={rel_out}")
-
-    # 6) Procesar dynamic por chunks
-    dyn_in_query = "SELECT * FROM dynamic"
-    dyn_out = os.path.join(OUT_DIR, "dynamic_clean.csv")
-    orphan_dyn_out = os.path.join(OUT_DIR, "orphan_dynamic.csv")
-    first_chunk = True
-    orphan_dyn_count = 0
-    total_dyn_in = 0
-    total_dyn_kept = 0
-
-    for chunk in pd.read_sql_query(dyn_in_query, conn, chunksize=CHUNKSIZE):
-        total_dyn_in += len(chunk)
-        # numéricos seguros
-        chunk['frequency'] = pd.to_numeric(chunk.get('frequency', pd.Series()), errors='coerce')
-        if 'elastic_modulu' in chunk.columns:
-            chunk['elastic_modulu'] = pd.to_numeric(chunk['elastic_modulu'], errors='coerce')
-        if 'viscous_modulu' in chunk.columns:
-            chunk['viscous_modulu'] = pd.to_numeric(chunk['viscous_modulu'], errors='coerce')
-        # valid rows
-        mask_valid = chunk['frequency'] > 0
-        mask_valid &= chunk['elastic_modulu'].notna() & np.isfinite(chunk['elastic_modulu'])
-        mask_valid &= chunk['viscous_modulu'].notna() & np.isfinite(chunk['viscous_modulu'])
-        chunk_valid = chunk.loc[mask_valid].copy()
-        # keep only finished simulation ids
-        mask_ref = chunk_valid['simulation_id'].isin(valid_sim_ids)
-        orphan_rows = chunk_valid.loc[~mask_ref]
-        if len(orphan_rows) > 0:
-            orphan_rows.to_csv(orphan_dyn_out, mode='a', index=False,
-                               header=first_chunk and not os.path.exists(orphan_dyn_out))
-            orphan_dyn_count += len(orphan_rows)
-        chunk_final = chunk_valid.loc[mask_ref].copy()
-        # rename columns for clarity
-        chunk_final = chunk_final.rename(columns={'elastic_modulu': 'G_prime', 'viscous_modulu': 'G_double_prime'})
-        # append to CSV
-        if not chunk_final.empty:
-            chunk_final.to_csv(dyn_out, mode='a', index=False, header=first_chunk)
-            total_dyn_kept += len(chunk_final)
-            first_chunk = False
-
-    print(f"Dynamic: read={total_dyn_in}, kept={total_dyn_kept}, orphans={orphan_dyn_count}, out={dyn_out}")
+    # 5) y 6) relaxation y dynamic en una sola pasada cada una
+    for kind in ("relaxation", "dynamic"):
+        _clean_curve_table(conn, DB_PATH, kind, OUT_DIR, valid_sim_ids, CHUNKSIZE, write_csv)
 
     conn.close()
-    print("Preprocessing completo. CSVs en:", OUT_DIR)
+    print("Preprocessing completo. Salidas en:", OUT_DIR)
 
 
     # Archivos pretratados esperados
     PRE_DIR = Path(OUT_DIR)
     clean_files = [
-        PRE_DIR / "dynamic_clean.csv",
-        PRE_DIR / "relaxation_clean.csv",
+        PRE_DIR / "dynamic_clean",
+        PRE_DIR / "relaxation_clean",
         PRE_DIR / "simulation_clean.csv",
     ]
 
@@ -239,7 +269,7 @@ def preprocess_database():
     ]
 
     # Comprobación de seguridad
-    if all(f.exists() for f in clean_files):
+    if all(has_columnar(str(f)) or f.with_suffix(".csv").exists() for f in clean_files):
         print("✔ Preprocesado completo. Eliminando archivos raw...")
         for f in raw_files:
             if f.exists():
@@ -251,7 +281,197 @@ def preprocess_database():
         print("✖ ERROR: No se eliminaron los archivos raw (faltan CSVs preprocesados).")
 
 
-def build_resampled_rheology_features():
+# ---------- remuestreo por bloques de simulaciones ----------
+def _curve_value_columns(columns, kind):
+    """Columnas [x, y...] del CSV limpio que se remuestrean (None si falta la columna)."""
+    cols = set(columns)
+    if kind == "relaxation":
+        y = 'G_t' if 'G_t' in cols else 'modulu' if 'modulu' in cols else None
+        return ['time' if 'time' in cols else None, y]
+    x = 'frequency' if 'frequency' in cols else None
+    if 'G_prime' in cols and 'G_double_prime' in cols:
+        return [x, 'G_prime', 'G_double_prime']
+    return [x,
+            'elastic_modulu' if 'elastic_modulu' in cols else None,
+            'viscous_modulu' if 'viscous_modulu' in cols else None]
+
+
+def _curve_values(df, value_cols):
+    n = len(df)
+    return [float_array(df[c].values) if c is not None else np.full(n, np.nan) for c in value_cols]
+
+
+def _resample_block(ids, rel_sid, rel_vals, dyn_sid, dyn_vals, time_grid, freq_grid):
+    """Remuestrea G(t), G' y G'' de `ids`; rel_*/dyn_* deben venir ordenados por simulation_id."""
+    rel_start, rel_stop = group_offsets(rel_sid, ids)
+    G_t = resample_log_x_batch(rel_vals[0], rel_vals[1], rel_start, rel_stop, time_grid)
+    dyn_start, dyn_stop = group_offsets(dyn_sid, ids)
+    Gp = resample_log_x_batch(dyn_vals[0], dyn_vals[1], dyn_start, dyn_stop, freq_grid)
+    Gpp = resample_log_x_batch(dyn_vals[0], dyn_vals[2], dyn_start, dyn_stop, freq_grid)
+    return G_t, Gp, Gpp
+
+
+def _row_max_mean(arr):
+    finite = np.isfinite(arr).any(axis=1)
+    with np.errstate(all="ignore"):
+        vals = np.where(finite[:, None], arr, 0.0)
+        mx = np.where(finite, np.nanmax(vals, axis=1), 0.0)
+        mn = np.where(finite, np.nanmean(vals, axis=1), 0.0)
+    return mx, mn
+
+
+def _summary_features(G_t, Gp, time_grid, freq_grid):
+    # usar trapz sobre log(x) como medida aproximada
+    # si G_t_resampled contiene ceros todos, area=0
+    try:
+        area_Gt = np.trapz(G_t, np.log(time_grid + 1e-300), axis=1)
+    except Exception:
+        area_Gt = np.zeros(len(G_t))
+    try:
+        area_Gp = np.trapz(Gp, np.log(freq_grid + 1e-300), axis=1)
+    except Exception:
+        area_Gp = np.zeros(len(Gp))
+    max_Gt, mean_Gt = _row_max_mean(G_t)
+    max_Gp, mean_Gp = _row_max_mean(Gp)
+    return {
+        'area_Gt': area_Gt,
+        'max_Gt': max_Gt,
+        'mean_Gt': mean_Gt,
+        'area_Gp': area_Gp,
+        'max_Gp': max_Gp,
+        'mean_Gp': mean_Gp,
+    }
+
+
+def _curve_source(pre_dir, name):
+    """Tabla columnar <name>/ si existe (salida de preprocess_database), si no <name>.csv."""
+    path = os.path.join(pre_dir, name)
+    if has_columnar(path):
+        return path, columnar_columns(path)
+    path += ".csv"
+    return path, list(pd.read_csv(path, nrows=0).columns)
+
+
+def _read_curve_source(path):
+    if has_columnar(path):
+        return pd.DataFrame(read_columnar(path, mmap=False))
+    return pd.read_csv(path)
+
+
+def _iter_curve_source(path, usecols, chunksize):
+    if has_columnar(path):
+        return iter_columnar_frames(path, usecols, chunksize)
+    return pd.read_csv(path, usecols=usecols, chunksize=chunksize)
+
+
+def _spill_by_block(src_path, value_cols, sim_ids, block_first_ids, tmp_dir, prefix, read_chunksize):
+    """
+    Lee las curvas (CSV o tabla columnar) por chunks y reparte sus filas (simulation_id +
+    columnas) en un fichero binario por bloque de simulaciones, conservando el orden de lectura.
+    """
+    usecols = ['simulation_id'] + [c for c in value_cols if c is not None]
+    handles = {}
+    try:
+        for chunk in _iter_curve_source(src_path, usecols, read_chunksize):
+            sid = float_array(chunk['simulation_id'].values)
+            keep = np.isin(sid, sim_ids)
+            if not keep.any():
+                continue
+            rows = np.column_stack([sid, *_curve_values(chunk, value_cols)])[keep]
+            block = np.searchsorted(block_first_ids, rows[:, 0], side='right') - 1
+            for b in np.unique(block):
+                fh = handles.get(b)
+                if fh is None:
+                    fh = handles[b] = open(os.path.join(tmp_dir, f"{prefix}_{b:05d}.bin"), "ab")
+                rows[block == b].tofile(fh)
+    finally:
+        for fh in handles.values():
+            fh.close()
+
+
+def _load_block(tmp_dir, prefix, b, ncols):
+    path = os.path.join(tmp_dir, f"{prefix}_{b:05d}.bin")
+    if os.path.exists(path):
+        data = np.fromfile(path, dtype=float).reshape(-1, ncols)
+    else:
+        data = np.empty((0, ncols))
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    return data[:, 0], [data[:, k] for k in range(1, ncols)]
+
+
+def _open_outputs(out):
+    """
+    Abre en un worker los arrays de salida compartidos:
+    ("shm", [(nombre, shape), ...]) -> shared_memory; ("npy", [ruta, ...]) -> .npy memory-mapped.
+    Devuelve (arrays, handles) — los handles se cierran con _close_outputs.
+    """
+    kind, specs = out
+    if kind == "shm":
+        handles = [shared_memory.SharedMemory(name=name) for name, _ in specs]
+        arrays = [np.ndarray(shape, dtype=float, buffer=h.buf) for h, (_, shape) in zip(handles, specs)]
+        return arrays, handles
+    return [np.load(path, mmap_mode="r+") for path in specs], []
+
+
+def _close_outputs(arrays, handles):
+    for arr in arrays:
+        if isinstance(arr, np.memmap):
+            arr.flush()
+    del arrays[:]
+    for h in handles:
+        h.close()
+
+
+def _resample_task(task):
+    """
+    Unidad de trabajo del pool: remuestrea un rango contiguo de simulaciones (filas lo:lo+len(ids))
+    y lo escribe directamente en las salidas compartidas. Devuelve (lo, features resumen).
+    Las curvas llegan en la tarea (modo en memoria) o se leen del bloque temporal (modo streaming).
+    """
+    ids, lo = task["ids"], task["lo"]
+    if "spill" in task:
+        tmp_dir, b, n_rel, n_dyn = task["spill"]
+        rel_sid, rel_vals = _load_block(tmp_dir, "rel", b, n_rel)
+        dyn_sid, dyn_vals = _load_block(tmp_dir, "dyn", b, n_dyn)
+    else:
+        rel_sid, rel_vals = task["rel"]
+        dyn_sid, dyn_vals = task["dyn"]
+    time_grid, freq_grid = task["grids"]
+    G_t, Gp, Gpp = _resample_block(ids, rel_sid, rel_vals, dyn_sid, dyn_vals, time_grid, freq_grid)
+    arrays, handles = _open_outputs(task["out"])
+    try:
+        for dst, block in zip(arrays, (G_t, Gp, Gpp)):
+            dst[lo:lo + len(ids)] = block
+    finally:
+        _close_outputs(arrays, handles)
+    return lo, _summary_features(G_t, Gp, time_grid, freq_grid)
+
+
+def _run_resample_tasks(tasks, workers):
+    """Ejecuta las tareas en un pool de procesos y devuelve los resúmenes en el orden de filas."""
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        results = sorted(ex.map(_resample_task, tasks), key=lambda r: r[0])
+    return [summary for _, summary in results]
+
+
+def _slice_curves(sid, vals, ids):
+    """Filas (ya ordenadas por simulation_id) que pertenecen al rango de ids [ids[0], ids[-1]]."""
+    lo = np.searchsorted(sid, ids[0], side="left")
+    hi = np.searchsorted(sid, ids[-1], side="right")
+    return sid[lo:hi], [v[lo:hi] for v in vals]
+
+
+def build_resampled_rheology_features(streaming=False, chunk_size=5000, read_chunksize=100_000,
+                                      workers=1):
+    """
+    streaming=True: modo out-of-core para barridos que no caben en RAM. Las curvas limpias se leen
+    por chunks de `read_chunksize` filas y se reparten en ficheros temporales por bloques de
+    `chunk_size` simulaciones; cada bloque se remuestrea y se escribe en arrays .npy
+    memory-mapped (G_t_all.npy, Gp_all.npy, Gpp_all.npy) además de resampled_data.npz.
+    workers > 1 (o None = nº de CPUs): las simulaciones se reparten en rangos contiguos entre
+    procesos que escriben en memoria compartida (o en los .npy en streaming); mismo resultado
+    que el modo serie.
+    """
     import os
     import numpy as np
     import pandas as pd
@@ -267,8 +487,6 @@ def build_resampled_rheology_features():
     # Ajusta según tu estructura
     PRE_DIR = os.path.join(local_dir, "preprocessed")
     SIM_CSV = os.path.join(PRE_DIR, "simulation_clean.csv")
-    REL_CSV = os.path.join(PRE_DIR, "relaxation_clean.csv")
-    DYN_CSV = os.path.join(PRE_DIR, "dynamic_clean.csv")
 
     OUT_DIR = PRE_DIR  # guarda los outputs aquí
     os.makedirs(OUT_DIR, exist_ok=True)
@@ -285,100 +503,126 @@ def build_resampled_rheology_features():
 
     # ---------- cargar CSVs ----------
     df_sim = pd.read_csv(SIM_CSV)
-    df_rel = pd.read_csv(REL_CSV)
-    df_dyn = pd.read_csv(DYN_CSV)
 
     sim_ids = sorted(df_sim['id'].unique())
-    print("Simulations to process:", len(sim_ids))
+    n_sims = len(sim_ids)
+    print("Simulations to process:", n_sims)
 
     # crear mallas fijas
     time_grid = safe_logspace(TIME_MIN, TIME_MAX, N_TIME)
     freq_grid = safe_logspace(FREQ_MIN, FREQ_MAX, N_FREQ)
 
-    # arrays para guardar
-    G_t_all = np.zeros((len(sim_ids), N_TIME), dtype=float)
-    Gp_all = np.zeros((len(sim_ids), N_FREQ), dtype=float)
-    Gpp_all = np.zeros((len(sim_ids), N_FREQ), dtype=float)
-
-    features_rows = []
-
-    for i, sid in enumerate(sim_ids):
-        # meta
-        row_sim = df_sim[df_sim['id'] == sid].iloc[0].to_dict()
-
-        # RELAXATION -> tiempos y modulos
-        sub_rel = df_rel[df_rel['simulation_id'] == sid]
-        # intenta columnas esperadas: 'time' y 'G_t' o 'modulu'
-        if 'time' not in sub_rel.columns:
-            print(f"[WARN] 'time' column missing for sim {sid}, skipping")
-            t = np.array([])
-        else:
-            t = float_array(sub_rel['time'].values)
-        if 'G_t' in sub_rel.columns:
-            G = float_array(sub_rel['G_t'].values)
-        elif 'modulu' in sub_rel.columns:
-            G = float_array(sub_rel['modulu'].values)
+    # curvas limpias: tablas columnares de preprocess_database o, si no, los *_clean.csv
+    REL_SRC, rel_all_cols = _curve_source(PRE_DIR, "relaxation_clean")
+    DYN_SRC, dyn_all_cols = _curve_source(PRE_DIR, "dynamic_clean")
+    rel_cols = _curve_value_columns(rel_all_cols, "relaxation")
+    dyn_cols = _curve_value_columns(dyn_all_cols, "dynamic")
+    if rel_cols[0] is None:
+        print("[WARN] 'time' column missing in relaxation, G(t) se queda a ceros")
+
+    # NUEVO CAMBIO: ordenar una sola vez por simulation_id y remuestrear por lotes
+    # (antes se filtraba df_rel/df_dyn completos para cada simulación)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(int(workers), n_sims or 1))
+
+    if not streaming:
+        df_rel = _read_curve_source(REL_SRC).sort_values('simulation_id', kind='stable')
+        df_dyn = _read_curve_source(DYN_SRC).sort_values('simulation_id', kind='stable')
+        rel = (float_array(df_rel['simulation_id'].values), _curve_values(df_rel, rel_cols))
+        dyn = (float_array(df_dyn['simulation_id'].values), _curve_values(df_dyn, dyn_cols))
+        del df_rel, df_dyn
+        if workers == 1:
+            G_t_all, Gp_all, Gpp_all = _resample_block(sim_ids, *rel, *dyn, time_grid, freq_grid)
+            summary = _summary_features(G_t_all, Gp_all, time_grid, freq_grid)
         else:
-            G = np.array([])
-
-        G_t_resampled = resample_log_x(t, G, time_grid)
-        G_t_all[i, :] = G_t_resampled
-
-        # DYNAMIC -> frequency, G' (G_prime), G'' (G_double_prime)
-        sub_dyn = df_dyn[df_dyn['simulation_id'] == sid]
-        if 'frequency' not in sub_dyn.columns:
-            freq = np.array([])
-        else:
-            freq = float_array(sub_dyn['frequency'].values)
-
-        if 'G_prime' in sub_dyn.columns and 'G_double_prime' in sub_dyn.columns:
-            Gp = float_array(sub_dyn['G_prime'].values)
-            Gpp = float_array(sub_dyn['G_double_prime'].values)
-        else:
-            Gp = float_array(sub_dyn.get('elastic_modulu', np.array([])))
-            Gpp = float_array(sub_dyn.get('viscous_modulu', np.array([])))
-
-        Gp_resampled = resample_log_x(freq, Gp, freq_grid)
-        Gpp_resampled = resample_log_x(freq, Gpp, freq_grid)
-        Gp_all[i, :] = Gp_resampled
-        Gpp_all[i, :] = Gpp_resampled
-
-        # features resumen (ejemplos)
-        # usar trapz sobre log(x) como medida aproximada
-        # si G_t_resampled contiene ceros todos, area=0
-        try:
-            area_Gt = np.trapz(G_t_resampled, np.log(time_grid + 1e-300))
-        except Exception:
-            area_Gt = 0.0
-        max_Gt = float(np.nanmax(G_t_resampled)) if np.any(np.isfinite(G_t_resampled)) else 0.0
-        mean_Gt = float(np.nanmean(G_t_resampled)) if np.any(np.isfinite(G_t_resampled)) else 0.0
-
+            # NUEVO CAMBIO: pool de procesos escribiendo en memoria compartida
+            shapes = [(n_sims, N_TIME), (n_sims, N_FREQ), (n_sims, N_FREQ)]
+            shms = [shared_memory.SharedMemory(create=True, size=max(8, a * b * 8)) for a, b in shapes]
+            try:
+                out = ("shm", [(h.name, shape) for h, shape in zip(shms, shapes)])
+                ids_arr = np.asarray(sim_ids)
+                step = -(-n_sims // (workers * 4))  # ~4 tareas por worker para repartir carga
+                tasks = []
+                for lo in range(0, n_sims, step):
+                    ids = ids_arr[lo:lo + step]
+                    tasks.append({"ids": ids, "lo": lo, "out": out, "grids": (time_grid, freq_grid),
+                                  "rel": _slice_curves(*rel, ids), "dyn": _slice_curves(*dyn, ids)})
+                parts = _run_resample_tasks(tasks, workers)
+                G_t_all, Gp_all, Gpp_all = [
+                    np.ndarray(shape, dtype=float, buffer=h.buf).copy() for h, shape in zip(shms, shapes)
+                ]
+            finally:
+                for h in shms:
+                    h.close()
+                    h.unlink()
+            summary = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    else:
+        # NUEVO CAMBIO: modo streaming (memoria acotada por chunk_size / read_chunksize)
+        chunk_size = max(1, int(chunk_size))
+        ids_arr = np.asarray(sim_ids)
+        block_first_ids = ids_arr[::chunk_size]
+        G_t_all = open_memmap(os.path.join(OUT_DIR, "G_t_all.npy"), mode="w+", dtype=float, shape=(n_sims, N_TIME))
+        Gp_all = open_memmap(os.path.join(OUT_DIR, "Gp_all.npy"), mode="w+", dtype=float, shape=(n_sims, N_FREQ))
+        Gpp_all = open_memmap(os.path.join(OUT_DIR, "Gpp_all.npy"), mode="w+", dtype=float, shape=(n_sims, N_FREQ))
+        parts = []
+        tmp_dir = tempfile.mkdtemp(prefix="viscai_resample_", dir=OUT_DIR)
         try:
-            area_Gp = np.trapz(Gp_resampled, np.log(freq_grid + 1e-300))
-        except Exception:
-            area_Gp = 0.0
-        max_Gp = float(np.nanmax(Gp_resampled)) if np.any(np.isfinite(Gp_resampled)) else 0.0
-        mean_Gp = float(np.nanmean(Gp_resampled)) if np.any(np.isfinite(Gp_resampled)) else 0.0
-
-        # característicos moleculares
-        log_MW = np.log10(max(float(row_sim.get('molecular_weight', 1.0)), 1e-12))
-        pdi = float(row_sim.get('pdi', np.nan))
-        dist = row_sim.get('distribution_label', 'unknown')
-
-        features_rows.append({
-            'id': sid,
-            'log_MW': log_MW,
-            'pdi': pdi,
-            'distribution': dist,
-            'area_Gt': area_Gt,
-            'max_Gt': max_Gt,
-            'mean_Gt': mean_Gt,
-            'area_Gp': area_Gp,
-            'max_Gp': max_Gp,
-            'mean_Gp': mean_Gp,
-            'zero_shear_viscosity': float(row_sim.get('zero_shear_viscosity', np.nan)),
-            'complex_viscosity': float(row_sim.get('complex_viscosity', np.nan)),
-        })
+            _spill_by_block(REL_SRC, rel_cols, ids_arr, block_first_ids, tmp_dir, "rel", read_chunksize)
+            _spill_by_block(DYN_SRC, dyn_cols, ids_arr, block_first_ids, tmp_dir, "dyn", read_chunksize)
+            if workers == 1:
+                for b in range(len(block_first_ids)):
+                    lo = b * chunk_size
+                    ids = ids_arr[lo:lo + chunk_size]
+                    rel_sid, rel_vals = _load_block(tmp_dir, "rel", b, 1 + len(rel_cols))
+                    dyn_sid, dyn_vals = _load_block(tmp_dir, "dyn", b, 1 + len(dyn_cols))
+                    G_t, Gp, Gpp = _resample_block(ids, rel_sid, rel_vals, dyn_sid, dyn_vals, time_grid, freq_grid)
+                    G_t_all[lo:lo + len(ids)] = G_t
+                    Gp_all[lo:lo + len(ids)] = Gp
+                    Gpp_all[lo:lo + len(ids)] = Gpp
+                    parts.append(_summary_features(G_t, Gp, time_grid, freq_grid))
+                    print(f"  bloque {b + 1}/{len(block_first_ids)}: {lo + len(ids)}/{n_sims} simulaciones")
+            else:
+                # cada worker lee su bloque temporal y escribe en los .npy (memoria ~ workers x bloque)
+                for arr in (G_t_all, Gp_all, Gpp_all):
+                    arr.flush()
+                out = ("npy", [arr.filename for arr in (G_t_all, Gp_all, Gpp_all)])
+                tasks = [
+                    {"ids": ids_arr[b * chunk_size:(b + 1) * chunk_size], "lo": b * chunk_size, "out": out,
+                     "grids": (time_grid, freq_grid),
+                     "spill": (tmp_dir, b, 1 + len(rel_cols), 1 + len(dyn_cols))}
+                    for b in range(len(block_first_ids))
+                ]
+                parts = _run_resample_tasks(tasks, workers)
+                print(f"  {len(tasks)} bloques remuestreados con {workers} procesos")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        for arr in (G_t_all, Gp_all, Gpp_all):
+            arr.flush()
+        if parts:
+            summary = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+        else:
+            summary = _summary_features(np.zeros((0, N_TIME)), np.zeros((0, N_FREQ)), time_grid, freq_grid)
+
+    # característicos moleculares (primera fila de cada id, como antes)
+    meta = df_sim.drop_duplicates('id').set_index('id').reindex(sim_ids)
+
+    def _meta_col(name, default):
+        if name in meta.columns:
+            return meta[name].values
+        return np.full(n_sims, default, dtype=object if isinstance(default, str) else float)
+
+    mw = _meta_col('molecular_weight', 1.0).astype(float)
+
+    features_rows = {
+        'id': sim_ids,
+        'log_MW': np.log10(np.maximum(mw, 1e-12)),
+        'pdi': _meta_col('pdi', np.nan).astype(float),
+        'distribution': _meta_col('distribution_label', 'unknown'),
+        **summary,
+        'zero_shear_viscosity': _meta_col('zero_shear_viscosity', np.nan).astype(float),
+        'complex_viscosity': _meta_col('complex_viscosity', np.nan).astype(float),
+    }
 
     # crear DataFrame features
     df_feat = pd.DataFrame(features_rows).set_index('id')
@@ -0,0 +1,132 @@
+
+# utils/remote_packer.py
+"""
+Empaquetador remoto de ViscAI (solo librería estándar, sin dependencias de ViscAI).
+
+El cliente (db_SQLite._iter_packed_remote) lanza por el canal exec de SSH
+`python3 -c <arranque> <working_directory> <include_root> skip-stdin` y escribe en stdin:
+    "<n bytes>\n" + este fichero + una línea JSON {dir_name: huella} con lo ya ingestado.
+En el servidor se recorren todos los subdirectorios Mw_*, se parsean gt.dat, gtp.dat
+y el .dat de entrada, y se devuelve por stdout UN único flujo gzip con:
+
+    MAGIC
+    por simulación: cabecera JSON (una línea) + float64 de gtp.dat (n_dyn x 3) y gt.dat (n_rel x 2)
+
+Así la ingesta remota hace una sola transferencia en lugar de leer cada fichero por SFTP.
+"""
+import gzip
+import json
+import os
+import sys
+from array import array
+
+MAGIC = b"VISCPK1\n"
+# Debe coincidir con db_SQLite.FINGERPRINT_FILES / _fingerprint_from_stats
+FINGERPRINT_FILES = ("info.txt", "gt.dat", "gtp.dat")
+# dir_name -> fingerprint ya ingestado (se lee de stdin en main() con 'skip-stdin')
+SKIP = {}
+
+
+def _fingerprint(base_dir):
+    parts = []
+    for name in FINGERPRINT_FILES:
+        try:
+            st_ = os.stat(os.path.join(base_dir, name))
+            parts.append("%s:%d:%d" % (name, st_.st_size, int(st_.st_mtime)))
+        except OSError:
+            parts.append("%s:-" % name)
+    return "|".join(parts)
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as fd:
+            return fd.read()
+    except Exception:
+        return None
+
+
+def _columns(text, ncols):
+    """Primeras `ncols` columnas numéricas de cada línea, aplanadas en un array('d')."""
+    out = array("d")
+    for raw in (text or "").splitlines():
+        parts = raw.split()
+        if len(parts) < ncols:
+            continue
+        try:
+            row = [float(p) for p in parts[:ncols]]
+        except ValueError:
+            continue
+        out.extend(row)
+    return out
+
+
+def _infer_from_dat(base_dir):
+    """Misma heurística que db_SQLite._infer_dist_mw_pdi_from_dat_local (devuelve el código numérico)."""
+    try:
+        files = os.listdir(base_dir)
+    except Exception:
+        return None
+    skip = {"gt.dat", "gtp.dat"}
+    for dat in [f for f in files if f.lower().endswith(".dat")
+                and f not in skip and not f.lower().startswith("gpcls")]:
+        text = _read(os.path.join(base_dir, dat))
+        if text is None:
+            continue
+        for idx, raw in enumerate(text.splitlines()):
+            line = raw.strip()
+            if not line or idx < 5:
+                continue
+            toks = line.split()
+            if len(toks) >= 3:
+                try:
+                    return [int(float(toks[0])), float(toks[1]), float(toks[2])]
+                except Exception:
+                    continue
+    return None
+
+
+def _pack_dir(out, base_dir, name):
+    gtp_path = os.path.join(base_dir, "gtp.dat")
+    gt_path = os.path.join(base_dir, "gt.dat")
+    if not (os.path.exists(gtp_path) and os.path.exists(gt_path)):
+        return False
+    fingerprint = _fingerprint(base_dir)
+    if SKIP.get(name) == fingerprint:
+        return False
+    dyn = _columns(_read(gtp_path), 3)
+    rel = _columns(_read(gt_path), 2)
+    header = {
+        "dir": name,
+        "fingerprint": fingerprint,
+        "info": _read(os.path.join(base_dir, "info.txt")),
+        "dat": _infer_from_dat(base_dir),
+        "n_dyn": len(dyn) // 3,
+        "n_rel": len(rel) // 2,
+        "byteorder": sys.byteorder,
+    }
+    out.write(json.dumps(header).encode("utf-8") + b"\n")
+    out.write(dyn.tobytes())
+    out.write(rel.tobytes())
+    return True
+
+
+def main(argv):
+    working_directory = argv[1]
+    include_root = len(argv) > 2 and argv[2] == "1"
+    if len(argv) > 3 and argv[3] == "skip-stdin":
+        SKIP.update(json.loads(sys.stdin.buffer.readline().decode("utf-8") or "{}"))
+    out = gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb", compresslevel=6)
+    out.write(MAGIC)
+    if include_root:
+        _pack_dir(out, working_directory, ".")
+    for entry in sorted(os.listdir(working_directory)):
+        full = os.path.join(working_directory, entry)
+        if entry.startswith("Mw_") and os.path.isdir(full):
+            _pack_dir(out, full, entry)
+    out.close()
+    sys.stdout.buffer.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -38,8 +38,8 @@ def resample_log_x(x, y, x_new):
     xs = x[mask]
     ys = y[mask]
 
-    # ordenar por xs (por si vienen desordenados)
-    order = np.argsort(xs)
+    # ordenar por xs (por si vienen desordenados); estable: x repetidos en orden de entrada
+    order = np.argsort(xs, kind="stable")
     xs = xs[order]
     ys = ys[order]
 
@@ -67,6 +67,116 @@ def resample_log_x(x, y, x_new):
     return y_new
 
 
+def group_offsets(sorted_keys, keys):
+    """
+    Rangos [start, stop) de cada key de `keys` dentro de `sorted_keys` (ya ordenado).
+    Una key sin filas devuelve start == stop.
+    """
+    sorted_keys = np.asarray(sorted_keys)
+    keys = np.asarray(keys)
+    starts = np.searchsorted(sorted_keys, keys, side="left")
+    stops = np.searchsorted(sorted_keys, keys, side="right")
+    return starts, stops
+
+
+def resample_log_x_batch(x, y, starts, stops, x_new):
+    """
+    Versión por lotes de resample_log_x: remuestrea todas las curvas x[starts[i]:stops[i]]
+    sobre la misma malla x_new y devuelve una matriz (n_curvas, len(x_new)).
+    Misma aritmética que np.interp + relleno con el vecino válido más cercano, así que el
+    resultado coincide con llamar a resample_log_x curva a curva (también con x repetidos:
+    ambas ordenan de forma estable, conservando el orden de entrada de los empates).
+    Los puntos se mantienen empaquetados (sin matriz rellena al ancho de la curva más larga):
+    memoria O(nº de puntos + n_curvas * len(x_new)).
+    """
+    x = float_array(x)
+    y = float_array(y)
+    x_new = float_array(x_new)
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    n = len(starts)
+    n_new = len(x_new)
+    out = np.zeros((n, n_new), dtype=float)
+    if n == 0 or n_new == 0:
+        return out
+
+    # filas de cada curva (las curvas pueden no cubrir todo x)
+    counts = stops - starts
+    gid = np.repeat(np.arange(n), counts)
+    packed = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rows = np.repeat(starts, counts) + (np.arange(counts.sum()) - np.repeat(packed, counts))
+
+    # validar y ordenar por (curva, x) en una sola pasada (lexsort es estable)
+    xs = x[rows]
+    ys = y[rows]
+    mask = np.isfinite(xs) & np.isfinite(ys) & (xs > 0)
+    gid, xs, ys = gid[mask], xs[mask], ys[mask]
+    order = np.lexsort((xs, gid))
+    gid, xs, ys = gid[order], xs[order], ys[order]
+
+    nvalid = np.bincount(gid, minlength=n)
+    ok = np.flatnonzero(nvalid >= 2)  # el resto se queda a ceros
+    if len(ok) == 0:
+        return out
+    keep = np.isin(gid, ok)
+    gid, P, Y = gid[keep], np.log10(xs[keep]), ys[keep]
+    first = np.concatenate(([0], np.cumsum(nvalid[ok])[:-1]))  # inicio de cada curva en P/Y
+    nv = nvalid[ok]
+    local = np.searchsorted(ok, gid)  # curva -> fila de `ok`
+
+    logx_new = np.log10(np.where(x_new > 0, x_new, 1e-300))
+    m = len(ok)
+    q = np.broadcast_to(logx_new[None, :], (m, n_new))
+
+    # j tal que P[j] <= q < P[j+1] (misma búsqueda que np.interp): nº de puntos de la curva
+    # con P <= q, contado con una ordenación conjunta de puntos y consultas por (curva, valor);
+    # a igual valor el punto va antes que la consulta (tipo 0 < 1)
+    qg = np.repeat(np.arange(m), n_new)
+    keys_g = np.concatenate((local, qg))
+    keys_v = np.concatenate((P, q.ravel()))
+    keys_t = np.concatenate((np.zeros(len(P), dtype=np.int8), np.ones(m * n_new, dtype=np.int8)))
+    merged = np.lexsort((keys_t, keys_v, keys_g))
+    is_point = keys_t[merged] == 0
+    points_before = np.cumsum(is_point) - is_point
+    pos = np.empty(len(merged), dtype=np.int64)
+    pos[merged] = points_before
+    j = (pos[len(P):] - np.repeat(first, n_new)).reshape(m, n_new) - 1
+
+    last = (nv - 1)[:, None]
+    base = first[:, None]
+    jj = np.clip(j, 0, np.maximum(last - 1, 0))
+    x0, x1 = P[base + jj], P[base + jj + 1]
+    y0, y1 = Y[base + jj], Y[base + jj + 1]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        slope = (y1 - y0) / (x1 - x0)
+        res = slope * (q - x0) + y0
+        bad = np.isnan(res)
+        res = np.where(bad, slope * (q - x1) + y1, res)
+    res = np.where(np.isnan(res) & bad & (y0 == y1), y0, res)
+    res = np.where(q == x0, y0, res)
+    res = np.where(j == last, Y[base + last], res)
+    res = np.where((q < P[base]) | (q > P[base + last]), np.nan, res)
+
+    # relleno: NaNs de los bordes -> valor válido más cercano; todo NaN -> ceros
+    r = np.arange(m)[:, None]
+    valid = ~np.isnan(res)
+    has_valid = valid.any(axis=1)
+    f = np.argmax(valid, axis=1)
+    l = n_new - 1 - np.argmax(valid[:, ::-1], axis=1)
+    idx = np.arange(n_new)[None, :]
+    fill = np.where(idx < f[:, None], res[r, f[:, None]], res[r, l[:, None]])
+    interior = (~valid) & (idx > f[:, None]) & (idx < l[:, None])
+    res = np.where(valid, res, fill)
+    res[~has_valid] = 0.0
+    out[ok] = res
+
+    # caso raro: NaN interiores (pendientes no finitas) -> ruta curva a curva
+    for i in np.flatnonzero(interior.any(axis=1) & has_valid):
+        c = ok[i]
+        out[c] = resample_log_x(x[starts[c]:stops[c]], y[starts[c]:stops[c]], x_new)
+    return out
+
+
 def load_npy(path):
     # LOad saved splits
     return np.load(path, allow_pickle=True)
@@ -0,0 +1,283 @@
+# utils/runtime_model.py
+"""
+Modelo de coste de las simulaciones BoB aprendido de ejecuciones anteriores.
+
+- Los scripts SLURM generados escriben <subdir>/viscai_timing.txt ("inicio fin rc", epoch) y
+  fetch_runtimes() los recoge junto con `sacct` (ElapsedRaw, MaxRSS) en una sola orden remota.
+- record_runtimes() añade esas medidas a <local_dir>/bob_runtime_history.csv con las variables del
+  punto de la rejilla: Mw y PDI (del nombre del subdirectorio) y nº de polímeros / segmentos
+  (del .dat de entrada, ver input_features()).
+- RuntimeModel ajusta log(tiempo) y log(memoria) por mínimos cuadrados (ridge) sobre
+  log(Mw), log(polímeros), log(segmentos) y PDI; con pocos datos se reduce a una ley de potencias
+  en Mw y sin datos no predice (None), de modo que se mantiene el comportamiento anterior.
+"""
+import csv
+import glob
+import math
+import os
+import shlex
+
+import numpy as np
+
+HISTORY_FILENAME = "bob_runtime_history.csv"
+TIMING_FILENAME = "viscai_timing.txt"
+HISTORY_FIELDS = ["working_directory", "subdir", "mw", "pdi", "max_polymers", "max_segments",
+                  "n_polymers", "runtime_s", "maxrss_mb", "start"]
+_RIDGE = 1e-3
+
+
+def input_features(input_file: str) -> dict:
+    """max_polymers / max_segments (línea 1) y nº total de polímeros pedidos en las componentes."""
+    feats = {"max_polymers": None, "max_segments": None, "n_polymers": None}
+    try:
+        with open(input_file, "r") as f:
+            lines = [ln.split() for ln in f]
+    except OSError:
+        return feats
+    try:
+        feats["max_polymers"] = float(lines[0][0])
+        feats["max_segments"] = float(lines[0][1])
+    except (IndexError, ValueError):
+        pass
+    # Cada componente empieza por "<fracción en peso>" seguido de "<nº polímeros> <tipo>"
+    total = 0.0
+    for prev, cur in zip(lines[6:], lines[7:]):
+        if len(prev) == 1 and len(cur) == 2:
+            try:
+                if 0.0 <= float(prev[0]) <= 1.0 and cur[0].isdigit() and cur[1].isdigit():
+                    total += float(cur[0])
+            except ValueError:
+                pass
+    feats["n_polymers"] = total or None
+    return feats
+
+
+def grid_point_features(subdir: str, base: dict) -> dict:
+    """Variables de un subdirectorio 'Mw_<mw>__D<d>__PDI_<pdi>' + las del .dat base."""
+    feats = dict(base)
+    parts = subdir.rstrip("/").split("__")
+    try:
+        feats["mw"] = float(parts[0][len("Mw_"):].replace("_", "."))
+    except (IndexError, ValueError):
+        feats["mw"] = None
+    pdi = next((p for p in parts if p.startswith("PDI_")), "")
+    try:
+        feats["pdi"] = float(pdi[len("PDI_"):].replace("_", "."))
+    except ValueError:
+        feats["pdi"] = None
+    return feats
+
+
+def _rss_mb(text: str):
+    text = text.strip()
+    if not text:
+        return None
+    units = {"K": 1.0 / 1024, "M": 1.0, "G": 1024.0, "T": 1024.0 ** 2}
+    try:
+        if text[-1].upper() in units:
+            return float(text[:-1]) * units[text[-1].upper()]
+        return float(text) / (1024 ** 2)
+    except ValueError:
+        return None
+
+
+def _local_timing_lines(working_directory: str) -> list:
+    """Mismo formato que `grep -H . Mw_*/viscai_timing.txt`, leído del disco local."""
+    lines = []
+    for path in sorted(glob.glob(os.path.join(working_directory, "Mw_*", TIMING_FILENAME))):
+        try:
+            with open(path, "r") as f:
+                content = f.readline().strip()
+        except OSError:
+            continue
+        lines.append(f"{os.path.basename(os.path.dirname(path))}/{TIMING_FILENAME}:{content}")
+    return lines
+
+
+def fetch_runtimes(ssh, working_directory: str) -> list:
+    """
+    [{subdir, runtime_s, maxrss_mb, start}] de las simulaciones terminadas en working_directory.
+    Con ssh=None el directorio es local (utils/local_executor.py): solo se leen los viscai_timing.txt.
+    """
+    if ssh is None:
+        sections = {"TIMING": _local_timing_lines(working_directory)}
+    else:
+        stdin, stdout, stderr = ssh.exec_command(
+            f"cd {shlex.quote(working_directory)} 2>/dev/null; "
+            f"echo @@TIMING; grep -H . Mw_*/{TIMING_FILENAME} 2>/dev/null; "
+            "echo @@JOBS; cat jobs.txt 2>/dev/null; "
+            "J=$(awk '{print $1}' jobs.txt 2>/dev/null | grep -E '^[0-9]+' | sed 's/_.*//' | sort -u | paste -sd, -); "
+            "echo @@SACCT; [ -n \"$J\" ] && sacct -n -P -o JobID,ElapsedRaw,MaxRSS,State -j \"$J\" 2>/dev/null; "
+            "echo @@END"
+        )
+        stdin.close()
+        sections, current = {}, None
+        for line in stdout.read().decode("utf-8", errors="ignore").splitlines():
+            if line.startswith("@@"):
+                current = line[2:].strip()
+                sections[current] = []
+            elif current and line.strip():
+                sections[current].append(line.strip())
+
+    runs = {}
+    for line in sections.get("TIMING", []):
+        path, _, values = line.partition(":")
+        toks = values.split()
+        try:
+            start, end, rc = float(toks[0]), float(toks[1]), int(toks[2])
+        except (IndexError, ValueError):
+            continue
+        if rc == 0 and end >= start:
+            runs[path.split("/", 1)[0]] = {"runtime_s": end - start, "maxrss_mb": None, "start": start}
+
+    # Jobs de un solo subdirectorio (no empaquetados): memoria (y tiempo si falta el fichero)
+    by_job = {}
+    for line in sections.get("JOBS", []):
+        toks = line.split(None, 1)
+        if len(toks) == 2:
+            by_job.setdefault(toks[0], []).append(toks[1].rstrip("/"))
+    acct = {}
+    for line in sections.get("SACCT", []):
+        toks = line.split("|")
+        if len(toks) < 4:
+            continue
+        jobid = toks[0].split(".", 1)[0]
+        entry = acct.setdefault(jobid, {"elapsed": None, "rss": None, "state": ""})
+        if "." not in toks[0]:
+            entry["elapsed"] = float(toks[1]) if toks[1].isdigit() else None
+            entry["state"] = toks[3]
+        rss = _rss_mb(toks[2])
+        if rss is not None:
+            entry["rss"] = max(rss, entry["rss"] or 0.0)
+    for jobid, subdirs in by_job.items():
+        entry = acct.get(jobid)
+        if len(subdirs) != 1 or entry is None:
+            continue
+        run = runs.get(subdirs[0])
+        if run is None and entry["elapsed"] and entry["state"].startswith("COMPLETED"):
+            run = runs[subdirs[0]] = {"runtime_s": entry["elapsed"], "maxrss_mb": None, "start": None}
+        if run is not None:
+            run["maxrss_mb"] = entry["rss"]
+    return [{"subdir": sd, **run} for sd, run in runs.items()]
+
+
+def read_history(history_path: str) -> list:
+    try:
+        with open(history_path, "r", newline="") as f:
+            return list(csv.DictReader(f))
+    except OSError:
+        return []
+
+
+def record_runtimes(ssh, working_directory: str, history_path: str, base_features: dict) -> int:
+    """Añade al histórico las simulaciones nuevas de working_directory; devuelve cuántas."""
+    seen = {(r["working_directory"], r["subdir"], r["start"]) for r in read_history(history_path)}
+    rows = []
+    for run in fetch_runtimes(ssh, working_directory):
+        start = "" if run["start"] is None else f"{run['start']:.0f}"
+        if (working_directory, run["subdir"], start) in seen:
+            continue
+        feats = grid_point_features(run["subdir"], base_features)
+        rows.append({"working_directory": working_directory, "subdir": run["subdir"],
+                     "mw": feats["mw"], "pdi": feats["pdi"], "max_polymers": feats.get("max_polymers"),
+                     "max_segments": feats.get("max_segments"), "n_polymers": feats.get("n_polymers"),
+                     "runtime_s": run["runtime_s"], "maxrss_mb": run["maxrss_mb"], "start": start})
+    if rows:
+        new_file = not os.path.exists(history_path)
+        with open(history_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+    return len(rows)
+
+
+def _num(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _design_row(feats: dict, full: bool):
+    mw = _num(feats.get("mw"))
+    if not mw or mw <= 0:
+        return None
+    row = [1.0, math.log(mw)]
+    if full:
+        for key in ("n_polymers", "max_segments"):
+            v = _num(feats.get(key))
+            row.append(math.log(v) if v and v > 0 else 0.0)
+        row.append(_num(feats.get("pdi")) or 1.0)
+    return row
+
+
+def _valid_rows(rows, target):
+    """Filas con Mw válido y `target` finito y positivo: las únicas que entran en el ajuste."""
+    out = []
+    for r in rows:
+        t = _num(r.get(target))
+        if t and t > 0 and _design_row(r, False) is not None:
+            out.append(r)
+    return out
+
+
+def _fit(rows, target, full):
+    X, y = [], []
+    for r in _valid_rows(rows, target):
+        X.append(_design_row(r, full))
+        y.append(math.log(float(r[target])))
+    if not X or len(y) < len(X[0]) + 1:
+        return None
+    X, y = np.asarray(X), np.asarray(y)
+    if len(np.unique(X[:, 1])) < 2:
+        # Un solo Mw: solo se puede estimar la media
+        return np.array([y.mean()] + [0.0] * (X.shape[1] - 1))
+    reg = _RIDGE * np.eye(X.shape[1])
+    reg[0, 0] = 0.0
+    return np.linalg.solve(X.T @ X + reg, X.T @ y)
+
+
+class RuntimeModel:
+    """Predicción de tiempo (s) y memoria (MB) por simulación; None si no hay histórico suficiente."""
+
+    MIN_FULL_SAMPLES = 12
+
+    def __init__(self, rows=()):
+        rows = list(rows)
+        # Solo cuentan las medidas utilizables (p.ej. filas sin runtime_s o con 0 no)
+        self.n_samples = len(_valid_rows(rows, "runtime_s"))
+        self.full = self.n_samples >= self.MIN_FULL_SAMPLES
+        self.time_coef = _fit(rows, "runtime_s", self.full)
+        self.mem_coef = _fit(rows, "maxrss_mb", self.full)
+
+    @classmethod
+    def load(cls, history_path: str) -> "RuntimeModel":
+        return cls(read_history(history_path))
+
+    @property
+    def fitted(self) -> bool:
+        return self.time_coef is not None
+
+    def _predict(self, coef, feats):
+        if coef is None:
+            return None
+        x = _design_row(feats, self.full)
+        return None if x is None else float(math.exp(np.dot(coef, x)))
+
+    def predict(self, feats: dict):
+        return self._predict(self.time_coef, feats)
+
+    def predict_mem_mb(self, feats: dict):
+        return self._predict(self.mem_coef, feats)
+
+
+def slurm_time(seconds: float, safety: float = 3.0, floor: float = 600.0) -> str:
+    """'--time' con margen: max(floor, safety * segundos), en minutos enteros, formato [D-]HH:MM:SS."""
+    total = 60 * int(math.ceil(max(floor, safety * seconds) / 60.0))
+    days, rem = divmod(total, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, secs = divmod(rem, 60)
+    hms = f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    return f"{days}-{hms}" if days else hms
@@ -0,0 +1,329 @@
+
+# utils/sftp_transfer.py
+"""
+Batched SFTP transfers for many small files (e.g. 2 CSV x 2000 Mw_* subdirectories).
+
+With thousands of files the cost is latency (one put/get = several round-trips), not bandwidth:
+- transfer_many(): spreads the files over several SFTP channels opened on the SAME SSH
+  transport (one per thread), so several requests are in flight at once.
+- put_tar() / get_tar(): alternative with a single tar stream over the exec channel
+  (`tar -xf -` / `tar -cf -` on the server): one round-trip for the whole set.
+  iter_tar() is the underlying generator, for callers that process contents in memory.
+- put_tree(): uploads a tree built in memory (contents + symlinks) in a single tar stream,
+  e.g. every subdirectory of a parameter grid.
+- mirror_tree(): parallel recursive mirror (work queue + N SFTP sessions) that skips files
+  whose size and mtime match the local copy.
+"""
+import os
+import stat
+import queue
+import io
+import time
+import shlex
+import shutil
+import tarfile
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CHANNELS = 4
+
+
+def _put_one(sftp, local_path, remote_path):
+    # confirm=False: no extra stat after each upload (writes are already pipelined)
+    sftp.put(local_path, remote_path, confirm=False)
+
+
+def _get_one(sftp, remote_path, local_path):
+    # Open the remote file first: if it does not exist no empty local file is left behind
+    with sftp.open(remote_path, "rb") as rf:
+        rf.prefetch()
+        with open(local_path, "wb") as lf:
+            shutil.copyfileobj(rf, lf, 1 << 16)
+
+
+def transfer_many(ssh, pairs, direction: str, channels: int = DEFAULT_CHANNELS, sftp=None) -> list:
+    """
+    Copy every (source, destination) pair over `channels` concurrent SFTP channels.
+    direction: "put" (local -> remote) or "get" (remote -> local).
+    With channels == 1 and an already open `sftp`, that channel is reused.
+    Returns the failures [(source, destination, exception)]; the batch is never aborted.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    op = _put_one if direction == "put" else _get_one
+    n = max(1, min(int(channels or 1), len(pairs)))
+
+    def _run(client, shard):
+        failed = []
+        for src, dst in shard:
+            try:
+                op(client, src, dst)
+            except Exception as e:
+                failed.append((src, dst, e))
+        return failed
+
+    if n == 1 and sftp is not None:
+        return _run(sftp, pairs)
+
+    def _worker(shard):
+        client = ssh.open_sftp()
+        try:
+            return _run(client, shard)
+        finally:
+            client.close()
+
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        results = list(ex.map(_worker, [pairs[i::n] for i in range(n)]))
+    return [f for failed in results for f in failed]
+
+
+def put_tar(ssh, pairs, remote_root: str) -> None:
+    """
+    Upload every (local, remote) pair in a single tar stream extracted in `remote_root`.
+    Destinations must be under remote_root. Raises RuntimeError if tar fails on the server.
+    """
+    stdin, stdout, stderr = ssh.exec_command(f"tar -xf - -C {shlex.quote(remote_root)}")
+    with tarfile.open(fileobj=stdin, mode="w|") as tar:
+        for local_path, remote_path in pairs:
+            tar.add(local_path, arcname=posixpath.relpath(remote_path, remote_root), recursive=False)
+    stdin.channel.shutdown_write()
+    status = stdout.channel.recv_exit_status()
+    if status != 0:
+        raise RuntimeError(stderr.read().decode("utf-8", errors="ignore").strip() or f"tar exit {status}")
+
+
+def put_tree(ssh, remote_root: str, files: dict, links: dict | None = None, mode: int = 0o644) -> None:
+    """
+    Create in `remote_root` every file {relative_path: bytes} and symlink
+    {relative_path: target} with a single remote `tar -xf -` (directories are created on extraction).
+    Raises RuntimeError if tar fails on the server.
+    """
+    now = time.time()
+    stdin, stdout, stderr = ssh.exec_command(
+        f"mkdir -p {shlex.quote(remote_root)} && tar -xf - -C {shlex.quote(remote_root)}"
+    )
+    with tarfile.open(fileobj=stdin, mode="w|") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size, info.mode, info.mtime = len(data), mode, now
+            tar.addfile(info, io.BytesIO(data))
+        for name, target in (links or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type, info.linkname, info.mode, info.mtime = tarfile.SYMTYPE, target, 0o777, now
+            tar.addfile(info)
+    stdin.channel.shutdown_write()
+    status = stdout.channel.recv_exit_status()
+    if status != 0:
+        raise RuntimeError(stderr.read().decode("utf-8", errors="ignore").strip() or f"tar exit {status}")
+
+
+def iter_tar(ssh, names, remote_root: str):
+    """
+    Stream the files `names` (relative to `remote_root`) from one remote `tar -cf -` and yield
+    (name, fileobj) for each regular file, in archive order; the fileobj is only valid until
+    the next item. Missing files are skipped. Raises RuntimeError if tar cannot run or exits
+    with an error once the stream has been consumed.
+    """
+    names = list(names)
+    stdin, stdout, stderr = ssh.exec_command(
+        f"cd {shlex.quote(remote_root)} && tar -cf - --ignore-failed-read -T -"
+    )
+
+    # The file list is written from another thread so reading the tar stream never blocks
+    def _feed():
+        try:
+            stdin.write("".join(name + "\n" for name in names))
+        except OSError:
+            pass  # remote tar already exited: reported through its exit status
+        finally:
+            stdin.channel.shutdown_write()
+
+    # stderr is drained concurrently: each missing file is a warning and, unread, they could
+    # fill the channel window and stall the stdout stream
+    errors = []
+    feeder = threading.Thread(target=_feed, daemon=True)
+    drainer = threading.Thread(target=lambda: errors.append(stderr.read()), daemon=True)
+    feeder.start()
+    drainer.start()
+    finished = False
+    try:
+        try:
+            with tarfile.open(fileobj=stdout, mode="r|") as tar:
+                for member in tar:
+                    if member.isfile():
+                        with tar.extractfile(member) as src:
+                            yield member.name, src
+            # tar pads the archive to a full record: read up to EOF
+            while stdout.read(1 << 16):
+                pass
+            stream_error = None
+        except tarfile.ReadError as e:
+            # remote tar not available or empty stream
+            stream_error = e
+        finished = True
+        status = stdout.channel.recv_exit_status()
+    finally:
+        if not finished:
+            # consumer stopped early: drop the channel so the remote tar and threads end
+            stdout.channel.close()
+        feeder.join()
+        drainer.join()
+    if stream_error is not None or status != 0:
+        message = b"".join(errors).decode("utf-8", errors="ignore").strip()
+        raise RuntimeError(message or str(stream_error or f"tar exit {status}"))
+
+
+def get_tar(ssh, pairs, remote_root: str) -> list:
+    """
+    Download the (remote, local) pairs in a single `tar -cf -` stream generated in `remote_root`.
+    Files missing on the server are skipped and returned as [(remote, local)].
+    Raises RuntimeError if tar cannot run or exits with an error on the server.
+    """
+    wanted = {posixpath.relpath(r, remote_root): l for r, l in pairs}
+    got = set()
+    for name, src in iter_tar(ssh, wanted, remote_root):
+        local_path = wanted.get(name)
+        if local_path is None:
+            continue
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        with open(local_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 16)
+        got.add(name)
+    return [(posixpath.join(remote_root, name), local) for name, local in wanted.items() if name not in got]
+
+
+def _unchanged(local_path, attr) -> bool:
+    """Like rsync's default check: same size and same mtime (seconds) as the remote file."""
+    try:
+        st_ = os.stat(local_path)
+    except OSError:
+        return False
+    return st_.st_size == attr.st_size and int(st_.st_mtime) == int(attr.st_mtime or -1)
+
+
+def mirror_tree(ssh, roots, sessions: int = DEFAULT_CHANNELS, progress=None, skip_unchanged: bool = True) -> dict:
+    """
+    Mirror one or more remote trees locally: roots = [(remote_dir, local_dir), ...].
+    A shared work queue (directories to list and files to download) is consumed by
+    `sessions` threads, each with its own SFTP channel on the same SSH transport.
+    Remote symlinks are mirrored as symlinks.
+    - skip_unchanged: files whose size and mtime match the local copy are not downloaded
+      (the remote mtime is copied after each download, so re-collecting only fetches new files).
+    - progress(stats): called from the thread running mirror_tree (safe for Streamlit)
+      every ~0.5 s and at the end, with the seen/files/skipped/bytes counters.
+    Returns the final counters and "errors": [(remote_path, exception)].
+    """
+    work = queue.Queue()
+    lock = threading.Lock()
+    done = threading.Event()
+    stats = {"pending": 0, "seen": 0, "files": 0, "skipped": 0, "bytes": 0}
+    errors = []
+
+    def _push(item):
+        with lock:
+            stats["pending"] += 1
+        work.put(item)
+
+    def _task_done():
+        with lock:
+            stats["pending"] -= 1
+            if stats["pending"] == 0:
+                done.set()
+
+    def _handle(client, kind, rpath, lpath, attr):
+        if kind == "dir":
+            os.makedirs(lpath, exist_ok=True)
+            for entry in client.listdir_attr(rpath):
+                child_r = rpath.rstrip("/") + "/" + entry.filename
+                child_l = os.path.join(lpath, entry.filename)
+                if stat.S_ISDIR(entry.st_mode):
+                    _push(("dir", child_r, child_l, entry))
+                else:
+                    with lock:
+                        stats["seen"] += 1
+                    kind = "link" if stat.S_ISLNK(entry.st_mode) else "file"
+                    _push((kind, child_r, child_l, entry))
+            return
+        if kind == "link":
+            # listdir_attr returns lstat attributes: a symlink is mirrored as a symlink
+            # (e.g. Mw_*/bob.rc -> ../viscai_shared/bob.rc) instead of downloading the target each time
+            target = client.readlink(rpath)
+            if os.path.islink(lpath) and os.readlink(lpath) == target:
+                with lock:
+                    stats["skipped"] += 1
+                return
+            if not posixpath.isabs(target):
+                try:
+                    if os.path.lexists(lpath):
+                        os.remove(lpath)
+                    os.symlink(target, lpath)
+                    with lock:
+                        stats["files"] += 1
+                    return
+                except OSError:
+                    pass  # no symlink support locally: copy the target below
+            # Absolute link (may point outside the tree) or no local symlinks: compare the target
+            attr = client.stat(rpath)
+            if stat.S_ISDIR(attr.st_mode):
+                return
+            if os.path.islink(lpath):
+                os.remove(lpath)
+        if skip_unchanged and _unchanged(lpath, attr):
+            with lock:
+                stats["skipped"] += 1
+            return
+        client.get(rpath, lpath)
+        if attr.st_mtime is not None:
+            os.utime(lpath, (attr.st_atime or attr.st_mtime, attr.st_mtime))
+        with lock:
+            stats["files"] += 1
+            stats["bytes"] += attr.st_size or 0
+
+    def _worker():
+        try:
+            client = ssh.open_sftp()
+        except Exception as e:
+            client = None
+            with lock:
+                errors.append(("<sftp>", e))
+        try:
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                try:
+                    if client is None:
+                        raise RuntimeError("SFTP session unavailable")
+                    _handle(client, *item)
+                except Exception as e:
+                    with lock:
+                        errors.append((item[1], e))
+                finally:
+                    _task_done()
+        finally:
+            if client is not None:
+                client.close()
+
+    roots = list(roots)
+    if not roots:
+        stats.pop("pending")
+        return {**stats, "errors": errors}
+    for remote_dir, local_dir in roots:
+        _push(("dir", remote_dir, local_dir, None))
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(max(1, int(sessions or 1)))]
+    for t in threads:
+        t.start()
+    while not done.wait(0.5):
+        if progress:
+            progress(dict(stats))
+    for _ in threads:
+        work.put(None)
+    for t in threads:
+        t.join()
+    stats.pop("pending")
+    result = {**stats, "errors": errors}
+    if progress:
+        progress(dict(stats))
+    return result
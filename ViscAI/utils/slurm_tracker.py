@@ -0,0 +1,292 @@
+# utils/slurm_tracker.py
+"""
+Seguimiento de los jobs SLURM lanzados por full_send.sh sin bloquear el hilo de Streamlit.
+
+Un hilo en segundo plano consulta el servidor con UNA sola orden remota por ciclo (jobs.txt +
+squeue + sacct para todos los jobids) con backoff exponencial: el intervalo se duplica mientras
+nada cambia y vuelve al mínimo cuando algún job cambia de estado. El estado por job/subdirectorio
+(pending/running/completed/failed) se guarda en un JSON local que la GUI puede leer en cualquier
+rerun (load_job_state) o consultar en el tracker vivo (get_tracker).
+Si squeue o sacct fallan (slurmctld/slurmdbd caídos), los jobs afectados conservan su estado
+anterior y el ciclo cuenta como error (backoff): un job solo se da por terminado cuando squeue
+ha respondido y ya no lo lista.
+"""
+import json
+import os
+import re
+import shlex
+import threading
+import time
+
+from ViscAI.utils.ssh_connection import connect_remote_server
+
+JOB_STATE_FILENAME = "slurm_jobs.json"
+
+_PENDING = {"PENDING", "CONFIGURING", "REQUEUED", "REQUEUE_HOLD", "REQUEUE_FED", "RESV_DEL_HOLD",
+            "SUSPENDED", "STOPPED", "SIGNALING", "RESIZING"}
+_RUNNING = {"RUNNING", "COMPLETING", "STAGE_OUT"}
+_COMPLETED = {"COMPLETED"}
+TERMINAL = ("completed", "failed")
+# "<jobid>" o, para tareas de un job array, "<jobid>_<task>"
+_JOBID = re.compile(r"\d+(_\d+)?")
+# Fallos seguidos de sacct (con squeue respondiendo) tras los que se asume que el clúster no tiene
+# contabilidad y los jobs fuera de squeue se dan por terminados, como antes de usar sacct
+SACCT_FALLBACK_FAILURES = 5
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def _classify(slurm_state: str) -> str:
+    base = slurm_state.split()[0].rstrip("+") if slurm_state else ""
+    if base in _PENDING:
+        return "pending"
+    if base in _RUNNING:
+        return "running"
+    if base in _COMPLETED:
+        return "completed"
+    return "failed"
+
+
+def _status_command(working_directory: str, extra_ids) -> str:
+    """jobs.txt, squeue y sacct en una sola ejecución remota, separados por marcadores."""
+    extra = ",".join(extra_ids)
+    return (
+        f"cd {shlex.quote(working_directory)} 2>/dev/null; "
+        "echo @@JOBS; cat jobs.txt 2>/dev/null; "
+        f"J=$( (awk '{{print $1}}' jobs.txt 2>/dev/null; echo {shlex.quote(extra)} | tr ',' '\\n') "
+        "| grep -E '^[0-9]+' | sed 's/_.*//' | sort -u | paste -sd, -); "
+        "echo @@SQUEUE; if [ -n \"$J\" ]; then squeue -h -r -o '%i %T' -j \"$J\" 2>&1; "
+        "echo \"@@RC $?\"; fi; "
+        "echo @@SACCT; if [ -n \"$J\" ]; then sacct -n -X -P -o JobID,State -j \"$J\" 2>/dev/null; "
+        "echo \"@@RC $?\"; fi; "
+        "echo @@END"
+    )
+
+
+def _split_sections(text: str) -> dict:
+    """{sección: [líneas]}; "@@RC <n>" guarda el código de salida de la sección en "<sección>_RC"."""
+    sections, current = {}, None
+    for line in text.splitlines():
+        if line.startswith("@@RC"):
+            if current:
+                sections[f"{current}_RC"] = line[4:].strip()
+        elif line.startswith("@@"):
+            current = line[2:].strip()
+            sections[current] = []
+        elif current and line.strip():
+            sections[current].append(line.strip())
+    return sections
+
+
+def load_job_state(state_path: str) -> dict:
+    """Último estado persistido (o {} si aún no existe)."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def summarize(state: dict) -> dict:
+    """Número de jobs por estado: {"pending": n, "running": n, "completed": n, "failed": n}."""
+    counts = {"pending": 0, "running": 0, "completed": 0, "failed": 0}
+    for job in state.get("jobs", {}).values():
+        counts[job["state"]] = counts.get(job["state"], 0) + 1
+    return counts
+
+
+class SlurmJobTracker:
+    """
+    Sigue los jobs listados en <working_directory>/jobs.txt (una línea "<jobid>[_<task>] <subdir>") y,
+    opcionalmente, el propio job de full_send.sh (`submitter_jobid`), que debe terminar para
+    considerar completo el envío. on_done(state) se llama desde el hilo del tracker al terminar
+    (todos los jobs en completed/failed) o al agotar `max_wait_secs`: no debe usar `st.*`; lo que
+    devuelva (serializable a JSON) se guarda en state["on_done_result"].
+    """
+
+    def __init__(self, name_server, name_user, ssh_key_options, working_directory, state_path,
+                 submitter_jobid=None, min_interval=5.0, max_interval=300.0, backoff=2.0,
+                 max_wait_secs=None, on_done=None):
+        self.name_server = name_server
+        self.name_user = name_user
+        self.ssh_key_options = ssh_key_options
+        self.working_directory = working_directory
+        self.state_path = state_path
+        self.submitter_jobid = str(submitter_jobid) if submitter_jobid else None
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max(max_interval, min_interval))
+        self.backoff = float(backoff)
+        self.max_wait_secs = max_wait_secs
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+        self._sacct_failures = 0
+        self._state = {
+            "working_directory": working_directory,
+            "submitter_jobid": self.submitter_jobid,
+            "jobs": {},
+            "started_at": time.time(),
+            "updated_at": None,
+            "next_poll_in": self.min_interval,
+            "done": False,
+            "timed_out": False,
+            "error": None,
+            "on_done_result": None,
+        }
+
+    # ----------------------------------------------------------------------------------------
+    def state(self) -> dict:
+        """Copia del estado actual (seguro desde cualquier hilo)."""
+        with self._lock:
+            return json.loads(json.dumps(self._state))
+
+    def poll_once(self) -> bool:
+        """Una consulta al servidor; devuelve True si algún job ha cambiado de estado."""
+        extra = [self.submitter_jobid] if self.submitter_jobid else []
+        ssh = connect_remote_server(self.name_server, self.name_user, self.ssh_key_options)
+        stdin, stdout, stderr = ssh.exec_command(_status_command(self.working_directory, extra))
+        stdin.close()
+        sections = _split_sections(stdout.read().decode("utf-8", errors="ignore"))
+        if "END" not in sections:
+            raise RuntimeError(stderr.read().decode("utf-8", errors="ignore").strip() or "incomplete status output")
+
+        subdirs = {}
+        for line in sections.get("JOBS", []):
+            toks = line.split(None, 1)
+            if toks and _JOBID.fullmatch(toks[0]):
+                subdir = toks[1].rstrip("/") if len(toks) > 1 else ""
+                # Modo empaquetado: varios subdirectorios comparten la misma tarea
+                subdirs[toks[0]] = f"{subdirs[toks[0]]},{subdir}" if subdirs.get(toks[0]) else subdir
+        if self.submitter_jobid:
+            subdirs.setdefault(self.submitter_jobid, "full_send.sh")
+        # Sin jobids no se ejecuta ninguna consulta ("_RC" ausente): no hay nada que fallar
+        # Si ya no queda ninguno de los jobids en slurmctld, squeue sale con error "Invalid job id"
+        squeue_ok = sections.get("SQUEUE_RC", "0") == "0" or any(
+            "invalid job id" in line.lower() for line in sections.get("SQUEUE", []))
+        sacct_ok = sections.get("SACCT_RC", "0") == "0"
+        if not squeue_ok:
+            # Sin squeue no se puede distinguir "terminado" de "consulta fallida": nada cambia
+            raise RuntimeError(f"squeue failed (rc={sections['SQUEUE_RC']}); job states kept")
+        self._sacct_failures = 0 if sacct_ok else self._sacct_failures + 1
+        infer_completed = sacct_ok or self._sacct_failures >= SACCT_FALLBACK_FAILURES
+        queued = {}
+        for line in sections.get("SQUEUE", []):
+            toks = line.split(None, 1)
+            # stderr de squeue va en la misma sección: solo cuentan las líneas "<jobid> <estado>"
+            if len(toks) == 2 and _JOBID.fullmatch(toks[0]):
+                queued[toks[0]] = toks[1]
+        accounted = {}
+        for line in sections.get("SACCT", []):
+            toks = line.split("|")
+            if len(toks) >= 2 and _JOBID.fullmatch(toks[0]):
+                accounted[toks[0]] = toks[1]
+
+        changed = False
+        now = time.time()
+        with self._lock:
+            jobs = self._state["jobs"]
+            for jobid, subdir in subdirs.items():
+                slurm_state = queued.get(jobid) or accounted.get(jobid)
+                if slurm_state is None:
+                    if not infer_completed:
+                        # sacct ha fallado: se conserva el estado anterior hasta poder confirmarlo
+                        continue
+                    # squeue ya no lo lista y sacct no lo conoce: como antes, se da por terminado
+                    slurm_state = "COMPLETED"
+                new = _classify(slurm_state)
+                old = jobs.get(jobid)
+                if old is None or old["state"] != new:
+                    changed = True
+                    jobs[jobid] = {"subdir": subdir, "state": new, "slurm_state": slurm_state, "since": now}
+                else:
+                    old["slurm_state"] = slurm_state
+            self._state["updated_at"] = now
+            submitter = jobs.get(self.submitter_jobid) if self.submitter_jobid else None
+            submitting = submitter is not None and submitter["state"] not in TERMINAL
+            self._state["done"] = bool(jobs) and not submitting and all(
+                j["state"] in TERMINAL for j in jobs.values()) and all(j in jobs for j in subdirs)
+        if not infer_completed:
+            raise RuntimeError(f"sacct failed (rc={sections['SACCT_RC']}); finished jobs not confirmed yet")
+        return changed
+
+    def _persist(self):
+        if not self.state_path:
+            return
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state(), f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def _run(self):
+        interval = self.min_interval
+        try:
+            while not self._stop.is_set():
+                try:
+                    changed = self.poll_once()
+                    with self._lock:
+                        self._state["error"] = None
+                    interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+                except Exception as e:
+                    with self._lock:
+                        self._state["error"] = str(e)
+                    interval = min(interval * self.backoff, self.max_interval)
+                with self._lock:
+                    done = self._state["done"]
+                    elapsed = time.time() - self._state["started_at"]
+                    if not done and self.max_wait_secs and elapsed >= self.max_wait_secs:
+                        self._state["timed_out"] = True
+                    timed_out = self._state["timed_out"]
+                    self._state["next_poll_in"] = None if (done or timed_out) else interval
+                self._persist()
+                if done or timed_out:
+                    break
+                self._stop.wait(interval)
+            if self.on_done and not self._stop.is_set():
+                try:
+                    result = self.on_done(self.state())
+                    with self._lock:
+                        self._state["on_done_result"] = result
+                except Exception as e:
+                    with self._lock:
+                        self._state["error"] = f"on_done: {e}"
+                self._persist()
+        finally:
+            self._finished.set()
+
+    # ----------------------------------------------------------------------------------------
+    def start(self):
+        if self._thread is None:
+            self._persist()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="slurm-tracker")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout=None) -> bool:
+        """Bloquea hasta que el tracker termina (incluido on_done); True si terminó."""
+        return self._finished.wait(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+
+def start_tracker(name_server, name_user, ssh_key_options, working_directory, state_path, **kwargs):
+    """Crea y arranca un tracker para `working_directory`, deteniendo el anterior si lo hubiera."""
+    tracker = SlurmJobTracker(name_server, name_user, ssh_key_options, working_directory, state_path, **kwargs)
+    with _trackers_lock:
+        previous = _trackers.get(working_directory)
+        _trackers[working_directory] = tracker
+    if previous is not None:
+        previous.stop()
+    return tracker.start()
+
+
+def get_tracker(working_directory):
+    """Tracker vivo o terminado de `working_directory` en este proceso (None si no hay)."""
+    with _trackers_lock:
+        return _trackers.get(working_directory)
@@ -1,9 +1,129 @@
+import atexit
+import threading
+
 import paramiko
 
+# Conexiones SSH compartidas por todo el proceso, una por (servidor, usuario, clave).
+# Cada helper pide su cliente con connect_remote_server() y los canales SFTP / exec se
+# multiplexan sobre el mismo transporte: un RUN ya no repite decenas de handshakes.
+KEEPALIVE_SECS = 30
+# Límite del handshake (TCP + banner SSH): un servidor inalcanzable no bloquea indefinidamente
+CONNECT_TIMEOUT_SECS = 30
+_RECONNECT_ERRORS = (paramiko.SSHException, EOFError, OSError)
 
-def connect_remote_server(name_server, username, ssh_key_options):
+_pool = {}
+# _pool_lock solo protege los diccionarios; el handshake se hace fuera, con el lock de su clave
+_pool_lock = threading.Lock()
+_key_locks = {}
+
+
+def _open_client(name_server, username, ssh_key_options):
     # SSH connection
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(name_server, username=username, key_filename=ssh_key_options)
+    ssh.connect(name_server, username=username, key_filename=ssh_key_options,
+                timeout=CONNECT_TIMEOUT_SECS, banner_timeout=CONNECT_TIMEOUT_SECS)
+    ssh.get_transport().set_keepalive(KEEPALIVE_SECS)
     return ssh
+
+
+def _is_active(ssh):
+    transport = ssh.get_transport() if ssh else None
+    return bool(transport and transport.is_active())
+
+
+class PooledSSHClient:
+    """
+    Vista de un SSHClient compartido. close() solo libera la vista (la conexión sigue en el pool);
+    antes de cada llamada se reconecta si el transporte ya estaba caído (_acquire).
+    Si falla DURANTE la llamada, open_sftp() se reintenta una vez; exec_command() solo si
+    idempotent=True, porque la orden puede haber llegado al servidor (sbatch, rm -rf: idempotent=False).
+    El resto de atributos se delegan en el paramiko.SSHClient subyacente.
+    """
+
+    def __init__(self, key):
+        self._key = key
+
+    def _client(self):
+        return _acquire(self._key)
+
+    def _retry(self, method, *args, **kwargs):
+        try:
+            return getattr(self._client(), method)(*args, **kwargs)
+        except _RECONNECT_ERRORS:
+            _discard(self._key)
+            return getattr(self._client(), method)(*args, **kwargs)
+
+    def open_sftp(self):
+        return self._retry("open_sftp")
+
+    def exec_command(self, command, *args, idempotent=True, **kwargs):
+        if idempotent:
+            return self._retry("exec_command", command, *args, **kwargs)
+        try:
+            return self._client().exec_command(command, *args, **kwargs)
+        except _RECONNECT_ERRORS:
+            # No se reenvía: se descarta la conexión para que la siguiente llamada reconecte
+            _discard(self._key)
+            raise
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._client(), name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _acquire(key):
+    with _pool_lock:
+        ssh = _pool.get(key)
+        if _is_active(ssh):
+            return ssh
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    # Un solo handshake por clave a la vez; otras claves (y los clientes ya activos) no esperan
+    with key_lock:
+        with _pool_lock:
+            ssh = _pool.get(key)
+        if _is_active(ssh):
+            return ssh
+        if ssh is not None:
+            ssh.close()
+        ssh = _open_client(*key)
+        with _pool_lock:
+            _pool[key] = ssh
+        return ssh
+
+
+def _discard(key):
+    with _pool_lock:
+        ssh = _pool.pop(key, None)
+    if ssh is not None:
+        ssh.close()
+
+
+def connect_remote_server(name_server, username, ssh_key_options):
+    """Cliente SSH del pool para (servidor, usuario, clave); se conecta (o reconecta) si hace falta."""
+    key = (name_server, username, ssh_key_options)
+    _acquire(key)
+    return PooledSSHClient(key)
+
+
+def close_all_connections():
+    """Cierra todas las conexiones del pool (se llama también al salir del proceso)."""
+    with _pool_lock:
+        clients = list(_pool.values())
+        _pool.clear()
+    for ssh in clients:
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_all_connections)
@@ -3,14 +3,17 @@
 # Versión actualizada: correcciones SBATCH nodes/ntasks y evitar '-c polyconf.dat' indeseado.
 # ****************************CAMBIO*************
 
+import math
 import os
 import stat
+import shlex
 import tempfile
 from typing import List, Tuple, Optional
 
 import streamlit as st
 
 from ViscAI.utils.ssh_connection import connect_remote_server
+from ViscAI.utils.runtime_model import TIMING_FILENAME, grid_point_features, input_features, slurm_time
 
 # ---------------------------
 # Helpers internos
@@ -59,6 +62,10 @@ def _find_dat_in_remote_dir(sftp, remote_dir: str, base_name: Optional[str] = No
         files = sftp.listdir(remote_dir)
     except Exception:
         return None
+    return _pick_dat(files, base_name)
+
+def _pick_dat(files: List[str], base_name: Optional[str] = None) -> Optional[str]:
+    """Misma preferencia que _find_dat_in_remote_dir sobre una lista de nombres ya obtenida."""
     dats = [f for f in files if f.lower().endswith(".dat")]
     if not dats:
         return None
@@ -73,6 +80,37 @@ def _find_dat_in_remote_dir(sftp, remote_dir: str, base_name: Optional[str] = No
                 return d
     return dats[0]
 
+def _resolve_slurm_resources(partition, nodes, cpus_per_task, mem_per_cpu_mb):
+    """Prioridad: argumentos explícitos > session_state > valores por defecto."""
+    if partition is None:
+        partition = st.session_state.get("slurm_partition", "")
+    if nodes is None:
+        try:
+            nodes = int(st.session_state.get("slurm_nodes", 1))
+        except Exception:
+            nodes = 1
+    if cpus_per_task is None:
+        try:
+            cpus_per_task = int(st.session_state.get("slurm_cpus_per_task", 1))
+        except Exception:
+            cpus_per_task = 1
+    if mem_per_cpu_mb is None:
+        try:
+            mem_raw = st.session_state.get("slurm_mem_per_cpu", 2048)
+            if isinstance(mem_raw, str):
+                # admite formatos tipo '2048M' o '2G'
+                if mem_raw.upper().endswith("M"):
+                    mem_per_cpu_mb = int(mem_raw[:-1])
+                elif mem_raw.upper().endswith("G"):
+                    mem_per_cpu_mb = int(float(mem_raw[:-1]) * 1024)
+                else:
+                    mem_per_cpu_mb = int(mem_raw)
+            else:
+                mem_per_cpu_mb = int(mem_raw)
+        except Exception:
+            mem_per_cpu_mb = 2048
+    return partition, nodes, cpus_per_task, mem_per_cpu_mb
+
 # ****************************CAMBIO*************
 # Función pública exportada: ahora crea slurm.sh únicamente en subdirs combinados (D & PDI)
 def _slurm_submit_multiple_mw(
@@ -88,11 +126,15 @@ def _slurm_submit_multiple_mw(
     nodes: Optional[int] = None,
     cpus_per_task: Optional[int] = None,
     mem_per_cpu_mb: Optional[int] = None,
-    job_name_prefix: str = "BoBjob"
+    job_name_prefix: str = "BoBjob",
+    runtime_model=None
 ) -> List[Tuple[str, str, str]]:
     """
     Crea (y opcionalmente encola) scripts SLURM 'slurm.sh' solo en subdirectorios
     del tipo 'Mw_<...>__D<...>__PDI_<...>' ya existentes en working_dir.
+    Escribe además working_dir/run_order.txt (de más a menos costoso) para que full_send.sh
+    encole primero las simulaciones largas; con un runtime_model ajustado cada slurm.sh lleva
+    '--time' (y memoria) dimensionados a partir de la predicción.
     """
     results: List[Tuple[str, str, str]] = []
 
@@ -106,36 +148,8 @@ def _slurm_submit_multiple_mw(
     batch_flag = "-b" if st.session_state.get("batch_mode", False) else ""
     genpoly_flag = "-p" if st.session_state.get("generate_polymers", False) else ""
 
-    # ****************************CAMBIO*************
-    # Prioridad: argumentos explícitos > session_state > valores por defecto
-    if partition is None:
-        partition = st.session_state.get("slurm_partition", "")
-    if nodes is None:
-        try:
-            nodes = int(st.session_state.get("slurm_nodes", 1))
-        except Exception:
-            nodes = 1
-    if cpus_per_task is None:
-        try:
-            cpus_per_task = int(st.session_state.get("slurm_cpus_per_task", 1))
-        except Exception:
-            cpus_per_task = 1
-    if mem_per_cpu_mb is None:
-        try:
-            mem_raw = st.session_state.get("slurm_mem_per_cpu", 2048)
-            if isinstance(mem_raw, str):
-                # admite formatos tipo '2048M' o '2G'
-                if mem_raw.upper().endswith("M"):
-                    mem_per_cpu_mb = int(mem_raw[:-1])
-                elif mem_raw.upper().endswith("G"):
-                    mem_per_cpu_mb = int(float(mem_raw[:-1]) * 1024)
-                else:
-                    mem_per_cpu_mb = int(mem_raw)
-            else:
-                mem_per_cpu_mb = int(mem_raw)
-        except Exception:
-            mem_per_cpu_mb = 2048
-    # ****************************CAMBIO*************
+    partition, nodes, cpus_per_task, mem_per_cpu_mb = _resolve_slurm_resources(
+        partition, nodes, cpus_per_task, mem_per_cpu_mb)
 
     # connect to server
     try:
@@ -164,6 +178,12 @@ def _slurm_submit_multiple_mw(
             combo_subdirs = [d for d in combo_subdirs if any(d.startswith(prefix) for prefix in mw_prefixes)]
         # ****************************CAMBIO*************
 
+        # NUEVO CAMBIO: coste estimado por subdirectorio -> orden de envío (más costosos primero)
+        predictions = _runtime_predictions(combo_subdirs, input_file, runtime_model)
+        combo_subdirs.sort(key=lambda d: -predictions[d][0])
+        _write_remote_file(sftp, os.path.join(working_dir, RUN_ORDER_NAME),
+                           "".join(f"{d}/\n" for d in combo_subdirs), mode=0o640)
+
         for sd in combo_subdirs:
             remote_subdir = os.path.join(working_dir, sd)
             sd_name = sd  # nombre del subdir: incluye D and PDI
@@ -216,14 +236,18 @@ def _slurm_submit_multiple_mw(
             # ****************************CAMBIO*************
             # Contenido del script: siguiendo tus requisitos
             # - Incluir los #SBATCH con valores nodes / ntasks tomados de arriba
-            # - NO incluir '#SBATCH --time'
+            # - '#SBATCH --time' solo si hay un modelo de coste ajustado (ver _sizing_lines)
             # - NO redirigir la ejecución a un .log (dejamos SLURM manejar stdout/stderr)
+            # - viscai_timing.txt ("inicio fin rc") alimenta el modelo de coste
+            time_line, job_mem_per_cpu_mb = _sizing_lines(*predictions[sd], cpus_per_task, mem_per_cpu_mb,
+                                                          runtime_model)
             script_lines = [
                 "#!/bin/bash",
                 f"#SBATCH --partition={partition}" if partition else "#SBATCH --partition=",
                 f"#SBATCH -N {nodes}",
                 f"#SBATCH -n {cpus_per_task}",
-                f"#SBATCH --mem-per-cpu={mem_per_cpu_mb}M",
+                f"#SBATCH --mem-per-cpu={job_mem_per_cpu_mb}M",
+                *([time_line] if time_line else []),
                 f"#SBATCH --job-name={job_basename}\n",
                 "echo \"Job ${SLURM_JOB_ID} started: `date`\"\n",
                 "WK=`pwd`\n",
@@ -232,7 +256,10 @@ def _slurm_submit_multiple_mw(
                 "# BoB remote fullpath",
                 f"BOBEXE={bob_remote_fullpath}\n",
                 "# BoB execution",
-                f"{bob_cmd}\n",
+                "START=$(date +%s)",
+                bob_cmd,
+                "RC=$?",
+                f"echo \"${{START}} $(date +%s) ${{RC}}\" > {TIMING_FILENAME}\n",
                 "echo \"Job ${SLURM_JOB_ID} ended: `date`\"\n",
                 "echo \"Job Done\""
             ]
@@ -249,7 +276,8 @@ def _slurm_submit_multiple_mw(
             # si se pidió submit, hacemos sbatch
             if submit:
                 try:
-                    stdin, stdout, stderr = ssh.exec_command(f"cd {remote_subdir} && sbatch {os.path.basename(remote_script_path)}")
+                    stdin, stdout, stderr = ssh.exec_command(f"cd {remote_subdir} && sbatch {os.path.basename(remote_script_path)}",
+                                                             idempotent=False)
                     rc = stdout.channel.recv_exit_status()
                     out = stdout.read().decode().strip()
                     err = stderr.read().decode().strip()
@@ -275,4 +303,320 @@ def _slurm_submit_multiple_mw(
     return results
 # ****************************CAMBIO*************
 
+# ****************************CAMBIO*************
+# Modo job array: un único slurm_array.sh + manifiesto para toda la rejilla
+ARRAY_SCRIPT_NAME = "slurm_array.sh"
+ARRAY_MANIFEST_NAME = "slurm_array_manifest.txt"
+
+# Estimación heurística del tiempo de una simulación BoB: base * (Mw / ref) ** exponente
+# (modificable con slurm_pack_base_secs / slurm_pack_ref_mw / slurm_pack_mw_exponent)
+PACK_BASE_SECS = 30.0
+PACK_REF_MW = 1.0e5
+PACK_MW_EXPONENT = 1.0
+
+# Orden de envío para full_send.sh y márgenes sobre las predicciones del modelo de coste
+RUN_ORDER_NAME = "run_order.txt"
+TIME_SAFETY = 3.0
+MEM_SAFETY = 1.5
+
+
+def _list_combo_files(ssh, working_dir: str) -> dict:
+    """{subdir: [ficheros]} de todos los Mw_*__D*__PDI_* con una sola orden remota."""
+    stdin, stdout, stderr = ssh.exec_command(
+        f"cd {shlex.quote(working_dir)} && "
+        "find . -mindepth 2 -maxdepth 2 -path './Mw_*__D*__PDI*/*' ! -type d -printf '%h/%f\\n'"
+    )
+    stdin.close()
+    combos = {}
+    for line in stdout.read().decode("utf-8", errors="ignore").splitlines():
+        parts = line.strip().split("/")
+        if len(parts) == 3 and parts[0] == ".":
+            combos.setdefault(parts[1], []).append(parts[2])
+    return combos
+
+
+def _mw_from_subdir(subdir: str) -> Optional[float]:
+    """'Mw_10000_0__D1__PDI_1_5' -> 10000.0 (None si no se puede interpretar)."""
+    token = subdir.split("__", 1)[0][len("Mw_"):]
+    try:
+        return float(token.replace("_", "."))
+    except ValueError:
+        return None
+
+
+def estimate_bob_runtime(mw: Optional[float]) -> float:
+    """Segundos estimados de una simulación BoB para un Mw dado."""
+    base = float(st.session_state.get("slurm_pack_base_secs", PACK_BASE_SECS))
+    if not mw or mw <= 0:
+        return base
+    ref = float(st.session_state.get("slurm_pack_ref_mw", PACK_REF_MW))
+    exponent = float(st.session_state.get("slurm_pack_mw_exponent", PACK_MW_EXPONENT))
+    return base * (mw / ref) ** exponent
+
+
+def _runtime_predictions(subdirs, input_file: Optional[str], runtime_model=None) -> dict:
+    """{subdir: (segundos, MB o None)}: runtime_model si está ajustado; si no, estimate_bob_runtime()."""
+    base = input_features(input_file) if input_file else {}
+    fitted = runtime_model is not None and runtime_model.fitted
+    predictions = {}
+    for sd in subdirs:
+        secs = mem_mb = None
+        if fitted:
+            feats = grid_point_features(sd, base)
+            secs = runtime_model.predict(feats)
+            mem_mb = runtime_model.predict_mem_mb(feats)
+        predictions[sd] = (secs if secs is not None else estimate_bob_runtime(_mw_from_subdir(sd)), mem_mb)
+    return predictions
+
+
+def _sizing_lines(wall_secs: float, mem_mb: Optional[float], cpus: int, mem_per_cpu_mb: int,
+                  runtime_model=None) -> Tuple[Optional[str], int]:
+    """
+    ('#SBATCH --time=...' o None, mem-per-cpu en MB). Solo con un runtime_model ajustado (la heurística
+    no es fiable como límite duro): --time = wall_secs * slurm_time_safety (3 por defecto) y
+    mem-per-cpu se eleva si mem_mb * MEM_SAFETY no cabe en `cpus` CPUs.
+    """
+    if runtime_model is None or not runtime_model.fitted:
+        return None, mem_per_cpu_mb
+    safety = float(st.session_state.get("slurm_time_safety", TIME_SAFETY))
+    if mem_mb:
+        mem_per_cpu_mb = max(int(mem_per_cpu_mb), int(math.ceil(mem_mb * MEM_SAFETY / max(1, int(cpus)))))
+    return f"#SBATCH --time={slurm_time(wall_secs, safety)}", mem_per_cpu_mb
+
+
+def _pack_groups(runtimes: List[float], cpus: int, target_secs: float) -> List[List[int]]:
+    """
+    Agrupa índices (de más a menos costosos) hasta llenar target_secs * cpus segundos estimados por
+    grupo: los Mw grandes quedan en grupos pequeños y los pequeños se empaquetan por decenas.
+    """
+    budget = max(1.0, float(target_secs)) * max(1, int(cpus))
+    groups: List[List[int]] = []
+    current: List[int] = []
+    acc = 0.0
+    for i in sorted(range(len(runtimes)), key=lambda i: -runtimes[i]):
+        if current and acc + runtimes[i] > budget:
+            groups.append(current)
+            current, acc = [], 0.0
+        current.append(i)
+        acc += runtimes[i]
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _packed_script_lines(partition, cpus, mem_per_cpu_mb, job_name_prefix, n_groups, throttle,
+                         working_dir, remote_manifest, bob_remote_fullpath, flags,
+                         time_line=None) -> List[str]:
+    """slurm_array.sh del modo empaquetado: bucle de trabajo con hasta NPROC BoB concurrentes."""
+    return [
+        "#!/bin/bash",
+        f"#SBATCH --partition={partition}" if partition else "#SBATCH --partition=",
+        "#SBATCH -N 1",
+        "#SBATCH -n 1",
+        f"#SBATCH -c {cpus}",
+        f"#SBATCH --mem-per-cpu={mem_per_cpu_mb}M",
+        *([time_line] if time_line else []),
+        f"#SBATCH --job-name={job_name_prefix}_packed",
+        f"#SBATCH --array=1-{n_groups}{throttle}\n",
+        "# BoB remote fullpath",
+        f"BOBEXE={bob_remote_fullpath}\n",
+        f"WD={shlex.quote(working_dir)}",
+        "NPROC=${SLURM_CPUS_PER_TASK:-1}",
+        "FAILED=0\n",
+        "run_one() {",
+        "    cd \"${WD}/$1\" || return 1",
+        "    local ARGS=(-i \"$2\")",
+        "    [ \"$3\" != \"-\" ] && ARGS+=(-c \"$3\")",
+        "    echo \"$1 started: `date`\"",
+        "    local start=$(date +%s)",
+        f"    \"${{BOBEXE}}\" \"${{ARGS[@]}}\" {flags} > bob_task.out 2>&1 < /dev/null".replace("  >", " >"),
+        "    local rc=$?",
+        f"    echo \"${{start}} $(date +%s) ${{rc}}\" > {TIMING_FILENAME}",
+        "    echo \"$1 ended (rc=${rc}): `date`\"",
+        "    return ${rc}",
+        "}\n",
+        "echo \"Job ${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID} started: `date`\"\n",
+        "# Group SLURM_ARRAY_TASK_ID of the manifest, at most NPROC simulations at a time",
+        "while IFS=$'\\t' read -r GROUP SUBDIR DAT POLY; do",
+        "    [ \"${GROUP}\" = \"${SLURM_ARRAY_TASK_ID}\" ] || continue",
+        "    while [ \"$(jobs -rp | wc -l)\" -ge \"${NPROC}\" ]; do wait -n || FAILED=1; done",
+        "    run_one \"${SUBDIR}\" \"${DAT}\" \"${POLY}\" &",
+        f"done < {shlex.quote(remote_manifest)}",
+        "for pid in $(jobs -p); do wait \"${pid}\" || FAILED=1; done\n",
+        "echo \"Job ${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID} ended: `date`\"",
+        "exit ${FAILED}"
+    ]
+
+
+def _slurm_submit_array(
+    name_server: str,
+    name_user: str,
+    ssh_key_options: str,
+    working_dir: str,
+    mw_list: List[float],
+    input_file: Optional[str] = None,
+    polymer_file: Optional[str] = None,
+    submit: bool = True,
+    max_concurrent: Optional[int] = None,
+    pack: bool = False,
+    target_job_secs: Optional[float] = None,
+    partition: Optional[str] = None,
+    nodes: Optional[int] = None,
+    cpus_per_task: Optional[int] = None,
+    mem_per_cpu_mb: Optional[int] = None,
+    job_name_prefix: str = "BoBjob",
+    runtime_model=None
+) -> List[Tuple[str, str, str]]:
+    """
+    Alternativa a _slurm_submit_multiple_mw + full_send.sh: escribe en working_dir un manifiesto
+    (una línea 'subdir<TAB>input.dat<TAB>polymer|-' por tarea) y un único 'slurm_array.sh' con
+    '#SBATCH --array=1-N%max_concurrent'; cada tarea lee su línea con SLURM_ARRAY_TASK_ID.
+    Con submit=True se encola con un solo sbatch y se escribe jobs.txt ('<jobid>_<task> <subdir>').
+    pack=True: cada tarea del array ejecuta un GRUPO de subdirectorios (columna extra 'grupo' en el
+    manifiesto) en una sola asignación de `cpus_per_task` CPUs, con hasta ese número de BoB a la vez.
+    El tamaño de cada grupo sale de estimate_bob_runtime() para llenar ~target_job_secs por job.
+    Las tareas se ordenan de más a menos costosas (runtime_model si está ajustado; si no, la
+    heurística) y, con modelo, '--time' / memoria se dimensionan para la tarea más larga.
+    """
+    results: List[Tuple[str, str, str]] = []
+
+    bob_remote_fullpath = st.session_state.get("bob_remote_fullpath")
+    if not bob_remote_fullpath:
+        results.append(("GLOBAL", "ERROR", "BoB executable path not set"))
+        return results
+
+    batch_flag = "-b" if st.session_state.get("batch_mode", False) else ""
+    genpoly_flag = "-p" if st.session_state.get("generate_polymers", False) else ""
+    partition, nodes, cpus_per_task, mem_per_cpu_mb = _resolve_slurm_resources(
+        partition, nodes, cpus_per_task, mem_per_cpu_mb)
+    if max_concurrent is None:
+        try:
+            max_concurrent = int(st.session_state.get("slurm_array_max_concurrent", 60))
+        except Exception:
+            max_concurrent = 60
+
+    try:
+        ssh = connect_remote_server(name_server, name_user, ssh_key_options)
+        sftp = ssh.open_sftp()
+    except Exception as e:
+        results.append(("GLOBAL", "ERROR", f"SSH connect failed: {e}"))
+        return results
+
+    try:
+        combos = _list_combo_files(ssh, working_dir)
+        if mw_list:
+            mw_prefixes = set(f"Mw_{str(mw).replace('.', '_')}" for mw in mw_list)
+            combos = {d: f for d, f in combos.items() if any(d.startswith(prefix) for prefix in mw_prefixes)}
+
+        base_input_name = os.path.splitext(os.path.basename(input_file or ""))[0] if input_file else None
+        polymer_basename = os.path.basename(polymer_file) if polymer_file else None
+        manifest = []
+        for sd in sorted(combos):
+            files = combos[sd]
+            dat_basename = _pick_dat([f for f in files if f != polymer_basename], base_input_name)
+            if not dat_basename and input_file:
+                dat_basename = os.path.basename(input_file)
+            if not dat_basename:
+                results.append((sd, "ERROR", "No input .dat found"))
+                continue
+            poly = polymer_basename if (polymer_basename and polymer_basename in files) else "-"
+            manifest.append((sd, dat_basename, poly))
+        if not manifest:
+            results.append(("GLOBAL", "ERROR", "No Mw_*__D*__PDI_* subdirectories to submit"))
+            return results
+
+        # NUEVO CAMBIO: más costosas primero (SLURM arranca las tareas del array por índice)
+        predictions = _runtime_predictions([sd for sd, _, _ in manifest], input_file, runtime_model)
+        manifest.sort(key=lambda m: -predictions[m[0]][0])
+        runtimes = [predictions[sd][0] for sd, _, _ in manifest]
+        peak_mem = max((predictions[sd][1] or 0.0 for sd, _, _ in manifest), default=0.0) or None
+
+        flags = " ".join(f for f in (batch_flag, genpoly_flag) if f)
+        remote_manifest = f"{working_dir}/{ARRAY_MANIFEST_NAME}"
+        throttle = f"%{max_concurrent}" if max_concurrent and max_concurrent > 0 else ""
+        if pack:
+            if target_job_secs is None:
+                target_job_secs = float(st.session_state.get("slurm_pack_target_secs", 1800))
+            groups = _pack_groups(runtimes, cpus_per_task, target_job_secs)
+            # Cota de la duración de un grupo con NPROC BoB a la vez: suma / CPUs + la más larga
+            group_secs = max(sum(runtimes[i] for i in members) / max(1, cpus_per_task)
+                             + max(runtimes[i] for i in members) for members in groups)
+            time_line, mem_per_cpu_mb = _sizing_lines(group_secs, peak_mem, 1, mem_per_cpu_mb, runtime_model)
+        else:
+            groups = [[i] for i in range(len(manifest))]
+            time_line, mem_per_cpu_mb = _sizing_lines(max(runtimes), peak_mem, cpus_per_task, mem_per_cpu_mb,
+                                                      runtime_model)
+        if pack:
+            manifest_text = "".join(f"{g}\t{manifest[i][0]}\t{manifest[i][1]}\t{manifest[i][2]}\n"
+                                    for g, members in enumerate(groups, start=1) for i in members)
+            script_lines = _packed_script_lines(partition, cpus_per_task, mem_per_cpu_mb, job_name_prefix,
+                                                len(groups), throttle, working_dir, remote_manifest,
+                                                bob_remote_fullpath, flags, time_line)
+        else:
+            manifest_text = "".join(f"{sd}\t{dat}\t{poly}\n" for sd, dat, poly in manifest)
+            script_lines = [
+                "#!/bin/bash",
+                f"#SBATCH --partition={partition}" if partition else "#SBATCH --partition=",
+                f"#SBATCH -N {nodes}",
+                f"#SBATCH -n {cpus_per_task}",
+                f"#SBATCH --mem-per-cpu={mem_per_cpu_mb}M",
+                *([time_line] if time_line else []),
+                f"#SBATCH --job-name={job_name_prefix}_array",
+                f"#SBATCH --array=1-{len(manifest)}{throttle}\n",
+                "# Task -> subdirectory (line SLURM_ARRAY_TASK_ID of the manifest)",
+                f"IFS=$'\\t' read -r SUBDIR DAT POLY < <(sed -n \"${{SLURM_ARRAY_TASK_ID}}p\" {shlex.quote(remote_manifest)})",
+                f"cd {shlex.quote(working_dir)}/\"${{SUBDIR}}\" || exit 1\n",
+                "echo \"Job ${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID} (${SUBDIR}) started: `date`\"\n",
+                "# BoB remote fullpath",
+                f"BOBEXE={bob_remote_fullpath}\n",
+                "# BoB execution",
+                "ARGS=(-i \"${DAT}\")",
+                "[ \"${POLY}\" != \"-\" ] && ARGS+=(-c \"${POLY}\")",
+                "START=$(date +%s)",
+                f"\"${{BOBEXE}}\" \"${{ARGS[@]}}\" {flags}".rstrip(),
+                "RC=$?",
+                f"echo \"${{START}} $(date +%s) ${{RC}}\" > {TIMING_FILENAME}\n",
+                "echo \"Job ${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID} ended: `date`\"\n",
+                "echo \"Job Done\""
+            ]
+        ok, msg = _write_remote_file(sftp, remote_manifest, manifest_text, mode=0o640)
+        if ok:
+            ok, msg = _write_remote_file(sftp, f"{working_dir}/{ARRAY_SCRIPT_NAME}", "\n".join(script_lines), mode=0o750)
+        if not ok:
+            results.append(("GLOBAL", "ERROR", f"Failed to write array script/manifest: {msg}"))
+            return results
+
+        if not submit:
+            results.append(("GLOBAL", "OK", f"{ARRAY_SCRIPT_NAME} created for {len(groups)} tasks"))
+            return results
+        stdin, stdout, stderr = ssh.exec_command(
+            f"cd {shlex.quote(working_dir)} && sbatch --parsable {ARRAY_SCRIPT_NAME}", idempotent=False)
+        rc = stdout.channel.recv_exit_status()
+        out = stdout.read().decode().strip()
+        err = stderr.read().decode().strip()
+        jobid = out.split(";")[0].strip()
+        if rc != 0 or not jobid.isdigit():
+            results.append(("GLOBAL", "ERROR", f"sbatch failed: {err or out}"))
+            return results
+        # jobs.txt en el mismo formato que full_send.sh (lo lee el tracker de jobs)
+        jobs_text = "".join(f"{jobid}_{g} {manifest[i][0]}/\n"
+                            for g, members in enumerate(groups, start=1) for i in members)
+        _write_remote_file(sftp, f"{working_dir}/jobs.txt", jobs_text, mode=0o640)
+        results.append(("GLOBAL", "OK", f"array job {jobid}: {len(groups)} tasks for {len(manifest)} "
+                                        f"simulations{' (' + throttle + ')' if throttle else ''}"))
+    except Exception as e:
+        results.append(("GLOBAL", "ERROR", f"array submit exception: {e}"))
+    finally:
+        try:
+            sftp.close()
+        except Exception:
+            pass
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+    return results
+# ****************************CAMBIO*************
+
 # EOF